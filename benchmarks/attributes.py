@@ -0,0 +1,80 @@
+"""
+Benchmark showing the time :func:`testfixtures.compare` spends on each
+object when comparing long lists of small objects by their attributes,
+both with and without ``__slots__``, and for dataclasses and attrs classes
+where those are available.
+
+Run with::
+
+  python benchmarks/attributes.py
+"""
+from __future__ import print_function
+
+from timeit import repeat
+
+from testfixtures import compare
+
+
+class Slotted(object):
+    __slots__ = ('a', 'b', 'c')
+
+    def __init__(self, a, b, c):
+        self.a = a
+        self.b = b
+        self.c = c
+
+
+class Inherited(Slotted):
+    __slots__ = ('d', )
+
+    def __init__(self, a, b, c):
+        super(Inherited, self).__init__(a, b, c)
+        self.d = a
+
+
+class Plain(object):
+
+    def __init__(self, a, b, c):
+        self.a = a
+        self.b = b
+        self.c = c
+
+
+types = [Slotted, Inherited, Plain]
+
+try:
+    from dataclasses import make_dataclass
+except ImportError:
+    pass
+else:
+    # eq=False means every instance is compared attribute by attribute:
+    types.append(make_dataclass('Dataclass', ['a', 'b', 'c'], eq=False))
+
+try:
+    import attr
+except ImportError:
+    pass
+else:
+    types.append(attr.make_class('Attrs', ['a', 'b', 'c'], eq=False))
+
+
+def best(func, number):
+    return min(repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    count = 100000
+    for type_ in types:
+        x = [type_(i, str(i), None) for i in range(count)]
+        y = [type_(i, str(i), None) for i in range(count)]
+        for options in {}, {'ignore_attributes': ['c']}:
+            seconds = best(lambda: compare(x, y, **options), number=1)
+            print('%9s%s: %.2fus per object' % (
+                type_.__name__,
+                ', ignoring' if options else '',
+                seconds / count * 1e6
+            ))
+
+
+if __name__ == '__main__':
+    main()
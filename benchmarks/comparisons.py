@@ -0,0 +1,44 @@
+"""
+Benchmark showing how long it takes to search a long list of objects for
+one matching a :class:`testfixtures.Comparison`, both as it is and once it
+has been compiled.
+
+Run with::
+
+  python benchmarks/comparisons.py
+"""
+from __future__ import print_function
+
+from timeit import repeat
+
+from testfixtures import Comparison as C
+
+
+class Record(object):
+
+    def __init__(self, id, name, tags):
+        self.id = id
+        self.name = name
+        self.tags = tags
+
+
+def best(func, number):
+    return min(repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    count = 10000
+    records = [Record(i, 'record %i' % i, ['a', 'b']) for i in range(count)]
+    for strict in True, False:
+        comparison = C(Record, id=count - 1, name='record %i' % (count - 1),
+                       tags=['a', 'b'], strict=strict)
+        compiled = comparison.compile()
+        for label, c in ('plain', comparison), ('compiled', compiled):
+            seconds = best(lambda: records.index(c), number=3)
+            print('%8s, strict=%-5s: %.2fus per candidate' % (
+                label, strict, seconds / count * 1e6
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark showing the effect of caching comparer lookups in
+:class:`testfixtures.comparison.CompareContext`.
+
+Run with::
+
+  python benchmarks/lookup.py
+"""
+from __future__ import print_function
+
+from timeit import repeat
+
+from testfixtures import Replacer, compare
+from testfixtures.comparison import CompareContext
+
+
+def payload(width, depth):
+    if not depth:
+        return [{'id': i, 'name': 'item %i' % i, 'value': i / 3.0}
+                for i in range(width)]
+    return {'key %i' % i: payload(width, depth-1) for i in range(width)}
+
+
+def run(x, y):
+    # strict=True means the whole structure is walked even though it's equal:
+    compare(x, y, strict=True)
+
+
+def best(x, y, number):
+    return min(repeat(lambda: run(x, y), number=number, repeat=5))
+
+
+def main():
+    x = payload(width=20, depth=2)
+    y = payload(width=20, depth=2)
+    number = 3
+
+    cached = best(x, y, number)
+    with Replacer() as r:
+        r.replace('testfixtures.comparison.CompareContext._lookup',
+                  CompareContext._find_comparer)
+        uncached = best(x, y, number)
+
+    print('uncached: %.3fs' % uncached)
+    print('  cached: %.3fs' % cached)
+    print(' speedup: %.2fx' % (uncached / cached))
+
+
+if __name__ == '__main__':
+    main()
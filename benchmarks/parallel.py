@@ -0,0 +1,45 @@
+"""
+Benchmark showing how comparing a long list of independent records scales
+with the number of worker processes used by :func:`testfixtures.compare`.
+The speedup possible is limited by the number of cores available.
+
+Run with::
+
+  python benchmarks/parallel.py
+"""
+from __future__ import print_function
+
+from multiprocessing import cpu_count
+from timeit import repeat
+
+from testfixtures import compare
+
+
+def records(count):
+    return [{'id': i, 'name': 'record %i' % i, 'values': [i, i / 3.0]}
+            for i in range(count)]
+
+
+def best(x, y, processes):
+    # strict=True means the whole structure is walked even though it's equal:
+    return min(repeat(lambda: compare(x, y, strict=True, processes=processes),
+                      number=1, repeat=3))
+
+
+def main():
+    x = records(200000)
+    y = records(200000)
+    print('cores: %i' % cpu_count())
+    serial = best(x, y, None)
+    print('serial: %.3fs' % serial)
+    processes = 1
+    while processes <= max(cpu_count(), 2):
+        seconds = best(x, y, processes)
+        print('%i processes: %.3fs, speedup: %.2fx' % (
+            processes, seconds, serial / seconds
+        ))
+        processes *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Benchmark showing how long :func:`testfixtures.compare` takes to compare
+nested structures with and without a :class:`testfixtures.CompareStats`
+collecting statistics, followed by the statistics collected.
+
+Run with::
+
+  python benchmarks/stats.py
+"""
+from __future__ import print_function
+
+from timeit import repeat
+
+from testfixtures import CompareStats, compare
+
+
+def best(func, number):
+    return min(repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    count = 10000
+    x = [{'id': i, 'tags': ['a', 'b'], 'score': i / 2.0}
+         for i in range(count)]
+    y = [{'id': i, 'tags': ['a', 'b'], 'score': i / 2.0}
+         for i in range(count)]
+    stats = CompareStats(largest=3)
+    for label, options in (('without', {}), ('with', {'stats': stats})):
+        seconds = best(
+            lambda: compare(x, y, ignore_eq=True, **options), number=1
+        )
+        print('%7s stats: %.3fs' % (label, seconds))
+    print()
+    print(stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+A suite of benchmarks covering :func:`testfixtures.compare` on the kinds of
+objects it is most often used with, each on the path where they are equal
+and the path where a difference has to be found and described.
+
+The time taken per call is printed for each benchmark and, if ``--json`` is
+passed, written to a file along with the versions of testfixtures and Python
+used, so that it can be passed to ``--compare`` when running this suite
+against another version. Benchmarks that raise an exception, such as those
+a version can't handle, have the name of the exception recorded in place of
+their time.
+
+Run with::
+
+  python benchmarks/suite.py [--json results.json] [--compare old.json]
+                             [--min-time 0.2] [name ...]
+"""
+from __future__ import print_function
+
+from argparse import ArgumentParser
+import json
+import platform
+import pkgutil
+from timeit import default_timer
+
+from testfixtures import Comparison as C, compare
+
+# The size of the wide, long and deep structures compared:
+size = 10000
+
+
+class Record(object):
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    def __eq__(self, other):
+        return self.id == other.id and self.name == other.name
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return '<Record %i: %s>' % (self.id, self.name)
+
+
+def records(changed=None):
+    return [Record(i, 'other' if i == changed else 'record %i' % i)
+            for i in range(size)]
+
+
+def nested(depth, leaf):
+    obj = leaf
+    for _ in range(depth):
+        obj = {'child': [obj]}
+    return obj
+
+
+def lines(changed=None):
+    return '\n'.join('other' if i == changed else 'line %i' % i
+                     for i in range(size))
+
+
+# Each benchmark is a function that is passed whether the objects it
+# compares should be different and returns a function to time.
+# strict=True is used where it means the whole structure is walked even
+# though it's equal.
+
+def wide_dict(different):
+    x = dict(('key %i' % i, i) for i in range(size))
+    y = dict(x)
+    if different:
+        y['key %i' % (size // 2)] = -1
+    return lambda: compare(x, y, strict=True, raises=False)
+
+
+def long_list(different):
+    x = list(range(size))
+    y = list(range(size))
+    if different:
+        y[size // 2] = -1
+    return lambda: compare(x, y, strict=True, raises=False)
+
+
+def deep_nesting(different):
+    # describing a difference includes the path to it, which gets longer
+    # with each level, so this isn't as deep as the other structures are
+    # wide or long:
+    depth = size // 10
+    x = nested(depth, 1)
+    y = nested(depth, 2 if different else 1)
+    return lambda: compare(x, y, raises=False)
+
+
+def object_set(different):
+    x = set(records())
+    y = set(records(changed=size // 2 if different else None))
+    return lambda: compare(x, y, raises=False)
+
+
+def object_list(different):
+    x = records()
+    y = records(changed=size // 2 if different else None)
+    return lambda: compare(x, y, ignore_eq=True, raises=False)
+
+
+def sorted_ids(different):
+    x = list(range(size))
+    # an id missing from the start means no elements are at the same index:
+    y = list(range(1 if different else 0, size))
+    return lambda: compare(x, y, sorted=True, raises=False)
+
+
+def long_string(different):
+    x = lines()
+    y = lines(changed=size // 2 if different else None)
+    # make sure the strings aren't the same object:
+    y = ''.join(list(y))
+    return lambda: compare(x, y, raises=False)
+
+
+def generator(different):
+    x = list(range(size))
+    y = list(range(size))
+    if different:
+        y[size // 2] = -1
+    # creating the generators is part of what's timed:
+    return lambda: compare((i for i in x), (i for i in y), raises=False)
+
+
+def comparison_objects(different):
+    expected = [C(Record, id=i, name='record %i' % i) for i in range(size)]
+    actual = records(changed=size // 2 if different else None)
+    return lambda: compare(expected, actual, raises=False)
+
+
+benchmarks = (
+    wide_dict,
+    long_list,
+    deep_nesting,
+    object_set,
+    object_list,
+    sorted_ids,
+    long_string,
+    generator,
+    comparison_objects,
+)
+
+
+def time(func, min_time):
+    # Returns the best time per call over 5 repeats, each running func
+    # enough times to take at least min_time.
+    number = 1
+    while True:
+        started = default_timer()
+        for _ in range(number):
+            func()
+        elapsed = default_timer() - started
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    timings = [elapsed]
+    for _ in range(4):
+        started = default_timer()
+        for _ in range(number):
+            func()
+        timings.append(default_timer() - started)
+    return min(timings) / number, number
+
+
+def load(path):
+    # Returns the time per call for each benchmark in the results in the
+    # supplied file, leaving out any that failed.
+    with open(path) as source:
+        return dict((result['name'], result['seconds'])
+                    for result in json.load(source)['results']
+                    if 'error' not in result)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help='only run benchmarks whose names contain this')
+    parser.add_argument('--json', metavar='PATH',
+                        help='write the results to this file')
+    parser.add_argument('--compare', metavar='PATH',
+                        help='compare the results with those in this file')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='the minimum time, in seconds, to spend on '
+                             'each repeat of each benchmark')
+    args = parser.parse_args()
+
+    baseline = load(args.compare) if args.compare else {}
+
+    results = []
+    for benchmark in benchmarks:
+        for different in False, True:
+            name = '%s.%s' % (benchmark.__name__,
+                              'different' if different else 'equal')
+            if args.names and not any(n in name for n in args.names):
+                continue
+            try:
+                seconds, number = time(benchmark(different), args.min_time)
+            except Exception as e:
+                # such as a RecursionError when running against a version
+                # that can't compare objects nested so deeply, which
+                # shouldn't stop the rest of the benchmarks being run:
+                error = type(e).__name__
+                results.append(dict(name=name, error=error))
+                print('%-30s %12s' % (name, error))
+                continue
+            results.append(dict(name=name, seconds=seconds, number=number))
+            line = '%-30s %10.3fms' % (name, seconds * 1e3)
+            if name in baseline:
+                line += '  %6.2fx' % (seconds / baseline[name])
+            print(line)
+
+    if args.json:
+        with open(args.json, 'w') as target:
+            json.dump(dict(
+                testfixtures=pkgutil.get_data(
+                    'testfixtures', 'version.txt'
+                ).decode('ascii').strip(),
+                python=platform.python_version(),
+                implementation=platform.python_implementation(),
+                platform=platform.platform(),
+                results=results,
+            ), target, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
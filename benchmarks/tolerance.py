@@ -0,0 +1,40 @@
+"""
+Benchmark showing how long :func:`testfixtures.compare` takes to compare
+large numeric payloads when ``rel_tol`` is passed, for lists of floats and
+arrays of doubles, which are checked in one go, and for floats nested
+within other structures, which are compared one at a time.
+
+Run with::
+
+  python benchmarks/tolerance.py
+"""
+from __future__ import print_function
+
+from array import array
+from timeit import repeat
+
+from testfixtures import compare
+
+
+def best(func, number):
+    return min(repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    count = 1000000
+    x = [i / 3.0 for i in range(count)]
+    y = [value * (1 + 1e-12) for value in x]
+    for label, x_, y_ in (
+        ('list', x, y),
+        ('array', array('d', x), array('d', y)),
+        ('nested', [{'value': v} for v in x[:count // 10]],
+                   [{'value': v} for v in y[:count // 10]]),
+    ):
+        seconds = best(lambda: compare(x_, y_, rel_tol=1e-9), number=1)
+        print('%6s: %.3fus per float' % (
+            label, seconds / len(x_) * 1e6
+        ))
+
+
+if __name__ == '__main__':
+    main()
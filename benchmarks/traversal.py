@@ -0,0 +1,78 @@
+"""
+Benchmark showing the time :func:`testfixtures.compare` spends on each
+object in a large nested structure, how long it takes to compare
+structures nested far more deeply than Python's recursion limit and
+how long it takes to compare structures that refer to the same objects
+from many places.
+
+Run with::
+
+  python benchmarks/traversal.py
+"""
+from __future__ import print_function
+
+from timeit import repeat
+
+from testfixtures import compare
+
+from lookup import payload
+
+
+def count(obj):
+    total = 0
+    pending = [obj]
+    while pending:
+        obj = pending.pop()
+        total += 1
+        if isinstance(obj, dict):
+            pending.extend(obj.values())
+        elif isinstance(obj, list):
+            pending.extend(obj)
+    return total
+
+
+def nested(depth, leaf):
+    obj = leaf
+    for _ in range(depth):
+        obj = {'child': [obj]}
+    return obj
+
+
+def shared(references, fragment):
+    return [{'id': i, 'config': fragment} for i in range(references)]
+
+
+def best(func, number):
+    return min(repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    x = payload(width=20, depth=2)
+    y = payload(width=20, depth=2)
+    objects = count(x)
+    for option in 'strict', 'ignore_eq':
+        # both of these mean the whole structure is walked even though
+        # it's equal:
+        seconds = best(lambda: compare(x, y, **{option: True}), number=3)
+        print('%9s: %.2fus per object' % (option, seconds / objects * 1e6))
+
+    for depth in 1000, 10000, 100000:
+        x = nested(depth, 1)
+        y = nested(depth, 1)
+        seconds = best(lambda: compare(x, y), number=1)
+        print('equal, %i deep: %.3fs' % (depth, seconds))
+
+    x = nested(1000, 1)
+    y = nested(1000, 2)
+    seconds = best(lambda: compare(x, y, raises=False), number=1)
+    print('different, 1000 deep: %.3fs' % seconds)
+
+    # each fragment is only walked once, however many places refer to it:
+    x = shared(1000, payload(width=20, depth=2))
+    y = shared(1000, payload(width=20, depth=2))
+    seconds = best(lambda: compare(x, y, strict=True), number=1)
+    print('shared, 1000 references: %.3fs' % seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark showing how long :func:`testfixtures.compare` takes to compare
+sequences whose elements are in a different order when ``ordered=False`` is
+passed, for elements that can be matched by hash and for those that can
+only be matched by comparing them with each other.
+
+Run with::
+
+  python benchmarks/unordered.py
+"""
+from __future__ import print_function
+
+from random import Random
+from timeit import repeat
+
+from testfixtures import compare
+
+
+class Record(object):
+
+    def __init__(self, id):
+        self.id = id
+
+
+def shuffled(sequence):
+    sequence = list(sequence)
+    Random(0).shuffle(sequence)
+    return sequence
+
+
+def best(func, number):
+    return min(repeat(func, number=number, repeat=3)) / number
+
+
+def main():
+    for label, make, counts in (
+        ('ints', lambda i: i, (10000, 100000)),
+        ('tuples', lambda i: (i, 'row %i' % i), (10000, 100000)),
+        ('dicts', lambda i: {'id': i, 'tags': ['a']}, (10000, 100000)),
+        ('objects', Record, (100, 1000)),
+    ):
+        for count in counts:
+            x = [make(i) for i in range(count)]
+            y = shuffled(make(i) for i in range(count))
+            for strict in False, True:
+                seconds = best(
+                    lambda: compare(x, y, ordered=False, strict=strict),
+                    number=1
+                )
+                print('%7s, %6i, strict=%-5s: %.3fs' % (
+                    label, count, strict, seconds
+                ))
+
+
+if __name__ == '__main__':
+    main()
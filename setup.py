@@ -14,7 +14,11 @@ optional = [
     'django<2;python_version<"3"',
     'django;python_version>="3"',
     'sybil',
-    'twisted'
+    'twisted',
+    'numpy',
+    'pandas',
+    'attrs',
+    'dataclasses;python_version=="3.6"',
 ]
 
 setup(
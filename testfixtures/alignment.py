@@ -0,0 +1,289 @@
+"""
+testfixtures.alignment
+----------------------
+
+Alignment of sequences, used when describing the differences between them.
+"""
+from bisect import bisect_left
+
+
+def _bisect(a, b, a_lo, a_hi, b_lo, b_hi, max_d):
+    # Find the middle snake of an optimal path between the two ranges as
+    # described by Myers in "An O(ND) Difference Algorithm and Its
+    # Variations", using space that is linear in the length of the ranges.
+    # Returns the point at which to split the ranges, or None if no split
+    # could be found within max_d differences.
+    n = a_hi - a_lo
+    m = b_hi - b_lo
+    d_limit = (n + m + 1) // 2
+    offset = d_limit + 1
+    length = 2 * d_limit + 2
+    forward = [-1] * length
+    forward[offset + 1] = 0
+    reverse = forward[:]
+    delta = n - m
+    check_forward = delta % 2 != 0
+    k1_start = k1_end = k2_start = k2_end = 0
+    for d in range(min(d_limit, max_d)):
+        for k1 in range(-d + k1_start, d + 1 - k1_end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and
+                            forward[k1_offset - 1] < forward[k1_offset + 1]):
+                x1 = forward[k1_offset + 1]
+            else:
+                x1 = forward[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[a_lo + x1] == b[b_lo + y1]:
+                x1 += 1
+                y1 += 1
+            forward[k1_offset] = x1
+            if x1 > n:
+                k1_end += 2
+            elif y1 > m:
+                k1_start += 2
+            elif check_forward:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < length and reverse[k2_offset] != -1:
+                    if x1 >= n - reverse[k2_offset]:
+                        return x1, y1
+        for k2 in range(-d + k2_start, d + 1 - k2_end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and
+                            reverse[k2_offset - 1] < reverse[k2_offset + 1]):
+                x2 = reverse[k2_offset + 1]
+            else:
+                x2 = reverse[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while (x2 < n and y2 < m and
+                   a[a_hi - 1 - x2] == b[b_hi - 1 - y2]):
+                x2 += 1
+                y2 += 1
+            reverse[k2_offset] = x2
+            if x2 > n:
+                k2_end += 2
+            elif y2 > m:
+                k2_start += 2
+            elif not check_forward:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < length and forward[k1_offset] != -1:
+                    x1 = forward[k1_offset]
+                    y1 = offset + x1 - k1_offset
+                    if x1 >= n - x2:
+                        return x1, y1
+    return None
+
+
+def _unique(seq, lo, hi):
+    # Returns a dict mapping each element that occurs exactly once in
+    # seq[lo:hi] to its position.
+    positions = {}
+    for i in range(lo, hi):
+        element = seq[i]
+        positions[element] = -1 if element in positions else i
+    return positions
+
+
+def _anchors(a, b, a_lo, a_hi, b_lo, b_hi):
+    # Returns the (i, j) positions of the longest sequence of elements that
+    # occur exactly once in both ranges and in the same order in each, as
+    # used by the patience diff algorithm.
+    a_unique = _unique(a, a_lo, a_hi)
+    b_unique = _unique(b, b_lo, b_hi)
+    pairs = []
+    for i in range(a_lo, a_hi):
+        element = a[i]
+        if a_unique[element] == i:
+            j = b_unique.get(element, -1)
+            if j != -1:
+                pairs.append((i, j))
+
+    # patience sorting, keeping the top of each pile and a link from
+    # each pair to the top of the pile to its left when it was placed:
+    tops = []
+    top_pairs = []
+    links = []
+    for n, (i, j) in enumerate(pairs):
+        pile = bisect_left(tops, j)
+        links.append(top_pairs[pile-1] if pile else None)
+        if pile == len(tops):
+            tops.append(j)
+            top_pairs.append(n)
+        else:
+            tops[pile] = j
+            top_pairs[pile] = n
+
+    result = []
+    n = top_pairs[-1] if top_pairs else None
+    while n is not None:
+        result.append(pairs[n])
+        n = links[n]
+    result.reverse()
+    return result
+
+
+def opcodes(a, b, max_d=1000, patience=False):
+    """
+    Return a list of ``(tag, i1, i2, j1, j2)`` tuples describing how to turn
+    sequence ``a`` into sequence ``b``, in the same form as returned by
+    :meth:`difflib.SequenceMatcher.get_opcodes`.
+
+    The elements of both sequences should be cheap to compare for equality
+    and hashing; small integers standing in for the real elements are ideal.
+
+    Common prefixes and suffixes are matched in linear time and the
+    remainder is aligned using Myers' algorithm in linear space. Where more
+    than ``max_d`` differences would need to be explored to align part of
+    the sequences, that part is reported as replaced instead.
+
+    If ``patience`` is ``True``, elements that occur exactly once in each
+    sequence are aligned first, as in the patience diff algorithm, and
+    Myers' algorithm is only used between them. This is much quicker for
+    long sequences such as the lines of large files, where most lines are
+    unique, and tends to give diffs that are easier to read.
+    """
+    runs = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if len(item) == 2:
+            runs.append(item)
+            continue
+        a_lo, a_hi, b_lo, b_hi = item
+
+        start = a_lo
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            a_lo += 1
+            b_lo += 1
+        if a_lo > start:
+            runs.append(('equal', a_lo - start))
+
+        end = a_hi
+        while a_hi > a_lo and b_hi > b_lo and a[a_hi-1] == b[b_hi-1]:
+            a_hi -= 1
+            b_hi -= 1
+        if a_hi < end:
+            stack.append(('equal', end - a_hi))
+
+        if a_lo == a_hi:
+            if b_lo < b_hi:
+                runs.append(('insert', b_hi - b_lo))
+        elif b_lo == b_hi:
+            runs.append(('delete', a_hi - a_lo))
+        else:
+            if patience:
+                anchors = _anchors(a, b, a_lo, a_hi, b_lo, b_hi)
+                if anchors:
+                    # anchors are pushed last to first, so that they're
+                    # popped in order:
+                    i_hi, j_hi = a_hi, b_hi
+                    for i, j in reversed(anchors):
+                        stack.append((i + 1, i_hi, j + 1, j_hi))
+                        stack.append(('equal', 1))
+                        i_hi, j_hi = i, j
+                    stack.append((a_lo, i_hi, b_lo, j_hi))
+                    continue
+            split = _bisect(a, b, a_lo, a_hi, b_lo, b_hi, max_d)
+            if split is None:
+                runs.append(('delete', a_hi - a_lo))
+                runs.append(('insert', b_hi - b_lo))
+            else:
+                x, y = split
+                stack.append((a_lo + x, a_hi, b_lo + y, b_hi))
+                stack.append((a_lo, a_lo + x, b_lo, b_lo + y))
+
+    codes = []
+    i = j = 0
+    for tag, size in runs:
+        if tag == 'equal':
+            i1, i2, j1, j2 = i, i + size, j, j + size
+        elif tag == 'delete':
+            i1, i2, j1, j2 = i, i + size, j, j
+        else:
+            i1, i2, j1, j2 = i, i, j, j + size
+        i, j = i2, j2
+        if codes:
+            p_tag, p_i1, p_i2, p_j1, p_j2 = codes[-1]
+            if p_tag == tag:
+                codes[-1] = (tag, p_i1, i2, p_j1, j2)
+                continue
+            if tag != 'equal' and p_tag != 'equal':
+                codes[-1] = ('replace', p_i1, i2, p_j1, j2)
+                continue
+        codes.append((tag, i1, i2, j1, j2))
+    return codes
+
+
+def grouped_opcodes(codes, context=3):
+    """
+    Group the supplied opcodes into hunks, with up to ``context`` equal
+    elements either side of each change, in the same way as
+    :meth:`difflib.SequenceMatcher.get_grouped_opcodes`.
+    """
+    if not codes:
+        return
+    codes = list(codes)
+    tag, i1, i2, j1, j2 = codes[0]
+    if tag == 'equal':
+        codes[0] = tag, max(i1, i2-context), i2, max(j1, j2-context), j2
+    tag, i1, i2, j1, j2 = codes[-1]
+    if tag == 'equal':
+        codes[-1] = tag, i1, min(i2, i1+context), j1, min(j2, j1+context)
+
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2-i1 > context*2:
+            group.append((tag, i1, min(i2, i1+context),
+                          j1, min(j2, j1+context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2-context), max(j1, j2-context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+def _format_range(start, stop):
+    # Format a range of lines in the way difflib.unified_diff does.
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return '%i' % beginning
+    if not length:
+        beginning -= 1
+    return '%i,%i' % (beginning, length)
+
+
+def unified_diff(a, b, fromfile='', tofile='', n=3):
+    """
+    A generator yielding the lines of a unified diff between the two
+    supplied sequences of strings, in the same form as
+    :func:`difflib.unified_diff` with ``lineterm=''``.
+
+    Each distinct line is replaced with an integer and the two sequences are
+    then aligned using :func:`opcodes` with ``patience=True``, so even
+    files with tens of thousands of lines can be diffed quickly.
+    ``n`` is the number of unchanged lines shown around each change.
+    """
+    numbers = {}
+    a_numbers = [numbers.setdefault(line, len(numbers)) for line in a]
+    b_numbers = [numbers.setdefault(line, len(numbers)) for line in b]
+    started = False
+    for group in grouped_opcodes(opcodes(a_numbers, b_numbers,
+                                         patience=True), n):
+        if not started:
+            started = True
+            yield '--- %s' % fromfile
+            yield '+++ %s' % tofile
+        yield '@@ -%s +%s @@' % (
+            _format_range(group[0][1], group[-1][2]),
+            _format_range(group[0][3], group[-1][4]),
+        )
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in a[i1:i2]:
+                    yield ' ' + line
+                continue
+            for line in a[i1:i2]:
+                yield '-' + line
+            for line in b[j1:j2]:
+                yield '+' + line
@@ -3,15 +3,29 @@ testfixtures.comparison
 -----------------------
 """
 
+from array import array
+from collections import deque, namedtuple
 from decimal import Decimal
-from difflib import unified_diff
+import difflib
 from functools import partial
+from heapq import heappush, heapreplace, nsmallest
+from importlib import import_module
+from itertools import chain, islice
+from operator import attrgetter
+from mmap import mmap
+from pickle import HIGHEST_PROTOCOL, PicklingError, dumps, loads
 from pprint import pformat
-from re import compile, MULTILINE
+from re import compile, escape, MULTILINE
+from timeit import default_timer
 from types import GeneratorType
+import sys
 
 from testfixtures import not_there
-from testfixtures.compat import ClassType, Iterable, Unicode, basestring, PY3
+from testfixtures.alignment import grouped_opcodes, opcodes, unified_diff
+from testfixtures.compat import (
+    ClassType, Iterable, Bytes, Unicode, Mapping, basestring, PY3,
+    RecursionError, Repr, complex_isclose, isclose
+)
 from testfixtures.resolve import resolve
 from testfixtures.utils import indent
 from testfixtures.mock import parent_name, mock_call, unittest_mock_call
@@ -22,15 +36,19 @@ def compare_simple(x, y, context):
     Returns a very simple textual difference between the two supplied objects.
     """
     if x != y:
-        repr_x = repr(x)
-        repr_y = repr(y)
+        if not context.rendering:
+            return True
+        repr_x = context._repr(x)
+        repr_y = context._repr(y)
         if repr_x == repr_y:
             if type(x) is not type(y):
                 return compare_with_type(x, y, context)
             x_attrs = _extract_attrs(x)
             y_attrs = _extract_attrs(y)
-            diff = _compare_mapping(x_attrs, y_attrs, context, x,
-                                    'attributes ', '.%s')
+            diff = None
+            if x_attrs is not None and y_attrs is not None:
+                diff = _compare_mapping(x_attrs, y_attrs, context, x,
+                                        'attributes ', '.%s')
             if not diff:
                 return 'Both %s and %s appear as %r, but are not equal!' % (
                     context.x_label or 'x', context.y_label or 'y', repr_x
@@ -39,42 +57,98 @@ def compare_simple(x, y, context):
         return context.label('x', repr_x) + ' != ' + context.label('y', repr_y)
 
 
-def _extract_attrs(obj, ignore=None):
-    try:
-        attrs = vars(obj).copy()
-    except TypeError:
-        attrs = None
-    else:
-        if isinstance(obj, BaseException):
-            attrs['args'] = obj.args
-
-    has_slots = getattr(obj, '__slots__', not_there) is not not_there
-    if has_slots:
-        slots = set()
-        for cls in type(obj).__mro__:
-            slots.update(getattr(cls, '__slots__', ()))
-        if slots and attrs is None:
-            attrs = {}
-        for n in slots:
-            value = getattr(obj, n, not_there)
-            if value is not not_there:
-                attrs[n] = value
+# Layouts of the attributes of classes, keyed by class and the attributes
+# to be ignored. A class's __slots__ can't be changed once it has been
+# created, so these never go stale:
+_attr_layouts = {}
+
+
+class _AttrLayout(object):
+
+    __slots__ = ('exception', 'instance_dict', 'slotted', 'names', 'getter')
+
+    def __init__(self, cls, ignore):
+        self.exception = issubclass(cls, BaseException)
+        self.slotted = False
+        # instances of classes with slots but no __dict__ can't have one:
+        instance_dict = getattr(cls, '__dictoffset__', 0)
+        names = []
+        for class_ in getattr(cls, '__mro__', (cls, )):
+            if class_ is not object:
+                class_dict = getattr(class_, '__dict__', ())
+                for name in '__dict__', '__getattr__', '__getattribute__':
+                    if name in class_dict:
+                        instance_dict = True
+            slots = getattr(class_, '__slots__', ())
+            if isinstance(slots, basestring):
+                slots = (slots, )
+            for name in slots:
+                self.slotted = True
+                if name not in names and not (ignore and name in ignore):
+                    names.append(name)
+        self.instance_dict = bool(instance_dict) or not self.slotted
+        self.names = tuple(names)
+        self.getter = attrgetter(*names) if len(names) > 1 else None
+
+    def extract(self, obj, attrs):
+        names = self.names
+        if not names:
+            return
+        try:
+            if self.getter is None:
+                values = getattr(obj, names[0]),
+            else:
+                values = self.getter(obj)
+        except AttributeError:
+            # not all slots have been set:
+            for name in names:
+                value = getattr(obj, name, not_there)
+                if value is not not_there:
+                    attrs[name] = value
+        else:
+            attrs.update(zip(names, values))
 
-    if attrs is None:
-        return None
 
-    if ignore is not None:
-        for attr in ignore:
-            attrs.pop(attr, None)
+def _extract_attrs(obj, ignore=None):
+    key = type(obj), ignore or None
+    layout = _attr_layouts.get(key)
+    if layout is None:
+        if len(_attr_layouts) >= _lookup_cache_size:
+            _attr_layouts.clear()
+        layout = _attr_layouts[key] = _AttrLayout(*key)
+
+    attrs = None
+    if layout.instance_dict:
+        try:
+            attrs = vars(obj).copy()
+        except TypeError:
+            pass
+        else:
+            if layout.exception:
+                attrs['args'] = obj.args
+            if ignore:
+                for attr in ignore:
+                    attrs.pop(attr, None)
+
+    if layout.slotted:
+        if attrs is None:
+            attrs = {}
+        layout.extract(obj, attrs)
     return attrs
 
 
 def _attrs_to_ignore(context, ignore_attributes, obj):
-    ignore = context.get_option('ignore_attributes', ())
-    if isinstance(ignore, dict):
-        ignore = ignore.get(type(obj), ())
-    ignore = set(ignore)
-    ignore.update(ignore_attributes)
+    key = type(obj), tuple(ignore_attributes)
+    ignored = context._ignored
+    if ignored is None:
+        ignored = context._ignored = {}
+    ignore = ignored.get(key)
+    if ignore is None:
+        ignore = context.get_option('ignore_attributes', ())
+        if isinstance(ignore, dict):
+            ignore = ignore.get(type(obj), ())
+        ignore = frozenset(ignore).union(ignore_attributes)
+        ignored[key] = ignore
     return ignore
 
 
@@ -94,6 +168,10 @@ def compare_object(x, y, context, ignore_attributes=()):
        If specified as a parameter to this fucntion, it may only be a list of
        strings.
     """
+    return context._drive(_object_steps(x, y, context, ignore_attributes))
+
+
+def _object_steps(x, y, context, ignore_attributes=()):
     if type(x) is not type(y) or isinstance(x, (ClassType, type)):
         return compare_simple(x, y, context)
     x_attrs = _extract_attrs(x, _attrs_to_ignore(context, ignore_attributes, x))
@@ -101,8 +179,8 @@ def compare_object(x, y, context, ignore_attributes=()):
     if x_attrs is None or y_attrs is None or not (x_attrs and y_attrs):
         return compare_simple(x, y, context)
     if context.ignore_eq or x_attrs != y_attrs:
-        return _compare_mapping(x_attrs, y_attrs, context, x,
-                                'attributes ', '.%s')
+        return _mapping_steps(x_attrs, y_attrs, context, x,
+                              'attributes ', '.%s')
 
 
 def compare_exception(x, y, context):
@@ -110,9 +188,173 @@ def compare_exception(x, y, context):
     Compare the two supplied exceptions based on their message, type and
     attributes.
     """
+    return context._drive(_exception_steps(x, y, context))
+
+
+def _exception_steps(x, y, context):
     if x.args != y.args:
         return compare_simple(x, y, context)
-    return compare_object(x, y, context)
+    return _object_steps(x, y, context)
+
+
+# Layouts of the fields compared for dataclasses, attrs classes and
+# namedtuples, keyed by class, or the field names of a namedtuple, and the
+# attributes to be ignored:
+_field_layouts = {}
+
+
+class _FieldLayout(object):
+
+    __slots__ = ('names', 'order', 'getter')
+
+    def __init__(self, names, ignore):
+        if ignore:
+            names = tuple(name for name in names if name not in ignore)
+        self.names = names
+        # the order in which fields are described in messages:
+        self.order = sorted(range(len(names)), key=lambda i: repr(names[i]))
+        if len(names) == 1:
+            getter = attrgetter(names[0])
+            self.getter = lambda obj: (getter(obj), )
+        elif names:
+            self.getter = attrgetter(*names)
+        else:
+            self.getter = None
+
+
+def _field_layout(source, fields, ignore):
+    # Returns the layout for the supplied class, or namedtuple fields,
+    # only calling fields(source) to find the field names the first time.
+    key = source, ignore or None
+    layout = _field_layouts.get(key)
+    if layout is None:
+        if len(_field_layouts) >= _lookup_cache_size:
+            _field_layouts.clear()
+        layout = _field_layouts[key] = _FieldLayout(fields(source), ignore)
+    return layout
+
+
+def _dataclass_fields(cls):
+    return tuple(field.name
+                 for field in import_module('dataclasses').fields(cls)
+                 if field.compare)
+
+
+def _attrs_fields(cls):
+    return tuple(attribute.name
+                 for attribute in cls.__attrs_attrs__
+                 if getattr(attribute, 'eq', getattr(attribute, 'cmp', True)))
+
+
+def compare_dataclass(x, y, context):
+    """
+    Compare two :func:`~dataclasses.dataclass` instances based on their type
+    and the fields declared for their class, leaving out any declared with
+    ``compare=False``.
+    """
+    return context._drive(_dataclass_steps(x, y, context))
+
+
+def _dataclass_steps(x, y, context):
+    return _declared_steps(x, y, context, _dataclass_fields)
+
+
+def compare_attrs(x, y, context):
+    """
+    Compare two instances of classes decorated using the :mod:`attr`
+    package based on their type and the attributes declared for their
+    class, leaving out any declared with ``eq=False``.
+    """
+    return context._drive(_attrs_steps(x, y, context))
+
+
+def _attrs_steps(x, y, context):
+    return _declared_steps(x, y, context, _attrs_fields)
+
+
+def _declared_steps(x, y, context, fields):
+    cls = type(x)
+    if cls is not type(y):
+        return compare_simple(x, y, context)
+    layout = _field_layout(cls, fields, _attrs_to_ignore(context, (), x))
+    if not layout.names:
+        return compare_simple(x, y, context)
+    x_values = layout.getter(x)
+    y_values = layout.getter(y)
+    if context.ignore_eq or x_values != y_values:
+        return _field_steps(x, y, context, layout, x_values, y_values,
+                            'attributes ', '.%s')
+
+
+def _describe_values(context, diffs, omitted, key, x_value, y_value,
+                     label=None):
+    # Add a line to diffs describing the values found at key to differ,
+    # unless the message budget was spent before they were compared or by
+    # the messages for the differences nested in them.
+    if omitted or (context.recursive and context._text_spent()):
+        return
+    diffs.append('%s: %s != %s' % (
+        context._repr(key) if label is None else label,
+        context.label('x', context.pformat(x_value)),
+        context.label('y', context.pformat(y_value)),
+        ))
+    context._charge(lines=1)
+
+
+def _describe_missing(context, lines, heading, keys, value, ordered=False):
+    # Add a section to lines listing the keys found in only one of the
+    # objects being compared, along with value(key), as far as the message
+    # budget allows. Sections where nothing could be shown are left out.
+    described = []
+    for key in _limit_differences(keys, context, ordered):
+        if context._text_spent():
+            context._omitted += 1
+            continue
+        described.append('%s: %s' % (
+            context._repr(key), context.pformat(value(key))
+            ))
+        context._charge(lines=1)
+    if described:
+        lines.extend(('', heading))
+        lines.extend(described)
+
+
+def _field_steps(x, y, context, layout, x_values, y_values,
+                 prefix, breadcrumb):
+    # Like _mapping_steps(), but for values known to be in the order given
+    # by the names in the supplied layout.
+    names = layout.names
+
+    if not context.rendering:
+        different = False
+        for name, x_value, y_value in zip(names, x_values, y_values):
+            if (yield x_value, y_value, breadcrumb, (name, )):
+                if not context.exhaustive:
+                    yield True
+                    return
+                different = True
+        if different:
+            yield True
+        return
+
+    different = False
+    same = []
+    diffs = []
+    for i in layout.order:
+        if context.limit_reached():
+            break
+        name = names[i]
+        x_value = x_values[i]
+        y_value = y_values[i]
+        omitted = context.budget_spent()
+        if (yield x_value, y_value, breadcrumb, (name, )):
+            different = True
+            _describe_values(context, diffs, omitted, name, x_value, y_value)
+        else:
+            same.append(name)
+
+    if different:
+        yield _mapping_message(x, y, context, x, prefix, same, diffs, (), ())
 
 
 def compare_with_type(x, y, context):
@@ -120,13 +362,15 @@ def compare_with_type(x, y, context):
     Return a textual description of the difference between two objects
     including information about their types.
     """
+    if not context.rendering:
+        return True
     source = locals()
     to_render = {}
     for name in 'x', 'y':
         obj = source[name]
         to_render[name] = context.label(
             name,
-            '{0} ({1!r})'.format(_short_repr(obj), type(obj))
+            '{0} ({1!r})'.format(_short_repr(obj, context._repr), type(obj))
         )
     return '{x} != {y}'.format(**to_render)
 
@@ -135,25 +379,630 @@ def compare_sequence(x, y, context):
     """
     Returns a textual description of the differences between the two
     supplied sequences.
+
+    :param sequence_diff: If ``True``, the sequences will be aligned and
+                          only the elements that have been inserted, deleted
+                          or changed will be described, along with their
+                          indices, rather than everything after the first
+                          difference.
+
+    :param sequence_context: The number of equal elements to show either side
+                             of each change when ``sequence_diff`` is used.
+                             Defaults to 3.
+
+    :param sequence_diff_limit: The maximum number of inserted, deleted or
+                                changed elements to show when
+                                ``sequence_diff`` is used. Defaults to 100.
+
+    :param ordered: If ``False``, the order of the elements will be ignored
+                    and only the elements that can't be matched with an
+                    element in the other sequence will be described.
+
+    :param key: If supplied, elements are matched up by key rather than by
+                position, regardless of their order, and only those whose
+                key is only in one sequence, or that differ from the element
+                with the same key in the other sequence, are described.
+                This can be a callable that returns the key for an element,
+                or the name of the key or attribute that holds it. If an
+                element has no key or two elements in the same sequence
+                have the same key, the sequences are compared as if ``key``
+                had not been passed.
+
+    :param sorted: If ``True``, and both sequences are sorted, they will be
+                   compared by walking through them in step, in the same
+                   way as merging them, so that the elements only found in
+                   one of them, and those at the same place in the sort
+                   order that differ, are described. If ``key`` is also
+                   passed, the sequences should be sorted by it. This takes
+                   precedence over ``ordered``. If either sequence isn't
+                   sorted, they are compared as if ``sorted`` had not been
+                   passed.
     """
+    return context._drive(_sequence_steps(x, y, context))
+
+
+def _sequence_steps(x, y, context):
+    steps = _matching_steps(x, y, context)
+    if steps is not None:
+        return steps
+    if context.get_option('ordered', True):
+        if context._tolerances is not None and _all_close(x, y, context):
+            return None
+        return _ordered_steps(x, y, context)
+    return _unordered_steps(x, y, context)
+
+
+_float_type = set((float, ))
+
+
+def _floats(sequence):
+    # Returns True if the sequence only contains floats.
+    if type(sequence) is array:
+        return sequence.typecode in 'fd'
+    return set(map(type, sequence)) == _float_type
+
+
+def _all_close(x, y, context):
+    # Returns True if x and y are sequences of floats where each element is
+    # within the tolerances of the context of the one in the same position
+    # in the other. This is much quicker than comparing each pair of
+    # elements in turn.
+    if not (len(x) == len(y) and _floats(x) and _floats(y)):
+        return False
+    rel_tol, abs_tol = context._tolerances
+    return all(map(partial(isclose, rel_tol=rel_tol, abs_tol=abs_tol), x, y))
+
+
+def _ordered_steps(x, y, context):
+    if context.rendering and context.get_option('sequence_diff', False):
+        steps = _diff_sequence(x, y, context)
+        message = None
+        result = None
+        try:
+            while True:
+                try:
+                    step = steps.send(result)
+                except StopIteration:
+                    break
+                if type(step) is tuple:
+                    result = yield step
+                else:
+                    message = step
+                    result = None
+        finally:
+            steps.close()
+        if message:
+            yield message
+            return
+
     l_x = len(x)
     l_y = len(y)
     i = 0
+    exhaustive = context.exhaustive and not context.rendering
+    different = False
     while i < l_x and i < l_y:
-        if context.different(x[i], y[i], '[%i]' % i):
-            break
+        if (yield x[i], y[i], '[%i]', (i, )):
+            if not exhaustive:
+                break
+            different = True
         i += 1
 
-    if l_x == l_y and i == l_x:
+    if l_x == l_y and i == l_x and not different:
         return
 
-    return ('sequence not as expected:\n\n'
-            'same:\n%s\n\n'
-            '%s:\n%s\n\n'
-            '%s:\n%s') % (pformat(x[:i]),
-                          context.x_label or 'first', pformat(x[i:]),
-                          context.y_label or 'second', pformat(y[i:]),
-                          )
+    if not context.rendering:
+        yield True
+        return
+
+    yield ('sequence not as expected:\n\n'
+           'same:\n%s\n\n'
+           '%s:\n%s\n\n'
+           '%s:\n%s') % (context.pformat(x[:i]),
+                         context.x_label or 'first', context.pformat(x[i:]),
+                         context.y_label or 'second', context.pformat(y[i:]),
+                         )
+
+
+def _strict_key(obj, trusted):
+    # Return a hashable key for obj such that objects with equal keys are
+    # equal when compared strictly, or raise TypeError if there isn't one.
+    # Only containers of the trusted types are looked inside.
+    type_ = type(obj)
+    if type_ in _scalar_types:
+        return type_, obj
+    if type_ in trusted:
+        if type_ is dict:
+            return type_, frozenset((k, _strict_key(v, trusted))
+                                    for k, v in obj.items())
+        return type_, tuple(_strict_key(i, trusted) for i in obj)
+    raise TypeError(type_)
+
+
+def _unmatched_by_hash(x, y, context):
+    # Match up equal elements of x and y using hashes of them, returning
+    # the indices of the elements of each that haven't been matched.
+    if context.ignore_eq:
+        return list(range(len(x))), list(range(len(y)))
+    if context.strict:
+        # == can only be relied on for types compared by the built-in
+        # comparers:
+        trusted = frozenset(
+            type_ for type_, comparer in ((list, compare_sequence),
+                                          (tuple, compare_tuple),
+                                          (dict, compare_dict))
+            if context._lookup(type_(), type_()) is comparer
+        )
+        key = partial(_strict_key, trusted=trusted)
+    else:
+        key = _freeze
+
+    buckets = {}
+    unmatched = []
+    for first, sequence in (True, x), (False, y):
+        for i, obj in enumerate(sequence):
+            if _ignore_eq_types and isinstance(obj, _ignore_eq_types):
+                unmatched.append(i)
+                continue
+            try:
+                k = key(obj)
+                bucket = buckets.get(k)
+            except (TypeError, ValueError, RecursionError):
+                # no key or == can't be used:
+                unmatched.append(i)
+                continue
+            if first:
+                if bucket is None:
+                    buckets[k] = [i]
+                else:
+                    bucket.append(i)
+            elif bucket:
+                bucket.pop()
+            else:
+                unmatched.append(i)
+        if first:
+            x_unmatched, unmatched = unmatched, []
+
+    for bucket in buckets.values():
+        x_unmatched.extend(bucket)
+    x_unmatched.sort()
+    return x_unmatched, unmatched
+
+
+def _unordered_steps(x, y, context):
+    # Yields the nested comparisons needed to match up the elements of x and
+    # y, regardless of their order, followed by a message describing any
+    # elements that couldn't be matched.
+    rendering = context.rendering
+    if not rendering and len(x) != len(y):
+        yield True
+        return
+
+    x_unmatched, y_unmatched = _unmatched_by_hash(x, y, context)
+
+    # Elements that couldn't be matched by hash are matched with the first
+    # remaining element that compares as equal. Differences found while
+    # trying each candidate aren't of interest, so aren't rendered:
+    exhaustive = context.exhaustive
+    context.rendering = context.exhaustive = False
+    try:
+        y_remaining = []
+        for j in y_unmatched:
+            for n, i in enumerate(x_unmatched):
+                if not (yield x[i], y[j], '[%i]', (i, )):
+                    del x_unmatched[n]
+                    break
+            else:
+                if not rendering:
+                    yield True
+                    return
+                y_remaining.append(j)
+    finally:
+        context.rendering = rendering
+        context.exhaustive = exhaustive
+
+    if not (x_unmatched or y_remaining):
+        return
+
+    lines = ['sequence not as expected, ignoring order:']
+    x_label = context.x_label or 'first'
+    y_label = context.y_label or 'second'
+    for indices, sequence, present, absent in (
+        (x_unmatched, x, x_label, y_label),
+        (y_remaining, y, y_label, x_label),
+    ):
+        indices = _limit_differences(indices, context, ordered=True)
+        if indices:
+            lines.extend(('', 'in %s but not %s:' % (present, absent)))
+            lines.append(context.pformat([sequence[i] for i in indices]))
+    yield '\n'.join(lines)
+
+
+def _matching_steps(x, y, context):
+    # Returns the steps for comparing x and y using the sorted or key
+    # options, or None if they weren't passed or can't be used.
+    key = context.get_option('key')
+    if key is not None and not callable(key):
+        key = partial(_record_key, name=key)
+    if context.get_option('sorted', False):
+        order = _identity if key is None else key
+        if _is_sorted(x, order) and _is_sorted(y, order):
+            return _sorted_steps(x, y, context, order)
+    if key is None:
+        return None
+    x_keys = _record_keys(x, key)
+    if x_keys is None:
+        return None
+    y_keys = _record_keys(y, key)
+    if y_keys is None:
+        return None
+    return _keyed_steps(x, y, context, x_keys, y_keys)
+
+
+def _identity(obj):
+    return obj
+
+
+def _is_sorted(sequence, key):
+    # Returns True if the keys of the elements of the sequence are in order.
+    previous = not_there
+    try:
+        for obj in sequence:
+            k = key(obj)
+            if previous is not not_there and k < previous:
+                return False
+            previous = k
+    except Exception:
+        return False
+    return True
+
+
+def _sorted_steps(x, y, context, key):
+    # Yields the nested comparisons needed between the elements of x and y
+    # at the same place in the order given by the key while walking through
+    # them in step, followed by a message describing those that differ and
+    # those only found in one of them.
+    rendering = context.rendering
+    exhaustive = context.exhaustive
+    l_x = len(x)
+    l_y = len(y)
+    i = j = 0
+    different = False
+    # the lines describing the elements only in x and only in y:
+    only = [], []
+    diffs = []
+    while i < l_x or j < l_y:
+        if rendering and context.limit_reached():
+            break
+        if j == l_y:
+            side = 0
+        elif i == l_x:
+            side = 1
+        else:
+            x_key = key(x[i])
+            y_key = key(y[j])
+            try:
+                if x_key < y_key:
+                    side = 0
+                elif y_key < x_key:
+                    side = 1
+                else:
+                    side = None
+            except Exception:
+                # keys that can't be ordered are at the same place:
+                side = None
+
+        if side is None:
+            if i == j:
+                breadcrumb, args = '[%i]', (i, )
+            else:
+                breadcrumb, args = '[%i]->[%i]', (i, j)
+            omitted = rendering and context.budget_spent()
+            if (yield x[i], y[j], breadcrumb, args):
+                if not (rendering or exhaustive):
+                    yield True
+                    return
+                different = True
+                if rendering:
+                    _describe_values(context, diffs, omitted, None,
+                                     x[i], y[j], breadcrumb % args)
+            i += 1
+            j += 1
+            continue
+
+        if not (rendering or exhaustive):
+            yield True
+            return
+        different = True
+        if side:
+            index, sequence = j, y
+            j += 1
+        else:
+            index, sequence = i, x
+            i += 1
+        if not rendering:
+            continue
+        if context.budget_spent():
+            context._omitted += 1
+        else:
+            only[side].append('[%i]: %s' % (
+                index, context.pformat(sequence[index])
+            ))
+            context._described += 1
+            context._charge(lines=1)
+
+    if not different:
+        return
+
+    if not rendering:
+        yield True
+        return
+
+    lines = ['sequence not as expected, merging sorted elements:']
+    x_label = context.x_label or 'first'
+    y_label = context.y_label or 'second'
+    for described, present, absent in (
+        (only[0], x_label, y_label),
+        (only[1], y_label, x_label),
+    ):
+        if described:
+            lines.extend(('', 'in %s but not %s:' % (present, absent)))
+            lines.extend(described)
+    if diffs:
+        lines.extend(('', 'values differ:'))
+        lines.extend(diffs)
+    yield '\n'.join(lines)
+
+
+def _record_key(obj, name):
+    if isinstance(obj, Mapping):
+        return obj[name]
+    return getattr(obj, name)
+
+
+def _record_keys(sequence, key):
+    # Returns a list of the keys of the elements of the sequence, along with
+    # a dict mapping each key to the index of its element, or None if there
+    # aren't unique keys for all of them.
+    keys = []
+    index = {}
+    try:
+        for i, obj in enumerate(sequence):
+            k = key(obj)
+            if index.setdefault(k, i) != i:
+                return None
+            keys.append(k)
+    except Exception:
+        return None
+    return keys, index
+
+
+def _keyed_steps(x, y, context, x_keys, y_keys):
+    # Yields the nested comparisons needed between the elements of x and y
+    # that have the same key, followed by a message describing those that
+    # differ and those whose keys are only found in one sequence.
+    x_order, x_index = x_keys
+    y_order, y_index = y_keys
+    breadcrumb = '[key=%r]'
+    x_not_y = context._pruned_keys(set(x_index).difference(y_index),
+                                   breadcrumb)
+    y_not_x = context._pruned_keys(set(y_index).difference(x_index),
+                                   breadcrumb)
+    shared = [k for k in x_order if k in y_index]
+
+    if not context.rendering:
+        exhaustive = context.exhaustive
+        different = bool(x_not_y or y_not_x)
+        if different and not exhaustive:
+            yield True
+            return
+        for k in shared:
+            if (yield x[x_index[k]], y[y_index[k]], breadcrumb, (k, )):
+                if not exhaustive:
+                    yield True
+                    return
+                different = True
+        if different:
+            yield True
+        return
+
+    different = bool(x_not_y or y_not_x)
+    diffs = []
+    for k in shared:
+        if context.limit_reached():
+            break
+        x_item = x[x_index[k]]
+        y_item = y[y_index[k]]
+        omitted = context.budget_spent()
+        if (yield x_item, y_item, breadcrumb, (k, )):
+            different = True
+            _describe_values(context, diffs, omitted, k, x_item, y_item)
+
+    if not different:
+        return
+
+    lines = ['sequence not as expected, matching by key:']
+    x_label = context.x_label or 'first'
+    y_label = context.y_label or 'second'
+    for order, missing, sequence, index, present, absent in (
+        (x_order, x_not_y, x, x_index, x_label, y_label),
+        (y_order, y_not_x, y, y_index, y_label, x_label),
+    ):
+        if missing:
+            _describe_missing(
+                context, lines, 'in %s but not %s:' % (present, absent),
+                [k for k in order if k in missing],
+                lambda k: sequence[index[k]], ordered=True
+            )
+    if diffs:
+        lines.extend(('', 'values differ:'))
+        lines.extend(diffs)
+    yield '\n'.join(lines)
+
+
+class _Unhashable(object):
+    # Wraps an element that cannot be hashed so that it can be used as a key
+    # when aligning sequences. Elements with the same repr will end up in
+    # the same bucket but are still compared for equality.
+
+    __slots__ = ('obj', 'hash')
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.hash = hash(repr(obj))
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        return type(other) is _Unhashable and self.obj == other.obj
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def _freeze(obj):
+    # Return a hashable equivalent of obj for use when aligning sequences.
+    try:
+        hash(obj)
+    except TypeError:
+        pass
+    else:
+        return obj
+    if isinstance(obj, dict):
+        try:
+            return dict, frozenset((k, _freeze(v)) for k, v in obj.items())
+        except TypeError:
+            pass
+    elif isinstance(obj, (list, tuple)):
+        return type(obj) is tuple, tuple(_freeze(i) for i in obj)
+    elif isinstance(obj, set):
+        return frozenset(obj)
+    return _Unhashable(obj)
+
+
+def _sequence_codes(x, y, strict):
+    # Replace the elements of both sequences with integers, such that equal
+    # elements get the same integer, so they can be aligned cheaply.
+    codes = {}
+    result = []
+    for sequence in x, y:
+        sequence_codes = []
+        for obj in sequence:
+            key = _freeze(obj)
+            if strict:
+                key = type(obj), key
+            sequence_codes.append(codes.setdefault(key, len(codes)))
+        result.append(sequence_codes)
+    return result
+
+
+def _refine_codes(codes, replaced):
+    # Returns the supplied opcodes with any pairs of replaced elements found
+    # to be equal, as recorded in replaced, turned into equal opcodes.
+    segments = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag != 'replace':
+            segments.append((tag, i1, i2, j1, j2))
+            continue
+        paired = min(i2-i1, j2-j1)
+        for k in range(paired):
+            i = i1 + k
+            j = j1 + k
+            segments.append((
+                'replace' if replaced[i, j] else 'equal', i, i+1, j, j+1
+            ))
+        segments.append(('replace', i1+paired, i2, j1+paired, j2))
+
+    refined = []
+    for tag, i1, i2, j1, j2 in segments:
+        if i1 == i2 and j1 == j2:
+            continue
+        equal = tag == 'equal'
+        if refined and (refined[-1][0] == 'equal') == equal:
+            i1 = refined[-1][1]
+            j1 = refined[-1][3]
+            refined.pop()
+        if not equal:
+            if i1 == i2:
+                tag = 'insert'
+            elif j1 == j2:
+                tag = 'delete'
+            else:
+                tag = 'replace'
+        refined.append((tag, i1, i2, j1, j2))
+    return refined
+
+
+def _diff_sequence(x, y, context):
+    # Yields the nested comparisons needed to describe the replaced elements
+    # followed by the message, if the sequences can be diffed.
+    if context.ignore_eq:
+        return
+
+    codes = opcodes(*_sequence_codes(x, y, context.strict))
+    if all(code[0] == 'equal' for code in codes):
+        return
+
+    # Replaced elements may still be equal according to the comparers in
+    # use, such as for Comparison objects or numbers within tolerances, so
+    # find out which are without rendering anything:
+    replaced = {}
+    rendering = context.rendering
+    context.rendering = False
+    try:
+        for tag, i1, i2, j1, j2 in codes:
+            if tag == 'replace':
+                for i, j in zip(range(i1, i2), range(j1, j2)):
+                    replaced[i, j] = bool((yield x[i], y[j], '[%i]', (i, )))
+    finally:
+        context.rendering = rendering
+    codes = _refine_codes(codes, replaced)
+    if all(code[0] == 'equal' for code in codes):
+        return
+
+    size = context.get_option('sequence_context', 3)
+    limit = context.get_option('sequence_diff_limit', 100)
+    x_label = context.x_label or 'first'
+    y_label = context.y_label or 'second'
+
+    lines = ['sequence not as expected:']
+    omitted = 0
+    for group in grouped_opcodes(codes, size):
+        if limit > 0:
+            lines.extend(('', '@@ %s[%i:%i] != %s[%i:%i] @@' % (
+                x_label, group[0][1], group[-1][2],
+                y_label, group[0][3], group[-1][4],
+            )))
+        for tag, i1, i2, j1, j2 in group:
+            if limit <= 0:
+                if tag != 'equal':
+                    omitted += (i2-i1) + (j2-j1)
+                continue
+            if tag == 'equal':
+                for i in range(i1, i2):
+                    lines.append('  [%i] %s' % (i, context.repr(x[i])))
+                continue
+            shown = []
+            for prefix, seq, lo, hi in ('-', x, i1, i2), ('+', y, j1, j2):
+                count = max(0, min(hi-lo, limit))
+                for i in range(lo, lo+count):
+                    lines.append('%s [%i] %s' % (prefix, i,
+                                                 context.repr(seq[i])))
+                limit -= count
+                omitted += hi - lo - count
+                shown.append(range(lo, lo+count))
+            if tag == 'replace':
+                for i, j in zip(*shown):
+                    if not replaced.get((i, j)):
+                        continue
+                    if i == j:
+                        yield x[i], y[j], '[%i]', (i, )
+                    else:
+                        yield x[i], y[j], '[%i]->[%i]', (i, j)
+
+    if omitted:
+        lines.extend(('', '%i more differing elements not shown' % omitted))
+    yield '\n'.join(lines)
 
 
 def compare_generator(x, y, context):
@@ -161,17 +1010,149 @@ def compare_generator(x, y, context):
     Returns a textual description of the differences between the two
     supplied generators.
 
-    This is done by first unwinding each of the generators supplied
-    into tuples and then passing those tuples to
-    :func:`compare_sequence`.
+    This is done by consuming both generators in lockstep, a chunk of
+    elements at a time, and stopping once a difference has been found.
+    Chunks that are equal are skipped without comparing each pair of
+    elements they contain. This means that very long, or even infinite,
+    generators can be compared without unwinding them into memory.
+
+    :param stream_window: The maximum number of elements to show before and
+                          after the first difference. Defaults to 10.
+
+    :param stream_differences: The number of differences to find before
+                               consumption of the generators is stopped.
+                               Defaults to 1.
+
+    A list compared with a tuple is also compared in this way unless
+    ``ordered=False`` is passed, in which case they are compared as described
+    for :func:`compare_sequence`.
     """
-    x = tuple(x)
-    y = tuple(y)
+    return context._drive(_iterable_steps(x, y, context))
+
+
+def _iterable_steps(x, y, context):
+    if isinstance(x, (list, tuple)) and isinstance(y, (list, tuple)):
+        steps = _matching_steps(x, y, context)
+        if steps is not None:
+            return steps
+        if not context.get_option('ordered', True):
+            return _unordered_steps(x, y, context)
+    if (type(x) is array and type(y) is array and
+            context._tolerances is not None and _all_close(x, y, context)):
+        return None
+    return _generator_steps(x, y, context)
+
+
+def _generator_steps(x, y, context):
+    if context._quick and (iter(x) is x or iter(y) is y):
+        # one-shot iterators can't be consumed more than once:
+        raise _RenderingRequired()
+
+    window = context.get_option('stream_window', 10)
+    max_differences = context.get_option('stream_differences', 1)
+    # chunks that are equal according to == are equal as far as the
+    # comparers are concerned unless types matter or == can't be used:
+    skip_equal = not (context.strict or context.ignore_eq)
+
+    x = iter(x)
+    y = iter(y)
+    # the elements are read in chunks, so that equal ones can be skipped
+    # without comparing each pair, keeping the number in memory bounded.
+    # Chunks start small and grow while they're equal, so not many more
+    # elements than are needed are read once a difference is found:
+    x_chunk = y_chunk = ()
+    k = 0
+    chunk_size = 1
+    same = deque(maxlen=window)
+    same_count = 0
+    x_tail = []
+    y_tail = []
+    differences = []
+    i = 0
+    exhausted = False
+    while len(differences) < max_differences:
+        if k == max(len(x_chunk), len(y_chunk)):
+            x_chunk = tuple(islice(x, chunk_size))
+            y_chunk = tuple(islice(y, chunk_size))
+            k = 0
+            if skip_equal and not differences and x_chunk:
+                try:
+                    equal = x_chunk == y_chunk
+                except ValueError:
+                    # elements such as arrays can't be compared with ==:
+                    equal = False
+                if equal:
+                    chunk_size = min(chunk_size * 2, _stream_chunk)
+                    same.extend(x_chunk[len(x_chunk) - window:])
+                    same_count += len(x_chunk)
+                    i += len(x_chunk)
+                    k = len(x_chunk)
+                    continue
+        x_item = x_chunk[k] if k < len(x_chunk) else not_there
+        y_item = y_chunk[k] if k < len(y_chunk) else not_there
+        k += 1
+        if x_item is not_there or y_item is not_there:
+            exhausted = True
+            break
+        if (yield x_item, y_item, '[%i]', (i, )):
+            if not (context.rendering or context.exhaustive):
+                yield True
+                return
+            differences.append(i)
+        if differences:
+            if len(x_tail) <= window:
+                x_tail.append(x_item)
+                y_tail.append(y_item)
+        else:
+            same.append(x_item)
+            same_count += 1
+        i += 1
+        if (differences and len(differences) < max_differences and
+                context.limit_reached()):
+            break
+
+    if exhausted and not differences and x_item is y_item:
+        return
+
+    # put back any elements read but not yet compared:
+    x = chain(x_chunk[k:], x)
+    y = chain(y_chunk[k:], y)
 
-    if not context.ignore_eq and x == y:
+    if not context.rendering:
+        yield True
         return
 
-    return compare_sequence(x, y, context)
+    lines = ['sequence not as expected:', '']
+    if same_count > window:
+        lines.append('same (last %i of %i):' % (window, same_count))
+    else:
+        lines.append('same:')
+    lines.append(context.pformat(tuple(same)))
+
+    for label, tail, item, iterator in (
+        (context.x_label or 'first', x_tail, x_item, x),
+        (context.y_label or 'second', y_tail, y_item, y),
+    ):
+        if exhausted:
+            if item is not not_there and len(tail) <= window:
+                tail.append(item)
+        if not exhausted or item is not not_there:
+            tail.extend(islice(iterator, max(0, window + 1 - len(tail))))
+        lines.append('')
+        if len(tail) > window:
+            lines.append('%s (first %i):' % (label, window))
+        else:
+            lines.append('%s:' % label)
+        lines.append(context.pformat(tuple(tail[:window])))
+
+    if len(differences) > 1:
+        lines.extend(('', 'differences at:', repr(differences)))
+
+    yield '\n'.join(lines)
+
+
+# The most elements read from each of a pair of generators at a time:
+_stream_chunk = 4096
 
 
 def compare_tuple(x, y, context):
@@ -182,17 +1163,19 @@ def compare_tuple(x, y, context):
     The presence of a ``_fields`` attribute on a tuple is used to
     decide whether or not it is a :func:`~collections.namedtuple`.
     """
+    return context._drive(_tuple_steps(x, y, context))
+
+
+def _tuple_steps(x, y, context):
     x_fields = getattr(x, '_fields', None)
     y_fields = getattr(y, '_fields', None)
     if x_fields and y_fields:
         if x_fields == y_fields:
-            return _compare_mapping(dict(zip(x_fields, x)),
-                                    dict(zip(y_fields, y)),
-                                    context,
-                                    x)
+            layout = _field_layout(x_fields, tuple, None)
+            return _field_steps(x, y, context, layout, x, y, '', '[%r]')
         else:
             return compare_with_type(x, y, context)
-    return compare_sequence(x, y, context)
+    return _sequence_steps(x, y, context)
 
 
 def compare_dict(x, y, context):
@@ -200,36 +1183,77 @@ def compare_dict(x, y, context):
     Returns a textual description of the differences between the two
     supplied dictionaries.
     """
-    return _compare_mapping(x, y, context, x)
+    return context._drive(_dict_steps(x, y, context))
+
 
+def _dict_steps(x, y, context):
+    return _mapping_steps(x, y, context, x)
 
-def sorted_by_repr(sequence):
-    return sorted(sequence, key=lambda o: repr(o))
+
+def sorted_by_repr(sequence, context=None):
+    """
+    Returns the supplied sequence sorted by the :func:`repr` of its elements.
+    If a ``context`` is supplied, any reprs it has already computed will be
+    used.
+    """
+    return sorted(sequence, key=repr if context is None else context._repr)
 
 
 def _compare_mapping(x, y, context, obj_for_class,
                      prefix='', breadcrumb='[%r]',
                      check_y_not_x=True):
+    return context._drive(_mapping_steps(x, y, context, obj_for_class,
+                                         prefix, breadcrumb, check_y_not_x))
+
+
+def _mapping_steps(x, y, context, obj_for_class,
+                   prefix='', breadcrumb='[%r]',
+                   check_y_not_x=True):
 
     x_keys = set(x.keys())
     y_keys = set(y.keys())
-    x_not_y = x_keys - y_keys
-    y_not_x = y_keys - x_keys
+    x_not_y = context._pruned_keys(x_keys - y_keys, breadcrumb)
+    y_not_x = context._pruned_keys(y_keys - x_keys, breadcrumb)
+
+    if not context.rendering:
+        exhaustive = context.exhaustive
+        different = bool(x_not_y or (check_y_not_x and y_not_x))
+        if different and not exhaustive:
+            yield True
+            return
+        # the differences are found in the order of the keys of x:
+        for key in [k for k in x if k in y] if exhaustive else x_keys:
+            if (yield x[key], y[key], breadcrumb, (key, )):
+                if not exhaustive:
+                    yield True
+                    return
+                different = True
+        if different:
+            yield True
+        return
+
+    different = bool(x_not_y or (check_y_not_x and y_not_x))
     same = []
     diffs = []
-    for key in sorted_by_repr(x_keys.intersection(y_keys)):
-        if context.different(x[key], y[key], breadcrumb % (key, )):
-            diffs.append('%r: %s != %s' % (
-                key,
-                context.label('x', pformat(x[key])),
-                context.label('y', pformat(y[key])),
-                ))
+    for key in sorted_by_repr(x_keys.intersection(y_keys), context):
+        if context.limit_reached():
+            break
+        omitted = context.budget_spent()
+        if (yield x[key], y[key], breadcrumb, (key, )):
+            different = True
+            _describe_values(context, diffs, omitted, key, x[key], y[key])
         else:
             same.append(key)
 
-    if not (x_not_y or (check_y_not_x and y_not_x) or diffs):
+    if not different:
         return
 
+    yield _mapping_message(x, y, context, obj_for_class, prefix,
+                           same, diffs, x_not_y, y_not_x)
+
+
+def _mapping_message(x, y, context, obj_for_class, prefix,
+                     same, diffs, x_not_y, y_not_x):
     if obj_for_class is not_there:
         lines = []
     else:
@@ -240,25 +1264,21 @@ def _compare_mapping(x, y, context, obj_for_class,
             same = sorted(same)
         except TypeError:
             pass
-        lines.extend(('', '%ssame:' % prefix, repr(same)))
+        lines.extend(('', '%ssame:' % prefix, context.repr(same)))
 
     x_label = context.x_label or 'first'
     y_label = context.y_label or 'second'
 
-    if x_not_y:
-        lines.extend(('', '%sin %s but not %s:' % (prefix, x_label, y_label)))
-        for key in sorted_by_repr(x_not_y):
-            lines.append('%r: %s' % (
-                key,
-                pformat(x[key])
-                ))
-    if y_not_x:
-        lines.extend(('', '%sin %s but not %s:' % (prefix, y_label, x_label)))
-        for key in sorted_by_repr(y_not_x):
-            lines.append('%r: %s' % (
-                key,
-                pformat(y[key])
-                ))
+    for missing, obj, present, absent in (
+        (x_not_y, x, x_label, y_label),
+        (y_not_x, y, y_label, x_label),
+    ):
+        if missing:
+            _describe_missing(
+                context, lines,
+                '%sin %s but not %s:' % (prefix, present, absent),
+                missing, obj.__getitem__
+            )
     if diffs:
         lines.extend(('', '%sdiffer:' % (prefix or 'values ')))
         lines.extend(diffs)
@@ -274,23 +1294,49 @@ def compare_set(x, y, context):
     y_not_x = y - x
     if not (y_not_x or x_not_y):
         return
+    if not context.rendering:
+        return True
     lines = ['%s not as expected:' % x.__class__.__name__, '']
     x_label = context.x_label or 'first'
     y_label = context.y_label or 'second'
+    x_not_y = _limit_differences(x_not_y, context)
+    y_not_x = _limit_differences(y_not_x, context)
     if x_not_y:
         lines.extend((
             'in %s but not %s:' % (x_label, y_label),
-            pformat(sorted_by_repr(x_not_y)),
+            context.pformat(x_not_y),
             '',
             ))
     if y_not_x:
         lines.extend((
             'in %s but not %s:' % (y_label, x_label),
-            pformat(sorted_by_repr(y_not_x)),
+            context.pformat(y_not_x),
             '',
             ))
     return '\n'.join(lines)+'\n'
 
+
+def _limit_differences(items, context, ordered=False):
+    # Returns those of the supplied items, each of which is a difference,
+    # that can be described within max_differences, counting any others as
+    # omitted. Unless they are already in order, the items returned are
+    # sorted by their repr.
+    remaining = None
+    if context.max_differences is not None:
+        remaining = max(0, context.max_differences - context._described)
+    if remaining is not None and remaining < len(items):
+        context._omitted += len(items) - remaining
+        if ordered:
+            items = items[:remaining]
+        else:
+            # avoid sorting all of what could be a lot of items:
+            items = sorted_by_repr(nsmallest(remaining, items, key=repr),
+                                   context)
+    elif not ordered:
+        items = sorted_by_repr(items, context)
+    context._described += len(items)
+    return items
+
 trailing_whitespace_re = compile('\s+$', MULTILINE)
 
 
@@ -327,10 +1373,14 @@ def compare_text(x, y, context):
     :param show_whitespace: If `True`, then whitespace characters in
                             multi-line strings will be replaced with their
                             representations.
+
+    :param use_difflib: If `True`, then multi-line strings will be diffed
+                        using :mod:`difflib`, as described for :func:`diff`.
     """
     blanklines = context.get_option('blanklines', True)
     trailing_whitespace = context.get_option('trailing_whitespace', True)
     show_whitespace = context.get_option('show_whitespace', False)
+    use_difflib = context.get_option('use_difflib', False)
 
     if not trailing_whitespace:
         x = trailing_whitespace_re.sub('', x)
@@ -340,27 +1390,171 @@ def compare_text(x, y, context):
         y = strip_blank_lines(y)
     if x == y:
         return
-    labelled_x = context.label('x', repr(x))
-    labelled_y = context.label('y', repr(y))
+    if not context.rendering:
+        return True
+    if (len(x) > 10 or len(y) > 10) and ('\n' in x or '\n' in y):
+        if show_whitespace:
+            x = split_repr(x)
+            y = split_repr(y)
+        return '\n' + context._spend_lines(_diff_lines(
+            x, y, context.x_label, context.y_label, use_difflib
+        ))
+    labelled_x = context.label('x', context.repr(x))
+    labelled_y = context.label('y', context.repr(y))
     if len(x) > 10 or len(y) > 10:
-        if '\n' in x or '\n' in y:
-            if show_whitespace:
-                x = split_repr(x)
-                y = split_repr(y)
-            message = '\n' + diff(x, y, context.x_label, context.y_label)
-        else:
-            message = '\n%s\n!=\n%s' % (labelled_x, labelled_y)
+        message = '\n%s\n!=\n%s' % (labelled_x, labelled_y)
     else:
         message = labelled_x+' != '+labelled_y
     return message
 
 
+# Bytes are shown as a hexdump with this many bytes in each row:
+_hexdump_row = 16
+
+# Bytes objects no longer than this are shown using their repr instead:
+_hexdump_threshold = 64
+
+# Bytes are compared in chunks of this size, so that only the chunks that
+# differ need to be examined row by row:
+_bytes_chunk = 1 << 16
+
+
+def _byte_view(obj):
+    # Returns a one-dimensional memoryview of the bytes in obj, only
+    # copying them if they aren't contiguous.
+    view = memoryview(obj)
+    if view.ndim == 1 and view.format == 'B':
+        return view
+    try:
+        return view.cast('B')
+    except TypeError:
+        return memoryview(view.tobytes())
+
+
+def _differing_rows(x, y):
+    # Yields the index of each hexdump row in which the memoryviews
+    # supplied differ.
+    length = min(len(x), len(y))
+    row = -1
+    for start in range(0, length, _bytes_chunk):
+        end = min(start + _bytes_chunk, length)
+        chunk_x = x[start:end].tobytes()
+        chunk_y = y[start:end].tobytes()
+        if chunk_x == chunk_y:
+            continue
+        for offset in range(0, end - start, _hexdump_row):
+            if (chunk_x[offset:offset + _hexdump_row] !=
+                    chunk_y[offset:offset + _hexdump_row]):
+                row = (start + offset) // _hexdump_row
+                yield row
+    if len(x) != len(y):
+        rows = (max(len(x), len(y)) + _hexdump_row - 1) // _hexdump_row
+        for row in range(max(row + 1, length // _hexdump_row), rows):
+            yield row
+
+
+def _hexdump_line(prefix, view, row):
+    start = row * _hexdump_row
+    data = bytearray(view[start:start + _hexdump_row].tobytes())
+    half = _hexdump_row // 2
+    return '%s%08x  %-*s  %-*s  |%s|' % (
+        prefix, start,
+        half * 3 - 1, ' '.join('%02x' % b for b in data[:half]),
+        half * 3 - 1, ' '.join('%02x' % b for b in data[half:]),
+        ''.join(chr(b) if 32 <= b < 127 else '.' for b in data),
+    )
+
+
 def compare_bytes(x, y, context):
-    if x == y:
+    """
+    Returns a textual description of the differences between the two
+    supplied objects containing bytes, such as :class:`bytes`,
+    :class:`bytearray`, :class:`memoryview` or :class:`mmap.mmap`, which
+    need not be of the same type.
+
+    Short objects are shown in full. Otherwise, the offset of the first
+    difference is given along with a hexdump of the rows that differ and
+    those either side of them. Only as much of the objects as is needed
+    to find the differences shown is examined, so even very large objects
+    can be compared quickly.
+
+    :param mismatch_limit: The maximum number of rows that differ to show.
+                           Defaults to 10.
+
+    :param bytes_context: The number of unchanged rows to show either side
+                          of each change. Defaults to 1.
+    """
+    view_x = _byte_view(x)
+    view_y = _byte_view(y)
+    rows = _differing_rows(view_x, view_y)
+    first = next(rows, None)
+    if first is None:
         return
-    labelled_x = context.label('x', repr(x))
-    labelled_y = context.label('y', repr(y))
-    return '\n%s\n!=\n%s' % (labelled_x, labelled_y)
+    if not context.rendering:
+        return True
+
+    if max(len(view_x), len(view_y)) <= _hexdump_threshold:
+        if not isinstance(x, (bytes, bytearray)):
+            x = view_x.tobytes()
+        if not isinstance(y, (bytes, bytearray)):
+            y = view_y.tobytes()
+        labelled_x = context.label('x', context.repr(x))
+        labelled_y = context.label('y', context.repr(y))
+        return '\n%s\n!=\n%s' % (labelled_x, labelled_y)
+
+    limit = context.get_option('mismatch_limit', 10)
+    size = context.get_option('bytes_context', 1)
+    x_label = context.x_label or 'first'
+    y_label = context.y_label or 'second'
+
+    lines = ['%s not as expected:' % type(x).__name__, '']
+    if len(view_x) != len(view_y):
+        lines.append('length: %s != %s' % (
+            context.label('x', len(view_x)),
+            context.label('y', len(view_y)),
+        ))
+    offset = first * _hexdump_row
+    while view_x[offset:offset + 1] == view_y[offset:offset + 1]:
+        offset += 1
+    lines.append('first difference at offset %i (0x%x)' % (offset, offset))
+
+    # group the rows shown into hunks, as for sequences:
+    shown = [first]
+    shown.extend(islice(rows, limit - 1))
+    more = next(rows, None)
+    total = (max(len(view_x), len(view_y)) + _hexdump_row - 1) // _hexdump_row
+    hunks = []
+    for row in shown:
+        if hunks and row - hunks[-1][1] <= size * 2 + 1:
+            hunks[-1][1] = row
+        else:
+            hunks.append([row, row])
+
+    for first_row, last_row in hunks:
+        lo = max(0, first_row - size)
+        hi = min(total, last_row + size + 1)
+        start = lo * _hexdump_row
+        end = hi * _hexdump_row
+        lines.extend(('', '@@ %s[0x%x:0x%x] != %s[0x%x:0x%x] @@' % (
+            x_label, min(start, len(view_x)), min(end, len(view_x)),
+            y_label, min(start, len(view_y)), min(end, len(view_y)),
+        )))
+        for row in range(lo, hi):
+            start = row * _hexdump_row
+            end = start + _hexdump_row
+            if view_x[start:end] == view_y[start:end]:
+                lines.append(_hexdump_line('  ', view_x, row))
+                continue
+            if start < len(view_x):
+                lines.append(_hexdump_line('- ', view_x, row))
+            if start < len(view_y):
+                lines.append(_hexdump_line('+ ', view_y, row))
+
+    if more is not None:
+        lines.extend(('', 'differences after offset 0x%x not shown' % (
+            (shown[-1] + 1) * _hexdump_row
+        )))
+    return '\n'.join(lines)
 
 
 def compare_call(x, y, context):
@@ -381,8 +1575,10 @@ def compare_call(x, y, context):
     if x_name == y_name and x_args == y_args and x_kw == y_kw:
         return compare_call(getattr(x, parent_name), getattr(y, parent_name), context)
 
-    if repr(x) != repr(y):
-        return compare_text(repr(x), repr(y), context)
+    repr_x = context._repr(x)
+    repr_y = context._repr(y)
+    if repr_x != repr_y:
+        return compare_text(repr_x, repr_y, context)
 
     different = (
         context.different(x_name, y_name, ' function name') or
@@ -404,13 +1600,118 @@ def compare_partial(x, y, context):
                                 'attributes ', '.%s')
 
 
-def _short_repr(obj):
+def _short_repr(obj, repr=repr):
     repr_ = repr(obj)
     if len(repr_) > 30:
         repr_ = repr_[:30] + '...'
     return repr_
 
 
+def _container_parts(obj, type_):
+    # Yield the parts of the repr of a list, tuple or dict in order, each
+    # as a tuple of True and some text, or False and an object whose repr
+    # goes there.
+    if type_ is dict:
+        yield True, '{'
+        for i, (key, value) in enumerate(obj.items()):
+            if i:
+                yield True, ', '
+            yield False, key
+            yield True, ': '
+            yield False, value
+        yield True, '}'
+    else:
+        yield True, '[' if type_ is list else '('
+        for i, item in enumerate(obj):
+            if i:
+                yield True, ', '
+            yield False, item
+        if type_ is tuple:
+            yield True, ',)' if len(obj) == 1 else ')'
+        else:
+            yield True, ']'
+
+
+# Objects nested more deeply than this are shown on one line, and only to
+# this depth, as the work done by pprint grows with the square of the depth:
+_pformat_depth = 20
+
+# Used for objects that are too deeply nested for pformat() or repr():
+_nested_repr = Repr()
+_nested_repr.maxlevel = _pformat_depth
+for name in ('maxtuple', 'maxlist', 'maxarray', 'maxdict', 'maxset',
+             'maxfrozenset', 'maxdeque', 'maxstring', 'maxlong', 'maxother'):
+    setattr(_nested_repr, name, sys.maxsize)
+
+
+def _nested_deeper_than(obj, limit):
+    # Returns True if there are containers nested in obj more than limit
+    # levels deep. Containers already seen, such as in self-referential
+    # structures, aren't counted again.
+    seen = set()
+    level = [obj]
+    for _ in range(limit):
+        nested = []
+        for item in level:
+            type_ = type(item)
+            if type_ in _nestable_types and id(item) not in seen:
+                seen.add(id(item))
+                nested.extend(item.values() if type_ is dict else item)
+        if not nested:
+            return False
+        level = nested
+    return any(type(item) in _nestable_types for item in level)
+
+
+def _pformat(obj):
+    if _nested_deeper_than(obj, _pformat_depth):
+        return _nested_repr.repr(obj)
+    return pformat(obj)
+
+
+def _bounded_repr(obj, limit):
+    # Returns the repr of obj and True if it is no longer than limit,
+    # otherwise returns at least the first limit + 1 characters of it
+    # and False. Only the built-in containers are broken up, using a stack
+    # rather than recursion so that each piece is only handled once however
+    # deeply it is nested, and strings longer than limit are shortened, as
+    # their repr will be cut off anyway.
+    chunks = []
+    size = 0
+    # the ids of the containers being rendered, so that those containing
+    # themselves can be spotted:
+    active = set()
+    stack = [(None, iter(((False, obj), )))]
+    while stack:
+        container, parts = stack[-1]
+        part = next(parts, None)
+        if part is None:
+            stack.pop()
+            active.discard(container)
+            continue
+        is_text, item = part
+        if is_text:
+            chunk = item
+        else:
+            type_ = type(item)
+            if type_ in (list, tuple, dict):
+                if id(item) in active:
+                    chunk = '{...}' if type_ is dict else '[...]'
+                else:
+                    active.add(id(item))
+                    stack.append((id(item), _container_parts(item, type_)))
+                    continue
+            elif isinstance(item, (basestring, Bytes)) and len(item) > limit:
+                chunk = repr(item[:limit])
+            else:
+                chunk = repr(item)
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            return ''.join(chunks), False
+    return ''.join(chunks), True
+
+
 _registry = {
     dict: compare_dict,
     set: compare_set,
@@ -428,17 +1729,224 @@ _registry = {
     partial: compare_partial,
     }
 
-if PY3:
-    _registry[bytes] = compare_bytes
-
+# Objects containing bytes, which can be compared with each other whatever
+# their types:
+_byte_types = ()
 
-def register(type, comparer):
+if PY3:
+    _byte_types = bytes, bytearray, memoryview, mmap
+    _registry.update(dict.fromkeys(_byte_types, compare_bytes))
+
+# Comparers already looked up for pairs of types. These are only valid
+# for the registry they were looked up in and so are discarded if that
+# registry is changed or replaced:
+_lookup_cache = {}
+_lookup_cache_registry = _registry
+# Stop the cache growing without bound when types are created dynamically,
+# as happens with mocks:
+_lookup_cache_size = 1000
+
+
+def _shared_lookup_cache():
+    global _lookup_cache, _lookup_cache_registry
+    if _lookup_cache_registry is not _registry:
+        _lookup_cache = {}
+        _lookup_cache_registry = _registry
+    return _lookup_cache
+
+
+# Comparers for types from libraries that testfixtures does not depend on,
+# keyed by the name of the library. These are only imported once the library
+# itself has been imported, as there can't be any objects of its types before
+# then. The modules should provide a ``comparers`` mapping of types to
+# comparers and an ``ignore_eq`` sequence of types for which ``==`` can't be
+# used to tell whether two objects are equal, such as types where ``==``
+# compares element-wise:
+_optional = {
+    'numpy': 'testfixtures.numpy',
+}
+_optional_registry = {}
+_ignore_eq_types = ()
+
+
+def _load_optional():
+    global _ignore_eq_types
+    for library in tuple(_optional):
+        if library in sys.modules:
+            module = import_module(_optional.pop(library))
+            _optional_registry.update(module.comparers)
+            _ignore_eq_types += tuple(module.ignore_eq)
+            _lookup_cache.clear()
+
+
+def register(type, comparer, ignore_eq=False):
     """
     Register the supplied comparer for the specified type.
     This registration is global and will be in effect from the point
     this function is called until the end of the current process.
+
+    :param ignore_eq: If ``True``, ``==`` will not be used to check whether
+                      objects of this type are equal and the comparer will
+                      always be used instead. This is needed for types where
+                      ``==`` compares element-wise.
     """
+    global _ignore_eq_types
     _registry[type] = comparer
+    if ignore_eq:
+        _ignore_eq_types += (type, )
+    _lookup_cache.clear()
+
+
+# The limits set by set_message_budget(), leaving out those that are None:
+_message_budget = {}
+
+
+def set_message_budget(max_chars=None, max_lines=None, max_differences=None):
+    """
+    Set the default limits on the size of the messages rendered when
+    :func:`compare` finds differences. See :func:`compare` for details
+    of the parameters; ``None`` means no limit.
+    These limits are global and will be in effect from the point
+    this function is called until the end of the current process, unless
+    overridden by passing the same parameters to :func:`compare`.
+    """
+    _message_budget.clear()
+    for name, value in (('max_chars', max_chars),
+                        ('max_lines', max_lines),
+                        ('max_differences', max_differences)):
+        if value is not None:
+            _message_budget[name] = value
+
+
+# One of the largest comparisons recorded by a CompareStats:
+_Subtree = namedtuple('Subtree', 'nodes seconds path comparer')
+
+
+def _comparer_name(comparer):
+    return getattr(comparer, '__name__', None) or type(comparer).__name__
+
+
+class CompareStats(object):
+    """
+    Statistics about the work done by :func:`compare`, collected by passing
+    an instance as its ``stats`` parameter. The same instance can be passed
+    to many calls, in which case the statistics cover all of them.
+    ``str()`` of an instance gives a summary suitable for a test report.
+
+    :param largest: The number of the largest comparisons to keep in
+                    :attr:`largest`.
+    """
+
+    def __init__(self, largest=10):
+        #: The number of calls to :func:`compare` made.
+        self.calls = 0
+        #: The total time, in seconds, taken by those calls.
+        self.seconds = 0.0
+        #: The number of pairs of objects compared, including those
+        #: nested within the objects passed to :func:`compare`.
+        self.nodes = 0
+        #: The deepest nesting of compared objects found.
+        self.max_depth = 0
+        #: A dictionary mapping the name of each comparer used to a tuple
+        #: of the number of times it was called and the total time, in
+        #: seconds, spent in it, including nested comparisons.
+        self.comparers = {}
+        #: The time, in seconds, spent rendering the text of messages. This
+        #: is also included in the time spent in each comparer.
+        self.rendering = 0.0
+        self._size = largest
+        self._largest = []
+        self._rendering = False
+
+    @property
+    def largest(self):
+        """
+        The comparisons that involved the most pairs of objects, largest
+        first. Each is a named tuple of the number of ``nodes`` it
+        involved, the ``seconds`` it took, the ``path`` to where it was
+        found and the name of the ``comparer`` used.
+        """
+        return sorted(self._largest, reverse=True)
+
+    def _record(self, comparer, started, path, mark):
+        # Record a comparer having finished with the nested comparisons
+        # it needed, given the time and node count when it was started and
+        # the position of its breadcrumb in the path.
+        seconds = default_timer() - started[0]
+        name = _comparer_name(comparer)
+        calls, total = self.comparers.get(name, (0, 0.0))
+        self.comparers[name] = calls + 1, total + seconds
+        nodes = self.nodes - started[1] + 1
+        largest = self._largest
+        if len(largest) < self._size or nodes > largest[0].nodes:
+            subtree = _Subtree(nodes, seconds, ''.join(path[:mark + 1]), name)
+            if len(largest) < self._size:
+                heappush(largest, subtree)
+            else:
+                heapreplace(largest, subtree)
+
+    def _timed_rendering(self, render):
+        # Wrap the supplied rendering method so the time spent in it is
+        # recorded, without counting time spent in nested rendering twice.
+        def timed(*args):
+            if self._rendering:
+                return render(*args)
+            self._rendering = True
+            started = default_timer()
+            try:
+                return render(*args)
+            finally:
+                self.rendering += default_timer() - started
+                self._rendering = False
+        return timed
+
+    def __str__(self):
+        lines = ['%s, %.3fs, %s, max depth %i, %.3fs rendering' % (
+            _plural(self.calls, 'call'), self.seconds,
+            _plural(self.nodes, 'node'), self.max_depth, self.rendering
+        )]
+        if self.comparers:
+            lines.append('comparers:')
+            for seconds, name, calls in sorted(
+                ((seconds, name, calls)
+                 for name, (calls, seconds) in self.comparers.items()),
+                reverse=True
+            ):
+                lines.append('  %s: %s, %.3fs' % (
+                    name, _plural(calls, 'call'), seconds
+                ))
+        if self._largest:
+            lines.append('largest:')
+            for subtree in self.largest:
+                lines.append('  %s: %s, %.3fs, %s' % (
+                    subtree.path or 'top level',
+                    _plural(subtree.nodes, 'node'),
+                    subtree.seconds,
+                    subtree.comparer
+                ))
+        return '\n'.join(lines)
+
+
+_slow_compare = dict(callback=None, seconds=1.0, stats=False)
+
+
+def set_slow_compare_hook(callback=None, seconds=1.0, stats=False):
+    """
+    Set a callback to be called whenever a call to :func:`compare` takes
+    at least the supplied number of ``seconds``, whether or not the objects
+    were found to be equal. It is called with the time taken and the
+    :class:`CompareStats` for the call, which will be ``None`` unless
+    ``stats`` was passed to :func:`compare` or ``stats`` is ``True`` here,
+    in which case statistics are collected for every call.
+    The hook is global and will be in effect from the point this function
+    is called until the end of the current process, or until this function
+    is called again. Call it with no parameters to remove the hook.
+    """
+    _slow_compare.update(callback=callback, seconds=seconds, stats=stats)
+
+
+def _plural(count, noun):
+    return '%i %s%s' % (count, noun, '' if count == 1 else 's')
 
 
 def _mro(obj):
@@ -461,32 +1969,283 @@ def _shared_mro(x, y):
 
 _unsafe_iterables = basestring, dict
 
+# Types where objects of the same type are equal if and only if == says
+# they are and where none of the comparers will find any differences:
+_scalar_types = frozenset((
+    bool, int, float, complex, Decimal, Bytes, Unicode, type(None)
+))
+
+# Types where the comparers find differences in the same way as ==:
+_container_types = frozenset((list, tuple, dict))
+
+# Numbers that are compared using rel_tol and abs_tol, if supplied, along
+# with the types of number they can be compared with:
+_inexact_types = (float, complex, Decimal)
+_number_types = (int, float, complex, Decimal)
+
+
+def _close(x, y, rel_tol, abs_tol):
+    # Returns True if the numbers x and y are within the supplied tolerances
+    # of each other, in the same way as math.isclose().
+    try:
+        if isinstance(x, Decimal) or isinstance(y, Decimal):
+            # converting floats to Decimal is exact, the other way isn't:
+            x, y = Decimal(x), Decimal(y)
+            return abs(x - y) <= max(
+                Decimal(rel_tol) * max(abs(x), abs(y)), Decimal(abs_tol)
+            )
+        if isinstance(x, complex) or isinstance(y, complex):
+            return complex_isclose(x, y, rel_tol=rel_tol, abs_tol=abs_tol)
+        return isclose(x, y, rel_tol=rel_tol, abs_tol=abs_tol)
+    except (TypeError, ArithmeticError):
+        # NaNs, infinities and values too large to convert aren't close to
+        # anything they aren't equal to:
+        return False
+
+# The parts of a path, such as "['meta']", ".cache" or "[0]", each of which
+# is matched against the breadcrumb for one level of nesting:
+_path_segment = compile(
+    r'''\[(?:'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|[^]'"])*\]|\.[^.[]*|[^.[]+'''
+)
+
+
+def _compile_paths(patterns):
+    # Returns the supplied glob-style path patterns as tuples of regular
+    # expressions, one for each level of nesting, where * matches any
+    # characters within that level.
+    if patterns is None:
+        return None
+    if isinstance(patterns, basestring):
+        patterns = [patterns]
+    compiled = []
+    for pattern in patterns:
+        segments = []
+        position = 0
+        while position < len(pattern):
+            match = _path_segment.match(pattern, position)
+            if match is None:
+                raise ValueError('invalid path: %r' % pattern)
+            segments.append(compile('(?:%s)\\Z' % '.*'.join(
+                escape(part) for part in match.group().split('*')
+            )).match)
+            position = match.end()
+        compiled.append(tuple(segments))
+    return compiled
+
+
+def _split_path(path):
+    # Returns the breadcrumbs that make up the supplied path.
+    return _path_segment.findall(path)
+
+
+def _path_matches(segments, crumbs):
+    # Returns True if each of the supplied crumbs matches the corresponding
+    # segment of a pattern returned by _compile_paths().
+    for match, crumb in zip(segments, crumbs):
+        if match(crumb) is None:
+            return False
+    return True
+
+_nestable_types = frozenset((list, tuple, dict, set, frozenset))
+
+# pprint only lays out these differently to their repr, along with
+# dataclasses:
+try:
+    from types import SimpleNamespace
+except ImportError:  # pragma: no cover - Python 2
+    _pformatted = (Iterable, )
+else:
+    _pformatted = (Iterable, SimpleNamespace)
+
+
+def _pformat_is_repr(obj):
+    return not (isinstance(obj, _pformatted) or
+                hasattr(obj, '__dataclass_fields__'))
+
+
+class _RenderingRequired(Exception):
+    """
+    Raised when a quick, non-rendering comparison cannot be completed
+    and so a full comparison that renders messages must be done instead.
+    """
+
 
 class CompareContext(object):
 
     x_label = y_label = None
 
+    #: When ``False``, comparers should only indicate whether their
+    #: objects are different by returning ``True`` and should not spend
+    #: time rendering a message describing those differences.
+    rendering = True
+
+    #: When ``True`` and not :attr:`rendering`, comparers should carry on
+    #: making any nested comparisons they need after a difference has been
+    #: found, so that all differences between their objects are found.
+    exhaustive = False
+
+    recursive = True
+    strict = ignore_eq = False
+    max_chars = max_lines = max_differences = None
+
+    # Most comparisons are made without any of the options below and are
+    # settled without needing to keep track of anything, so these defaults
+    # are only replaced when needed, to keep contexts cheap to make:
+    _comparers = None
+    _stats = None
+    _tracking = _pruning = False
+    _ignore_paths = ()
+    _only_paths = None
+    _root_path = ()
+    _tolerances = None
+    # attributes to ignore, keyed by type and any passed to compare_object:
+    _ignored = None
+    # the options to render the messages for any differences collected
+    # with, and the differences found within the comparisons in progress:
+    _collecting = _collected = None
+    # the state of the comparison being made, see _reset() and _prepare():
+    _quick = False
+    _parts = breadcrumbs = ()
+    _message_start = _message_chars = _message_lines = 0
+    _results = _comparing = None
+    _cycle = sys.maxsize
+    _nested = 0
+    _reprs = _pformats = None
+    _spent_chars = _spent_lines = _described = _omitted = 0
+    _stopped = _lines_cut = _chars_cut = False
+
     def __init__(self, options):
-        self.registries = []
         comparers = options.pop('comparers', None)
         if comparers:
-            self.registries.append(comparers)
-        self.registries.append(_registry)
+            self._comparers = comparers
+            self.registries = [comparers, _registry, _optional_registry]
+            # lookups involving per-call comparers can't be shared:
+            self._lookup_cache = {}
+        else:
+            self.registries = [_registry, _optional_registry]
+            self._lookup_cache = _shared_lookup_cache()
+        if _optional:
+            _load_optional()
 
-        self.recursive = options.pop('recursive', True)
-        self.strict = options.pop('strict', False)
-        self.ignore_eq = options.pop('ignore_eq', False)
+        self.options = options
+        if options or _message_budget:
+            self._configure(options)
+
+    def _configure(self, options):
+        # Apply those of the supplied options that change the defaults,
+        # along with any set using set_message_budget().
+        if (_message_budget or 'max_chars' in options or
+                'max_lines' in options or 'max_differences' in options):
+            for name in 'max_chars', 'max_lines', 'max_differences':
+                value = options.pop(name, _message_budget.get(name))
+                if value is not None:
+                    setattr(self, name, value)
+
+        for name in 'recursive', 'strict', 'ignore_eq':
+            if name in options:
+                setattr(self, name, options.pop(name))
 
         if 'expected' in options or 'actual' in options:
             self.x_label = 'expected'
             self.y_label = 'actual'
-        self.x_label = options.pop('x_label', self.x_label)
-        self.y_label = options.pop('y_label', self.y_label)
-
-        self.options = options
-        self.message = ''
+        if 'x_label' in options:
+            self.x_label = options.pop('x_label')
+        if 'y_label' in options:
+            self.y_label = options.pop('y_label')
+
+        stats = options.pop('stats', None)
+        if stats is not None:
+            self._stats = stats
+            self._tracking = True
+            self._memoised = stats._timed_rendering(self._memoised)
+            self._render = stats._timed_rendering(self._render)
+            self._apply_budget = stats._timed_rendering(self._apply_budget)
+
+        if 'ignore_paths' in options or 'only_paths' in options:
+            ignore_paths = _compile_paths(options.pop('ignore_paths', None))
+            if ignore_paths:
+                self._ignore_paths = ignore_paths
+            only_paths = _compile_paths(options.pop('only_paths', None))
+            if only_paths is not None:
+                self._only_paths = only_paths
+            if ignore_paths or only_paths is not None:
+                self._pruning = True
+                # pruning needs to know where each comparison is:
+                self._tracking = True
+        # the breadcrumbs for where the objects being compared are, when
+        # they're nested in objects compared by an earlier call:
+        if 'root_path' in options:
+            self._root_path = options.pop('root_path')
+
+        # these are left in the options so that they're passed on to any
+        # worker processes:
+        rel_tol = options.get('rel_tol')
+        abs_tol = options.get('abs_tol')
+        if rel_tol is not None or abs_tol is not None:
+            self._tolerances = rel_tol or 0.0, abs_tol or 0.0
+            if min(self._tolerances) < 0:
+                raise ValueError('rel_tol and abs_tol must not be negative')
+
+    def _reset(self, rendering=True):
+        """
+        Prepare this context for a new comparison.
+        """
+        self.rendering = rendering
+        # a pass that doesn't render will be followed by one that does:
+        self._quick = not rendering
+        self._parts = self.breadcrumbs = ()
+        self._message_start = 0
+        self._message_chars = 0
+        self._message_lines = 0
+        # the shallowest comparison in progress that has been found to
+        # contain itself by comparisons that have not yet finished:
+        self._cycle = sys.maxsize
+        self._nested = 0
+        self._spent_chars = 0
+        self._spent_lines = 0
+        self._described = 0
+        self._omitted = 0
+        self._stopped = False
+        self._lines_cut = self._chars_cut = False
+        # the rest is only set up once a comparison needs it:
+        self._comparing = None
+        self._reprs = self._pformats = None
+
+    def _prepare(self):
+        # Set up what's needed for comparisons that can't be settled
+        # straight away.
+        # the message is rendered in parts, so that those describing
+        # nested differences aren't copied at each level of nesting:
+        self._parts = []
         self.breadcrumbs = []
-        self._seen = set()
+        # the results of comparisons already made, so that objects referred
+        # to from many places are only compared once:
+        self._results = {}
+        # the comparisons in progress, and how deeply each is nested, so
+        # that objects that contain themselves can be spotted:
+        self._comparing = {}
+        # where the comparisons in progress are, when collecting statistics,
+        # collecting differences or pruning:
+        self._path = list(self._root_path)
+
+    def _remember_equal(self, pairs):
+        # Record that each of the supplied pairs of objects is already known
+        # to be equal, so they won't be compared again.
+        if not pairs:
+            return
+        if self._comparing is None:
+            self._prepare()
+        results = self._results
+        for x, y in pairs:
+            results[id(x), id(y)] = x, y, False
+
+    @property
+    def message(self):
+        """
+        The message describing the differences found so far by the
+        comparison currently being made.
+        """
+        return ''.join(self._parts[self._message_start:])
 
     def extract_args(self, args):
 
@@ -526,7 +2285,199 @@ class CompareContext(object):
             r += ' ('+label+')'
         return r
 
+    def budget_spent(self):
+        """
+        Returns ``True`` if the message being rendered has reached any of
+        the ``max_chars``, ``max_lines`` or ``max_differences`` limits.
+        """
+        return self._text_spent() or (
+            self.max_differences is not None and
+            self._described >= self.max_differences
+        )
+
+    def _text_spent(self):
+        # Returns True if the message has reached max_chars or max_lines,
+        # for use once the differences to describe have been picked using
+        # _limit_differences().
+        return (
+            (self.max_chars is not None and
+             self._spent_chars >= self.max_chars) or
+            (self.max_lines is not None and
+             self._spent_lines >= self.max_lines)
+        )
+
+    def limit_reached(self):
+        """
+        Returns ``True`` if ``max_differences`` differences have already been
+        described, in which case comparers should make no more nested
+        comparisons and only describe the differences found so far.
+        This should only be called when there is more left to compare, so
+        that the message can say that the comparison was stopped.
+        """
+        if (self.max_differences is not None and
+                self._described >= self.max_differences):
+            self._stopped = True
+            return True
+        return False
+
+    def _charge(self, chars=0, lines=0):
+        self._spent_chars += chars
+        self._spent_lines += lines
+
+    def _spend(self, text):
+        # Charge the supplied text against the message budget, shortening
+        # it if it is bigger than the whole of that budget.
+        if self.max_lines is not None:
+            end = -1
+            for _ in range(self.max_lines):
+                end = text.find('\n', end + 1)
+                if end == -1:
+                    break
+            else:
+                text = text[:end] + '...'
+                self._lines_cut = True
+        if self.max_chars is not None and len(text) > self.max_chars:
+            text = text[:self.max_chars] + '...'
+            self._chars_cut = True
+        self._charge(len(text), text.count('\n'))
+        return text
+
+    def _spend_lines(self, lines):
+        # As for _spend(), but for text supplied as an iterable of lines,
+        # which is only consumed as far as is needed to fill the budget.
+        if self.max_lines is not None:
+            lines = islice(lines, self.max_lines + 1)
+        if self.max_chars is not None:
+            taken = []
+            chars = 0
+            for line in lines:
+                taken.append(line)
+                chars += len(line) + 1
+                if chars > self.max_chars:
+                    break
+            lines = taken
+        return self._spend('\n'.join(lines))
+
+    def _memoised(self, memo, obj, render):
+        # Returns render(obj), only calling it once for each object during a
+        # comparison. The object is kept in the memo so that its id can't be
+        # reused by another object while the memo is in use.
+        key = id(obj)
+        entry = memo.get(key)
+        if entry is None:
+            try:
+                text = render(obj)
+            except RecursionError:
+                text = _nested_repr.repr(obj)
+            entry = memo[key] = (obj, text)
+        return entry[1]
+
+    def _forget(self, obj):
+        # Forget any repr or pformat remembered for the supplied object.
+        key = id(obj)
+        if self._reprs:
+            self._reprs.pop(key, None)
+        if self._pformats:
+            self._pformats.pop(key, None)
+
+    def _repr(self, obj):
+        if self._reprs is None:
+            self._reprs = {}
+        return self._memoised(self._reprs, obj, repr)
+
+    def _pformat(self, obj):
+        if _pformat_is_repr(obj):
+            return self._repr(obj)
+        if self._pformats is None:
+            self._pformats = {}
+        return self._memoised(self._pformats, obj, _pformat)
+
+    def _render(self, obj, render):
+        if self.max_chars is not None:
+            key = id(obj)
+            if not (key in (self._reprs or ()) or
+                    key in (self._pformats or ())):
+                try:
+                    text, complete = _bounded_repr(obj, self.max_chars)
+                except RecursionError:
+                    text = render(obj)
+                    complete = False
+                if not complete:
+                    return self._spend(text)
+        return self._spend(render(obj))
+
+    def repr(self, obj):
+        """
+        Returns the :func:`repr` of the supplied object for use in a
+        message, shortened if needed to keep within the message budget.
+        The repr of each object is only computed once during a comparison.
+        """
+        return self._render(obj, self._repr)
+
+    def pformat(self, obj):
+        """
+        Returns the :func:`~pprint.pformat` of the supplied object for use
+        in a message, shortened if needed to keep within the message budget.
+        This is only computed once for each object during a comparison.
+        """
+        return self._render(obj, self._pformat)
+
+    def _apply_budget(self, message):
+        # Shorten the final message if needed and summarise what was left out.
+        # Once text has been cut, how much of the objects being compared
+        # went undescribed can't be known, so only the limits are given:
+        if self.max_lines is not None:
+            lines = message.split('\n')
+            if len(lines) > self.max_lines:
+                message = '\n'.join(lines[:self.max_lines])
+                self._lines_cut = True
+        if self.max_chars is not None and len(message) > self.max_chars:
+            message = message[:self.max_chars]
+            self._chars_cut = True
+        limits = []
+        if self._lines_cut:
+            limits.append(_plural(self.max_lines, 'line'))
+        if self._chars_cut:
+            limits.append(_plural(self.max_chars, 'character'))
+        if limits:
+            message += '\n\nMessage truncated to ' + ' and '.join(limits)
+            if self._omitted:
+                message += ', at least %s not shown' % _plural(
+                    self._omitted, 'difference'
+                )
+        elif self._omitted:
+            message += '\n\nMessage truncated, not shown: ' + _plural(
+                self._omitted, 'difference'
+            )
+        if self._stopped:
+            message += (
+                '\n\nComparison stopped after finding %s, the limit set by '
+                'max_differences' % _plural(self.max_differences, 'difference')
+            )
+        return message
+
     def _lookup(self, x, y):
+        type_x = type(x)
+        type_y = type(y)
+        # Only cache when the type tells the whole story; proxies and mocks
+        # can have a __class__ that differs from their actual type:
+        cacheable = (getattr(x, '__class__', None) is type_x and
+                     getattr(y, '__class__', None) is type_y)
+        if cacheable:
+            key = type_x, type_y, self.strict
+            comparer = self._lookup_cache.get(key)
+            if comparer is not None:
+                return comparer
+
+        comparer = self._find_comparer(x, y)
+
+        if cacheable:
+            if len(self._lookup_cache) >= _lookup_cache_size:
+                self._lookup_cache.clear()
+            self._lookup_cache[key] = comparer
+        return comparer
+
+    def _find_comparer(self, x, y):
         if self.strict and type(x) is not type(y):
             return compare_with_type
 
@@ -536,6 +2487,17 @@ class CompareContext(object):
                 if comparer:
                     return comparer
 
+        if isinstance(x, _byte_types) and isinstance(y, _byte_types):
+            return compare_bytes
+
+        # classes that declare the fields that make up their instances:
+        type_x = type(x)
+        if type_x is type(y):
+            if hasattr(type_x, '__dataclass_fields__'):
+                return compare_dataclass
+            if hasattr(type_x, '__attrs_attrs__'):
+                return compare_attrs
+
         # fallback for iterables
         if ((isinstance(x, Iterable) and isinstance(y, Iterable)) and not
             (isinstance(x, _unsafe_iterables) or
@@ -551,57 +2513,460 @@ class CompareContext(object):
     def _separator(self):
         return '\n\nWhile comparing %s: ' % ''.join(self.breadcrumbs[1:])
 
-    def seen(self, x, y):
-        # don't get confused by string interning:
-        if isinstance(x, basestring) and isinstance(y, basestring):
+    def _equal(self, x, y):
+        # Returns True if x and y can be shown to be equal using ==, or are
+        # numbers within any tolerances supplied, so that no comparer is
+        # needed.
+        type_x = type(x)
+        if type_x in _scalar_types and type(y) is type_x:
+            # neither strict nor ignore_eq make any difference here:
+            if x == y:
+                return True
+            return (self._tolerances is not None and
+                    type_x in _inexact_types and
+                    _close(x, y, *self._tolerances))
+        if (self._tolerances is not None and
+                isinstance(x, _number_types) and
+                isinstance(y, _number_types) and
+                (isinstance(x, _inexact_types) or
+                 isinstance(y, _inexact_types)) and
+                not (self.strict and type_x is not type(y))):
+            return _close(x, y, *self._tolerances)
+        if (self.strict or self.ignore_eq or
+                isinstance(x, _ignore_eq_types) or
+                isinstance(y, _ignore_eq_types)):
             return False
-        key = id(x), id(y)
-        if key in self._seen:
-            return True
-        self._seen.add(key)
-
-    def different(self, x, y, breadcrumb):
-
-        if self.seen(x, y):
-            # a self-referential hierarchy; so lets say this one is
-            # equal and hope the first time we saw it covers things...
+        if self._nested and type_x in _container_types and type(y) is type_x:
+            # == has just failed on a structure that these are likely to be
+            # nested in, so leave them to the comparers:
+            self._nested -= 1
             return False
-
-        recursed = bool(self.breadcrumbs)
-        self.breadcrumbs.append(breadcrumb)
-        existing_message = self.message
-        self.message = ''
-        current_message = ''
         try:
-
-            if not (self.strict or self.ignore_eq) and x == y:
+            return bool(x == y)
+        except ValueError:
+            # containers of objects where == compares element-wise can't
+            # be compared with == either, so leave it to the comparers:
+            if _ignore_eq_types:
                 return False
+            raise
+        except RecursionError:
+            # structures too deeply nested for == are left to the comparers,
+            # which don't recurse:
+            self._nested = 100
+            return False
 
-            comparer = self._lookup(x, y)
+    def different(self, x, y, breadcrumb, *args):
+        """
+        Returns a true value if ``x`` and ``y`` are different, recording
+        a message describing the differences if this context is rendering.
+
+        :param breadcrumb: A string describing where ``x`` and ``y`` are
+                           in the overall structure being compared.
+
+        :param args: If supplied, ``breadcrumb`` will be %-formatted with
+                     these, but only if a message needs to be rendered.
+        """
+        # Nested comparisons needed by the built-in comparers are made
+        # using an explicit stack rather than by recursion, so structures
+        # of any depth can be compared:
+        first = None
+        if self._comparing is None:
+            if not self._tracking:
+                # nothing has been compared yet, so objects that are equal
+                # can be settled without setting anything else up:
+                if self._equal(x, y):
+                    return False
+                first = self._start_comparer
+            self._prepare()
+        start = self._start
+        scalars = _scalar_types
+        if self._tracking:
+            start = self._tracking_start
+            if self._stats is not None:
+                # every comparison needs counting:
+                scalars = ()
+        stack = []
+        frame = None
+        try:
+            if first is None:
+                result = start(x, y, breadcrumb, args)
+            else:
+                result = first(x, y, (id(x), id(y)), breadcrumb, args)
+            while True:
+                if type(result) is _Frame:
+                    if frame is not None:
+                        stack.append(frame)
+                    frame = result
+                    result = None
+                elif frame is None:
+                    return result
+                try:
+                    step = frame.steps.send(result)
+                except StopIteration:
+                    step = None
+                if type(step) is tuple:
+                    x, y = step[0], step[1]
+                    type_x = type(x)
+                    if (type_x in scalars and type(y) is type_x and
+                            x == y):
+                        # the most common case, settled here to save a call:
+                        result = False
+                    else:
+                        result = start(*step)
+                else:
+                    if step is not None:
+                        frame.steps.close()
+                    result = self._finish(frame, step)
+                    frame = stack.pop() if stack else None
+        except BaseException:
+            if frame is not None:
+                stack.append(frame)
+            while stack:
+                self._unwind(stack.pop())
+            raise
+
+    def _start(self, x, y, breadcrumb, args):
+        # Start comparing x and y, returning the result or, if nested
+        # comparisons are needed first, a _Frame to run them from.
+        type_x = type(x)
+        if type_x in _scalar_types and type(y) is type_x and x == y:
+            return False
 
-            result = comparer(x, y, self)
-            specific_comparer = comparer is not compare_simple
+        key = id(x), id(y)
+        comparing = self._comparing
+        depth = comparing.get(key)
+        if depth is not None:
+            # x and y contain themselves and are already being compared
+            # further up, where any differences between them will be found,
+            # so treat them as equal here:
+            if depth < self._cycle:
+                self._cycle = depth
+            return False
+        # whether a comparison is pruned depends on where it is, so results
+        # from elsewhere can't be re-used when pruning:
+        known = None if self._pruning else self._results.get(key)
+        if known is not None and not (
+            known[2] and (self.rendering or self.exhaustive)
+        ):
+            # differences need describing wherever they are found, so only
+            # re-use those when no message is being rendered:
+            return known[2]
+
+        if self.rendering and (self._reprs or self._pformats):
+            # the reprs of some objects, such as Comparisons, change when
+            # they're compared, so any remembered from earlier comparisons
+            # of them can't be used:
+            self._forget(x)
+            self._forget(y)
+
+        if self._equal(x, y):
+            self._results[key] = x, y, False
+            return False
+        return self._start_comparer(x, y, key, breadcrumb, args)
 
-            if self.strict:
-                if x == y and not specific_comparer:
-                    return False
+    def _start_comparer(self, x, y, key, breadcrumb, args):
+        # Start comparing x and y, which aren't known to be equal, using
+        # the comparer for them, returning as for _start().
+        comparer = self._lookup(x, y)
+        try:
+            run = _stepwise.get(comparer, comparer)
+        except TypeError:
+            # comparers don't have to be hashable
+            run = comparer
 
-            if result:
+        comparing = self._comparing
+        depth = comparing[key] = len(comparing)
+        cycle = self._cycle
+        self._cycle = sys.maxsize
 
-                if specific_comparer and recursed:
-                    current_message = self._separator()
+        if not (self.rendering or self._tracking):
+            try:
+                result = run(x, y, self)
+            except BaseException:
+                del comparing[key]
+                self._cycle = cycle
+                raise
+            if type(result) is GeneratorType:
+                frame = _Frame(x, y, comparer, key, depth, cycle)
+                frame.steps = result
+                return frame
+            if self.strict and comparer is compare_simple and x == y:
+                result = False
+            return self._done(x, y, key, depth, cycle, bool(result))
+
+        frame = _Frame(x, y, comparer, key, depth, cycle)
+        if self._tracking:
+            self._track(frame)
+        if not self.rendering:
+            pass
+        elif self.budget_spent():
+            # stop describing differences, just find out if there are any:
+            frame.budget = True
+            self.rendering = False
+        else:
+            frame.rendering = True
+            frame.recursed = bool(self.breadcrumbs)
+            frame.message_start = self._message_start
+            frame.parts = self._message_start = len(self._parts)
+            frame.chars = self._message_chars
+            frame.lines = self._message_lines
+            frame.spent_chars = self._spent_chars
+            frame.spent_lines = self._spent_lines
+            if args:
+                breadcrumb = breadcrumb % args
+            self.breadcrumbs.append(breadcrumb)
 
-                if specific_comparer or not recursed:
-                    current_message += result
+        try:
+            result = run(x, y, self)
+            if type(result) is GeneratorType:
+                frame.steps = result
+                return frame
+            return self._finish(frame, result)
+        except BaseException:
+            self._unwind(frame)
+            raise
+
+    def _tracking_start(self, x, y, breadcrumb, args):
+        # Used in place of _start() when statistics or differences are being
+        # collected, or comparisons are being pruned, all of which need to
+        # know where each comparison is.
+        stats = self._stats
+        path = self._path
+        mark = len(path)
+        if breadcrumb is not_there:
+            path.append('')
+        else:
+            path.append(breadcrumb % args if args else breadcrumb)
+        if self._pruning and self._pruned():
+            del path[mark:]
+            return False
+        if stats is not None:
+            stats.nodes += 1
+            if mark >= stats.max_depth:
+                stats.max_depth = mark + 1
+        result = self._start(x, y, breadcrumb, args)
+        if type(result) is not _Frame:
+            del path[mark:]
+        return result
+
+    def _pruned(self):
+        # Returns True if the objects at the current path should be treated
+        # as equal because of the ignore_paths or only_paths supplied.
+        crumbs = [crumb for crumb in self._path if crumb]
+        depth = len(crumbs)
+        for segments in self._ignore_paths:
+            if len(segments) == depth and _path_matches(segments, crumbs):
+                return True
+        only = self._only_paths
+        if only is None:
+            return False
+        for segments in only:
+            # objects are compared if they are, contain, or are contained
+            # by those at one of the paths:
+            if _path_matches(segments, crumbs):
+                return False
+        return True
+
+    def _pruned_keys(self, keys, breadcrumb):
+        # Returns those of the supplied keys of a mapping being compared
+        # that aren't pruned, for when they're only in one of the mappings.
+        if not self._pruning:
+            return keys
+        path = self._path
+        kept = set()
+        for key in keys:
+            path.append(breadcrumb % (key, ))
+            try:
+                if not self._pruned():
+                    kept.add(key)
+            finally:
+                path.pop()
+        return kept
+
+    def _track(self, frame):
+        # Note where the comparison in the supplied frame is being made,
+        # along with anything else needed once it has finished.
+        frame.mark = len(self._path) - 1
+        if self._stats is not None:
+            frame.started = default_timer(), self._stats.nodes
+        if self._collected is not None and self.exhaustive:
+            frame.children = []
+            self._collected.append(frame.children)
+
+    def _tracked(self, frame, result):
+        # Record what's needed about the comparison in the supplied frame,
+        # which has finished with the supplied result.
+        path = self._path
+        if frame.started is not None:
+            self._stats._record(frame.comparer, frame.started, path,
+                                frame.mark)
+        if frame.children is not None:
+            self._collected.pop()
+            if result:
+                self._collected[-1].append(Difference(
+                    ''.join(path[:frame.mark + 1]), frame.comparer,
+                    frame.x, frame.y, frame.children, self._collecting
+                ))
+        del path[frame.mark:]
+
+    def _finish(self, frame, result):
+        # Finish the comparison in the supplied frame, returning its result.
+        comparer = frame.comparer
+        specific_comparer = comparer is not compare_simple
+        if self.strict and not specific_comparer and frame.x == frame.y:
+            result = False
+        if frame.mark is not None:
+            self._tracked(frame, result)
+        self._done(frame.x, frame.y, frame.key, frame.depth, frame.cycle,
+                   bool(result))
+
+        if frame.budget:
+            self.rendering = True
+            if result:
+                self._omitted += 1
 
-                    if self.recursive:
-                        current_message += self.message
+        if not frame.rendering:
+            return bool(result)
 
-            return result
+        current_message = ''
+        keep_nested = False
+        if result:
+            recursed = frame.recursed
+
+            if specific_comparer and recursed:
+                current_message = self._separator()
+
+            if specific_comparer or not recursed:
+                current_message += result
+                keep_nested = self.recursive
+
+            if recursed:
+                self._described += 1
+
+        if not keep_nested:
+            del self._parts[frame.parts:]
+            self._message_chars = frame.chars
+            self._message_lines = frame.lines
+            # text that won't be shown no longer counts against the budget,
+            # the current message is charged again below:
+            self._spent_chars = frame.spent_chars
+            self._spent_lines = frame.spent_lines
+        chars = self._message_chars - frame.chars
+        lines = self._message_lines - frame.lines
+        if current_message:
+            # this goes before the messages for any nested differences:
+            self._parts.insert(frame.parts, current_message)
+            current_lines = current_message.count('\n')
+            chars += len(current_message)
+            lines += current_lines
+            self._message_chars += len(current_message)
+            self._message_lines += current_lines
+        self._message_start = frame.message_start
+        self.breadcrumbs.pop()
+        if chars:
+            # make sure text from comparers that didn't use the context to
+            # render it is charged against the message budget:
+            self._spent_chars = max(self._spent_chars,
+                                    frame.spent_chars + chars)
+            self._spent_lines = max(self._spent_lines,
+                                    frame.spent_lines + lines)
+        return result
+
+    def _done(self, x, y, key, depth, cycle, result):
+        # Record that the comparison of x and y, nested to the supplied
+        # depth, has finished with the supplied result, which is returned.
+        del self._comparing[key]
+        if self._cycle < depth:
+            self._cycle = min(cycle, self._cycle)
+            if not result:
+                # x and y were only found to be equal by assuming that
+                # something they contain, and which contains them, is equal
+                # to its counterpart. That's still being worked out, so
+                # this result can't be re-used:
+                return result
+        else:
+            self._cycle = cycle
+        self._results[key] = x, y, result
+        return result
+
+    def _unwind(self, frame):
+        # Restore the state of this context when the comparison in the
+        # supplied frame has been abandoned because of an exception.
+        self._comparing.pop(frame.key, None)
+        self._cycle = frame.cycle
+        if frame.mark is not None:
+            if frame.children is not None:
+                self._collected.pop()
+            del self._path[frame.mark:]
+        if frame.steps is not None:
+            frame.steps.close()
+        if frame.budget:
+            self.rendering = True
+        elif frame.rendering:
+            del self._parts[frame.parts:]
+            self._message_start = frame.message_start
+            self._message_chars = frame.chars
+            self._message_lines = frame.lines
+            self.breadcrumbs.pop()
 
+    def _drive(self, steps):
+        # Run the steps returned by one of the stepwise comparers below,
+        # making any nested comparisons it needs, and return its result.
+        # This is used when the comparers are called directly rather
+        # than by different().
+        if type(steps) is not GeneratorType:
+            return steps
+        result = None
+        try:
+            while True:
+                try:
+                    step = steps.send(result)
+                except StopIteration:
+                    return None
+                if type(step) is not tuple:
+                    return step
+                x, y, breadcrumb, args = step
+                result = self.different(x, y, breadcrumb, *args)
         finally:
-            self.message = existing_message + current_message
-            self.breadcrumbs.pop()
+            steps.close()
+
+
+class _Frame(object):
+    # A comparison that CompareContext.different() is in the middle of.
+
+    __slots__ = ('x', 'y', 'comparer', 'key', 'depth', 'cycle', 'steps',
+                 'budget', 'rendering', 'recursed', 'message_start', 'parts',
+                 'chars', 'lines', 'spent_chars', 'spent_lines', 'mark',
+                 'started', 'children')
+
+    def __init__(self, x, y, comparer, key, depth, cycle):
+        self.x = x
+        self.y = y
+        self.comparer = comparer
+        self.key = key
+        self.depth = depth
+        self.cycle = cycle
+        self.steps = None
+        self.budget = False
+        self.rendering = False
+        self.mark = self.started = self.children = None
+
+
+# Comparers that can have their nested comparisons made without recursion,
+# mapped to functions that return either their result or a generator.
+# The generator yields (x, y, breadcrumb, args) tuples for each nested
+# comparison needed, is sent back whether those objects were different,
+# and finishes by yielding the result, if there is one:
+_stepwise = {
+    compare_object: _object_steps,
+    compare_dataclass: _dataclass_steps,
+    compare_attrs: _attrs_steps,
+    compare_exception: _exception_steps,
+    compare_sequence: _sequence_steps,
+    compare_generator: _iterable_steps,
+    compare_tuple: _tuple_steps,
+    compare_dict: _dict_steps,
+}
 
 
 def compare(*args, **kw):
@@ -660,21 +3025,131 @@ def compare(*args, **kw):
                       types to comparer functions for those types. These will
                       be added to the comparer registry for the duration
                       of this call.
+
+    :param quick: If ``True``, the objects are first checked for equality
+                  without rendering any messages. Only if they are found to
+                  be different will they be compared again, this time
+                  rendering a description of the differences. This makes
+                  comparisons that pass cheaper at the cost of making
+                  those that fail more expensive.
+
+    :param max_chars: If supplied, the message in the
+                      :class:`AssertionError` will be limited to this many
+                      characters, followed by a note saying so and giving the
+                      number of differences that weren't described at all.
+                      Once this many characters have been rendered, no more
+                      of the objects being compared will be described.
+
+    :param max_lines: If supplied, the message in the
+                      :class:`AssertionError` will be limited to this many
+                      lines in the same way as for ``max_chars``.
+
+    :param max_differences: If supplied, once this many differences within
+                            the objects being compared have been described,
+                            the comparison will stop and the message will say
+                            so. Any further differences that are already
+                            known, such as missing keys, will only be
+                            counted.
+
+    Defaults for ``max_chars``, ``max_lines`` and ``max_differences`` can be
+    set using :func:`set_message_budget`.
+
+    :param processes: If supplied, and the objects being compared are large
+                      sequences or dictionaries, the elements or values
+                      they contain will be compared using a pool of this
+                      many worker processes. Any message will be the same
+                      as if no worker processes had been used. If the
+                      elements or values can't be pickled, they will be
+                      compared in this process instead.
+
+    :param rel_tol: If supplied, floats, complex numbers and
+                    :class:`~decimal.Decimal` instances found anywhere in
+                    the objects being compared will be considered equal if
+                    they are within this relative tolerance of each other,
+                    as described for :func:`math.isclose`.
+
+    :param abs_tol: If supplied, floats, complex numbers and
+                    :class:`~decimal.Decimal` instances found anywhere in
+                    the objects being compared will be considered equal if
+                    they are within this absolute tolerance of each other,
+                    as described for :func:`math.isclose`.
+
+    :param stats: If supplied, should be a :class:`CompareStats` that will
+                  be updated with statistics about the work done by this
+                  call. Collecting these makes comparisons slower.
+
+    :param ignore_paths: If supplied, should be a sequence of paths, such as
+                         ``"['meta']['*']['ts']"`` or ``".cache"``, where
+                         ``*`` matches any characters within one level of
+                         nesting. The objects at matching paths, along with
+                         anything they contain, are not compared.
+
+    :param only_paths: If supplied, should be a sequence of paths in the same
+                       form as for ``ignore_paths``. Only the objects at
+                       matching paths, along with anything they contain, are
+                       compared.
+
+    ``processes`` is not used if either ``ignore_paths`` or ``only_paths``
+    are supplied.
     """
 
     __tracebackhide__ = True
 
+    callback = _slow_compare['callback']
+    stats = kw.get('stats')
+    if callback is None and stats is None:
+        return _compare(args, kw)
+
+    if stats is None and _slow_compare['stats']:
+        stats = kw['stats'] = CompareStats()
+    started = default_timer()
+    try:
+        return _compare(args, kw)
+    finally:
+        seconds = default_timer() - started
+        if stats is not None:
+            stats.calls += 1
+            stats.seconds += seconds
+        if callback is not None and seconds >= _slow_compare['seconds']:
+            callback(seconds, stats)
+
+
+def _compare(args, kw):
+    # The work done by compare(), which may be timed.
+
+    __tracebackhide__ = True
+
     prefix = kw.pop('prefix', None)
     suffix = kw.pop('suffix', None)
     raises = kw.pop('raises', True)
+    quick = kw.pop('quick', False)
+    processes = kw.pop('processes', None)
     context = CompareContext(kw)
 
     x, y = context.extract_args(args)
 
+    equal = ()
+    if processes and not context._pruning:
+        if context._equal(x, y):
+            return
+        equal = _equal_in_parallel(x, y, context, processes)
+
+    if quick:
+        context._reset(rendering=False)
+        context._remember_equal(equal)
+        try:
+            if not context.different(x, y, not_there):
+                return
+        except _RenderingRequired:
+            pass
+        context._reset()
+
+    context._remember_equal(equal)
+
     if not context.different(x, y, not_there):
         return
 
-    message = context.message
+    message = context._apply_budget(context.message)
     if prefix:
         message = prefix + ': ' + message
     if suffix:
@@ -685,6 +3160,254 @@ def compare(*args, **kw):
     return message
 
 
+class Difference(object):
+    """
+    A difference found by :func:`differences` between two objects, along
+    with any differences found between the objects they contain.
+    """
+
+    def __init__(self, path, comparer, x, y, children, options):
+        #: Where the objects that differ were found, relative to the objects
+        #: passed to :func:`differences`, such as ``"['a'][0]"``. This is an
+        #: empty string for those objects themselves.
+        self.path = path
+        #: The name of the comparer that found the difference, without any
+        #: ``compare_`` prefix, such as ``'sequence'`` or ``'dict'``.
+        self.kind = _comparer_name(comparer)
+        if self.kind.startswith('compare_'):
+            self.kind = self.kind[len('compare_'):]
+        #: The objects that differ.
+        self.x = x
+        self.y = y
+        #: The differences found between the objects contained by
+        #: :attr:`x` and :attr:`y`, in the order they were found.
+        self.children = children
+        self._options = options
+        self._message = None
+
+    @property
+    def message(self):
+        """
+        The description :func:`compare` gives of the differences between
+        :attr:`x` and :attr:`y`. This is only rendered when first needed.
+        """
+        if self._message is None:
+            if _iter_once(self.x) or _iter_once(self.y):
+                self._message = (
+                    '%s not as expected, but can only be iterated over once'
+                    % self.kind
+                )
+            else:
+                self._message = compare(
+                    self.x, self.y, raises=False,
+                    root_path=_split_path(self.path), **self._options
+                ) or ''
+        return self._message
+
+    def walk(self):
+        """
+        Yield this difference followed by all of those found within it,
+        depth first, in the order they were found.
+        """
+        pending = [self]
+        while pending:
+            difference = pending.pop()
+            yield difference
+            pending.extend(reversed(difference.children))
+
+    def as_dict(self, reprs=False):
+        """
+        Returns a dictionary of the :attr:`path`, :attr:`kind` and
+        :attr:`children` of this difference, with each child also returned
+        as a dictionary, suitable for serialising to JSON.
+
+        :param reprs: If ``True``, the :func:`repr` of :attr:`x` and
+                      :attr:`y` will also be included for each difference.
+        """
+        root = {}
+        pending = [(self, root)]
+        while pending:
+            difference, result = pending.pop()
+            result['path'] = difference.path
+            result['kind'] = difference.kind
+            if reprs:
+                result['x'] = repr(difference.x)
+                result['y'] = repr(difference.y)
+            children = result['children'] = []
+            for child in difference.children:
+                children.append({})
+                pending.append((child, children[-1]))
+        return root
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return '<Difference: %s at %s>' % (
+            self.kind, self.path or 'top level'
+        )
+
+
+def _iter_once(obj):
+    # Returns True if obj is an iterator that can only be iterated over once.
+    try:
+        return iter(obj) is obj
+    except TypeError:
+        return False
+
+
+def differences(*args, **kw):
+    """
+    Compare two objects in the same way as :func:`compare`, but return a
+    :class:`Difference` describing where any differences were found, or
+    ``None`` if the objects are the same. No messages are rendered until
+    the :attr:`~Difference.message` of a difference is needed.
+
+    Unlike :func:`compare`, all differences are found rather than just the
+    first in each list, tuple or generator.
+
+    The objects and any other parameters are passed as for :func:`compare`,
+    apart from ``prefix``, ``suffix``, ``raises`` and ``quick``, which
+    aren't used.
+    """
+    processes = kw.pop('processes', None)
+    for name in 'prefix', 'suffix', 'raises', 'quick':
+        kw.pop(name, None)
+    options = dict(kw)
+    for name in 'x', 'y', 'expected', 'actual', 'stats':
+        options.pop(name, None)
+    context = CompareContext(kw)
+    x, y = context.extract_args(args)
+    options['x_label'] = context.x_label
+    options['y_label'] = context.y_label
+
+    equal = ()
+    if processes and not context._pruning:
+        if context._equal(x, y):
+            return None
+        equal = _equal_in_parallel(x, y, context, processes)
+
+    context._reset(rendering=False)
+    # all the differences are being found, so no second pass is needed:
+    context._quick = False
+    context.exhaustive = True
+    context._tracking = True
+    context._collecting = options
+    context._collected = [[]]
+    context._remember_equal(equal)
+    context.different(x, y, not_there)
+    found = context._collected[0]
+    return found[0] if found else None
+
+
+# Sequences and dictionaries with fewer elements than this are always
+# compared in the current process, as it isn't worth starting workers:
+_parallel_threshold = 1000
+
+
+# The context and pairs of objects being compared, for use by worker
+# processes forked while a comparison is being made in parallel:
+_parallel_job = None
+
+
+def _forking_context():
+    # Returns a multiprocessing context that starts worker processes by
+    # forking this one, if that's possible.
+    if PY3:
+        import multiprocessing
+        if 'fork' in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context('fork')
+
+
+def _compare_pairs(context, pairs):
+    # Returns the positions of the pairs of objects supplied that differ.
+    # Pairs that couldn't be compared are also returned, so that the error
+    # is raised when they are compared again.
+    context._reset(rendering=False)
+    differ = []
+    for position, (x, y) in enumerate(pairs):
+        try:
+            if context.different(x, y, not_there):
+                differ.append(position)
+        except Exception:
+            differ.append(position)
+    return differ
+
+
+def _compare_forked(span):
+    context, pairs = _parallel_job
+    start, end = span
+    return _compare_pairs(context, pairs[start:end])
+
+
+def _compare_pickled(task):
+    options, pairs = loads(task)
+    return _compare_pairs(CompareContext(options), pairs)
+
+
+def _equal_in_parallel(x, y, context, processes):
+    # Compare the objects directly within x and y using a pool of worker
+    # processes, returning those pairs found to be equal. If this isn't
+    # possible or worthwhile, an empty sequence is returned.
+    global _parallel_job
+    comparer = context._lookup(x, y)
+    if comparer is compare_dict:
+        pairs = [(x[key], y[key]) for key in x if key in y]
+    elif comparer is compare_sequence or comparer is compare_tuple:
+        if not context.get_option('ordered', True):
+            # which elements are to be compared isn't known up front:
+            return ()
+        pairs = list(zip(x, y))
+    else:
+        return ()
+    if len(pairs) < _parallel_threshold:
+        return ()
+
+    # several chunks for each worker, so they finish at similar times:
+    size = -(-len(pairs) // (processes * 4))
+    spans = [(start, min(start + size, len(pairs)))
+             for start in range(0, len(pairs), size)]
+
+    forking = _forking_context()
+    if forking is None:
+        # the workers need to be sent everything they need to make the
+        # comparisons. They have their own registry of comparers, so only
+        # those passed for this comparison need to be sent:
+        options = dict(context.options, comparers=context._comparers,
+                       strict=context.strict, ignore_eq=context.ignore_eq)
+        try:
+            tasks = [dumps((options, pairs[start:end]), HIGHEST_PROTOCOL)
+                     for start, end in spans]
+        except (PicklingError, AttributeError, TypeError):
+            # the objects or comparers can't be pickled, so they can only
+            # be compared in this process:
+            return ()
+        import multiprocessing
+        pool = multiprocessing.Pool(processes)
+        function = _compare_pickled
+    else:
+        # forked workers share the objects being compared with this
+        # process, so nothing needs to be pickled:
+        _parallel_job = context, pairs
+        pool = forking.Pool(processes)
+        tasks = spans
+        function = _compare_forked
+
+    try:
+        results = pool.map(function, tasks)
+    finally:
+        _parallel_job = None
+        pool.close()
+        pool.join()
+
+    equal = []
+    for (start, end), differ in zip(spans, results):
+        differ = set(differ)
+        equal.extend(pair for position, pair in enumerate(pairs[start:end])
+                     if position not in differ)
+    return equal
+
+
 class Comparison(object):
     """
     These are used when you need to compare objects
@@ -740,9 +3463,18 @@ class Comparison(object):
         if self.v is None:
             return True
 
+        self.failed = self._describe(other)
+        return not self.failed
+
+    def __ne__(self, other):
+        return not(self == other)
+
+    def _describe(self, other):
+        # Returns a description of how the attributes of other differ from
+        # those expected, or None if they do not.
         remaining_keys = set(self.v.keys())
         if self.strict:
-            v = _extract_attrs(other)
+            v = _extract_attrs(other) or {}
             remaining_keys -= set(v.keys())
         else:
             v = {}
@@ -756,17 +3488,32 @@ class Comparison(object):
 
         kw = {'x_label': 'Comparison', 'y_label': 'actual'}
         context = CompareContext(kw)
-        self.failed = _compare_mapping(self.v,
-                                       v,
-                                       context,
-                                       obj_for_class=not_there,
-                                       prefix='attributes ',
-                                       breadcrumb='.%s',
-                                       check_y_not_x=self.strict)
-        return not self.failed
-
-    def __ne__(self, other):
-        return not(self == other)
+        # as for different(), attributes that are equal need nothing more:
+        if context._equal(self.v, v):
+            return None
+        return _compare_mapping(self.v,
+                                v,
+                                context,
+                                obj_for_class=not_there,
+                                prefix='attributes ',
+                                breadcrumb='.%s',
+                                check_y_not_x=self.strict)
+
+    def compile(self):
+        """
+        Return a compiled form of this :class:`Comparison` for use when it
+        will be compared with many objects, such as when searching a long
+        list for a matching object.
+
+        Compiled comparisons work out which attributes to fetch once, when
+        compiled, and check whether an object matches without describing
+        any differences. The description of why the last comparison failed
+        is only rendered when it is needed, such as when the compiled
+        comparison's :func:`repr` is taken.
+        Changes made to the :class:`Comparison` after it has been compiled
+        have no effect on the compiled form.
+        """
+        return _CompiledComparison(self)
 
     def __repr__(self):
         name = getattr(self.c, '__module__', '')
@@ -801,6 +3548,104 @@ class Comparison(object):
         return r
 
 
+class _CompiledComparison(Comparison):
+    """
+    The compiled form of a :class:`Comparison`, as returned by
+    :meth:`Comparison.compile`.
+    """
+
+    _failed = None
+    # the object the last comparison failed against, while the description
+    # of why it failed has yet to be rendered:
+    _other = not_there
+
+    def __init__(self, comparison):
+        self.c = comparison.c
+        self.strict = comparison.strict
+        self.v = comparison.v
+        if self.v is not None:
+            self.v = dict(self.v)
+            self._keys = tuple(self.v)
+            self._expected = tuple(self.v[key] for key in self._keys)
+            self._getter = attrgetter(*self._keys) if self._keys else None
+        # reused by each comparison that isn't nested within another:
+        self._context = None
+
+    @property
+    def failed(self):
+        if self._other is not not_there:
+            self._failed = self._describe(self._other)
+            self._other = not_there
+        return self._failed
+
+    def __eq__(self, other):
+        self._other = not_there
+        if self.c is not other.__class__:
+            self._failed = 'wrong type'
+            return False
+
+        self._failed = None
+        if self.v is None or self._matches(other):
+            return True
+
+        self._other = other
+        return False
+
+    def _actual(self, other):
+        # Returns the values of the expected attributes of other, or None if
+        # any are missing or, when strict, if other has attributes that
+        # are not expected.
+        keys = self._keys
+        if not self.strict:
+            if self._getter is None:
+                return ()
+            try:
+                actual = self._getter(other)
+            except AttributeError:
+                return None
+            return (actual, ) if len(keys) == 1 else actual
+
+        attrs = _extract_attrs(other) or {}
+        if len(attrs) > len(keys):
+            return None
+        for key in attrs:
+            if key not in self.v:
+                return None
+        actual = []
+        for key in keys:
+            value = attrs.get(key, not_there)
+            if value is not_there:
+                value = getattr(other, key, not_there)
+                if value is not_there:
+                    return None
+            actual.append(value)
+        return actual
+
+    def _matches(self, other):
+        actual = self._actual(other)
+        if actual is None:
+            return False
+
+        if _optional:
+            _load_optional()
+        context = self._context
+        # a new context is needed if the comparison is nested within one
+        # already in progress or the registry has been replaced:
+        if context is None or context.registries[0] is not _registry:
+            context = CompareContext({})
+        self._context = None
+        try:
+            context._reset(rendering=False)
+            for key, x, y in zip(self._keys, self._expected, actual):
+                if context.different(x, y, '.%s', key):
+                    return False
+        except _RenderingRequired:
+            return not self._describe(other)
+        finally:
+            self._context = context
+        return True
+
+
 class StringComparison:
     """
     An object that can be used in comparisons of expected and actual
@@ -863,22 +3708,31 @@ class RoundComparison:
         return '<R:%s to %i digits>' % (self.rounded, self.precision)
 
 
-def diff(x, y, x_label='', y_label=''):
+def _diff_lines(x, y, x_label, y_label, use_difflib):
+    x_lines = x.split('\n')
+    y_lines = y.split('\n')
+    x_label = x_label or 'first'
+    y_label = y_label or 'second'
+    if use_difflib:
+        return difflib.unified_diff(x_lines, y_lines, x_label, y_label,
+                                    lineterm='')
+    return unified_diff(x_lines, y_lines, x_label, y_label)
+
+
+def diff(x, y, x_label='', y_label='', use_difflib=False):
     """
-    A shorthand function that uses :mod:`difflib` to return a
-    string representing the differences between the two string
-    arguments.
+    A shorthand function that returns a string containing a unified diff
+    of the two string arguments.
 
     Most useful when comparing multi-line strings.
+
+    The diff is found using the patience diff algorithm, which is fast even
+    for strings with tens of thousands of lines. If you need exactly the
+    same output as :func:`difflib.unified_diff`, pass ``use_difflib=True``.
+    To process the lines of a large diff as they are produced, use
+    :func:`testfixtures.alignment.unified_diff`.
     """
-    return '\n'.join(
-        unified_diff(
-            x.split('\n'),
-            y.split('\n'),
-            x_label or 'first',
-            y_label or 'second',
-            lineterm='')
-    )
+    return '\n'.join(_diff_lines(x, y, x_label, y_label, use_difflib))
 
 
 class RangeComparison:
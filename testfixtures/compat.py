@@ -27,8 +27,12 @@ if PY_VERSION > (3, 0):
     xrange = range
     from itertools import zip_longest
     from functools import reduce
-    from collections.abc import Iterable
+    from collections.abc import Iterable, Mapping
     from abc import ABC
+    RecursionError = RecursionError
+    from reprlib import Repr
+    from math import isclose
+    from cmath import isclose as complex_isclose
 
 else:
 
@@ -50,6 +54,23 @@ else:
     xrange = xrange
     from itertools import izip_longest as zip_longest
     reduce = reduce
-    from collections import Iterable
+    from collections import Iterable, Mapping
     from abc import ABCMeta
     ABC = ABCMeta('ABC', (object,), {}) # compatible with Python 2 *and* 3
+    RecursionError = RuntimeError
+    from repr import Repr
+
+    def isclose(a, b, rel_tol=1e-09, abs_tol=0.0):
+        if rel_tol < 0.0 or abs_tol < 0.0:
+            raise ValueError('tolerances must be non-negative')
+        if a == b:
+            return True
+        difference = abs(b - a)
+        if difference == float('inf'):
+            # infinities are only close to themselves:
+            return False
+        return (difference <= abs(rel_tol * b) or
+                difference <= abs(rel_tol * a) or
+                difference <= abs_tol)
+
+    complex_isclose = isclose
@@ -177,7 +177,8 @@ class LogCapture(logging.Handler):
         return compare(
             expected,
             actual=self.actual(),
-            recursive=self.recursive_check
+            recursive=self.recursive_check,
+            quick=True
             )
 
     def check_present(self, *expected, **kw):
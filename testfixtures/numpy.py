@@ -0,0 +1,156 @@
+"""
+testfixtures.numpy
+------------------
+
+Comparers for :mod:`numpy` types. These are used by :func:`compare`
+automatically once :mod:`numpy` has been imported.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+
+
+def _numeric(array):
+    return np.issubdtype(array.dtype, np.number)
+
+
+def _tolerances(context):
+    # Returns the rtol and atol to use, falling back to the rel_tol and
+    # abs_tol used for numbers anywhere in the objects being compared.
+    rtol = context.get_option('rtol')
+    atol = context.get_option('atol')
+    if rtol is None and atol is None:
+        rtol = context.get_option('rel_tol')
+        atol = context.get_option('abs_tol')
+    return rtol, atol
+
+
+def _mismatched(x, y, rtol, atol, equal_nan):
+    # Returns a boolean array that is True wherever x and y differ.
+    if (rtol is not None or atol is not None) and _numeric(x) and _numeric(y):
+        equal = np.isclose(x, y, rtol=rtol or 0, atol=atol or 0,
+                           equal_nan=equal_nan)
+    else:
+        equal = np.asarray(x == y)
+        if (equal_nan and
+                np.issubdtype(x.dtype, np.inexact) and
+                np.issubdtype(y.dtype, np.inexact)):
+            equal = equal | (np.isnan(x) & np.isnan(y))
+    # older versions of numpy return a single False when the arrays
+    # can't be compared element-wise:
+    return ~np.broadcast_to(equal, x.shape)
+
+
+def _max_errors(x, y):
+    # Returns the largest absolute and relative differences between the
+    # elements of x and y, ignoring any that aren't numbers.
+    dtype = np.result_type(x.dtype, y.dtype, np.float64)
+    x = x.astype(dtype)
+    y = y.astype(dtype)
+    with np.errstate(all='ignore'):
+        absolute = np.abs(x - y)
+        relative = absolute / np.abs(y)
+    result = []
+    for errors in absolute, relative:
+        errors = errors[~np.isnan(errors)]
+        result.append(float(errors.max()) if errors.size else None)
+    return result
+
+
+def _index(array, flat_index):
+    return '[%s]' % ', '.join(
+        str(i) for i in np.unravel_index(flat_index, array.shape)
+    )
+
+
+def compare_ndarray(x, y, context):
+    """
+    Returns a textual description of the differences between the two
+    supplied :class:`numpy.ndarray` instances. The elements of the arrays
+    are compared using vectorised operations and the description gives the
+    number of elements that differ, the largest differences between them
+    and the first few of those elements.
+
+    :param rtol: The relative tolerance to use when comparing numeric arrays,
+                 as described for :func:`numpy.isclose`. By default, elements
+                 must be exactly equal.
+
+    :param atol: The absolute tolerance to use when comparing numeric arrays,
+                 as described for :func:`numpy.isclose`. By default, elements
+                 must be exactly equal.
+
+    If neither ``rtol`` nor ``atol`` is supplied, the ``rel_tol`` and
+    ``abs_tol`` passed to :func:`compare` are used in their place.
+
+    :param equal_nan: If ``True``, the default, ``NaN`` elements will be
+                      treated as equal to ``NaN`` elements in the same
+                      position in the other array.
+
+    :param mismatch_limit: The maximum number of differing elements to show.
+                           Defaults to 10.
+
+    If ``strict`` is ``True``, the arrays must also have the same
+    :attr:`~numpy.ndarray.dtype`.
+    """
+    name = type(x).__name__
+    if x.shape != y.shape:
+        if not context.rendering:
+            return True
+        return '%s not as expected:\n\nshape: %s != %s' % (
+            name,
+            context.label('x', x.shape),
+            context.label('y', y.shape),
+        )
+
+    rtol, atol = _tolerances(context)
+    mismatched = _mismatched(
+        x, y, rtol, atol, context.get_option('equal_nan', True)
+    )
+    count = np.count_nonzero(mismatched)
+    dtype_differs = x.dtype != y.dtype
+    if not (count or (context.strict and dtype_differs)):
+        return
+    if not context.rendering:
+        return True
+
+    lines = ['%s not as expected:' % name, '']
+    if dtype_differs:
+        lines.append('dtype: %s != %s' % (
+            context.label('x', x.dtype),
+            context.label('y', y.dtype),
+        ))
+    if not count:
+        return '\n'.join(lines)
+
+    summary = '%i of %i elements differ' % (count, x.size)
+    if rtol is not None or atol is not None:
+        summary += ' using rtol=%r, atol=%r' % (rtol or 0, atol or 0)
+    lines.append(summary)
+
+    if _numeric(x) and _numeric(y):
+        absolute, relative = _max_errors(x[mismatched], y[mismatched])
+        if absolute is not None:
+            lines.append('max absolute difference: %r' % absolute)
+        if relative is not None:
+            lines.append('max relative difference: %r' % relative)
+
+    limit = context.get_option('mismatch_limit', 10)
+    lines.append('')
+    if count > limit:
+        lines.append('differences (first %i):' % limit)
+    else:
+        lines.append('differences:')
+    for flat_index in np.flatnonzero(mismatched)[:limit]:
+        lines.append('%s: %s != %s' % (
+            _index(x, flat_index),
+            context.label('x', context.repr(x.item(flat_index))),
+            context.label('y', context.repr(y.item(flat_index))),
+        ))
+    return '\n'.join(lines)
+
+
+comparers = {np.ndarray: compare_ndarray}
+
+# == on arrays compares element-wise, so it can't be used to decide whether
+# two arrays are equal:
+ignore_eq = (np.ndarray, )
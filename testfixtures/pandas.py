@@ -0,0 +1,320 @@
+"""
+testfixtures.pandas
+-------------------
+
+Comparers for :mod:`pandas` types. Importing this module registers them for
+use by :func:`compare`.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+from pandas import DataFrame, Index, Series
+from pandas.api.types import (
+    is_bool_dtype, is_complex_dtype, is_numeric_dtype
+)
+
+from .comparison import register
+from .numpy import _max_errors, _tolerances
+
+
+def _isna(obj):
+    try:
+        return np.asarray(obj.isna())
+    except NotImplementedError:
+        # MultiIndex
+        return np.zeros(len(obj), dtype=bool)
+
+
+def _real(obj):
+    dtype = obj.dtype
+    return (is_numeric_dtype(dtype) and
+            not is_bool_dtype(dtype) and
+            not is_complex_dtype(dtype))
+
+
+def _floats(obj):
+    return obj.to_numpy(dtype=float, na_value=np.nan)
+
+
+def _values(x, y):
+    # Return arrays of values from x and y that can be compared element-wise,
+    # avoiding boxing them into Python objects where possible.
+    if isinstance(x.dtype, np.dtype) and isinstance(y.dtype, np.dtype):
+        return x.to_numpy(), y.to_numpy()
+    return x.to_numpy(dtype=object), y.to_numpy(dtype=object)
+
+
+def _mismatched(x, y, context):
+    # Returns a boolean array that is True wherever the values of x and y,
+    # which must be the same length, differ.
+    rtol, atol = _tolerances(context)
+    x_na = _isna(x)
+    y_na = _isna(y)
+    if (rtol is not None or atol is not None) and _real(x) and _real(y):
+        equal = np.isclose(_floats(x), _floats(y),
+                           rtol=rtol or 0, atol=atol or 0)
+    else:
+        x_values, y_values = _values(x, y)
+        valid = ~(x_na | y_na)
+        equal = np.zeros(len(x), dtype=bool)
+        equal[valid] = x_values[valid] == y_values[valid]
+    if context.get_option('equal_nan', True):
+        equal |= x_na & y_na
+    return ~equal
+
+
+def _scalar(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if type(value) is tuple:
+        return tuple(_scalar(v) for v in value)
+    return value
+
+
+def _describe_mismatches(x, y, mismatched, labels, context, noun):
+    # Returns lines describing the values that differ between x and y.
+    # If labels is None, positions are shown instead and, since these
+    # will be index labels, numeric differences are not summarised.
+    count = np.count_nonzero(mismatched)
+    rtol, atol = _tolerances(context)
+    summary = '%i of %i %s differ' % (count, len(x), noun)
+    if rtol is not None or atol is not None:
+        summary += ' using rtol=%r, atol=%r' % (rtol or 0, atol or 0)
+    lines = [summary]
+
+    if labels is not None and _real(x) and _real(y):
+        absolute, relative = _max_errors(_floats(x)[mismatched],
+                                         _floats(y)[mismatched])
+        if absolute is not None:
+            lines.append('max absolute difference: %r' % absolute)
+        if relative is not None:
+            lines.append('max relative difference: %r' % relative)
+
+    limit = context.get_option('mismatch_limit', 10)
+    lines.append('')
+    if count > limit:
+        lines.append('differences (first %i):' % limit)
+    else:
+        lines.append('differences:')
+    for i in np.flatnonzero(mismatched)[:limit]:
+        if labels is None:
+            label = '[%i]' % i
+        else:
+            label = context.repr(_scalar(labels[i]))
+        lines.append('%s: %s != %s' % (
+            label,
+            context.label('x', context.repr(_scalar(x[i]))),
+            context.label('y', context.repr(_scalar(y[i]))),
+        ))
+    return lines
+
+
+def _aligned(x, y, context):
+    # Returns y with its index reordered to match that of x, if requested and
+    # possible, or None otherwise.
+    if not context.get_option('check_like', False):
+        return None
+    if not (x.index.is_unique and y.index.is_unique):
+        return None
+    if len(x.index) != len(y.index) or len(x.index.difference(y.index)):
+        return None
+    return y.reindex(x.index)
+
+
+def compare_index(x, y, context):
+    """
+    Returns a textual description of the differences between the two
+    supplied :class:`pandas.Index` instances.
+
+    Indexes of the same length are compared position by position, otherwise
+    the labels present in only one of them are described.
+    """
+    lines = []
+    if x.names != y.names:
+        lines.append('names: %s != %s' % (
+            context.label('x', context.repr(list(x.names))),
+            context.label('y', context.repr(list(y.names))),
+        ))
+    if context.strict and x.dtype != y.dtype:
+        lines.append('dtype: %s != %s' % (
+            context.label('x', x.dtype),
+            context.label('y', y.dtype),
+        ))
+
+    if len(x) == len(y):
+        mismatched = _mismatched(x, y, context)
+        if not (lines or mismatched.any()):
+            return
+        if not context.rendering:
+            return True
+        if mismatched.any():
+            lines.extend(_describe_mismatches(
+                x, y, mismatched, None, context, 'labels'
+            ))
+    else:
+        if not context.rendering:
+            return True
+        limit = context.get_option('mismatch_limit', 10)
+        lines.append('length: %s != %s' % (
+            context.label('x', len(x)),
+            context.label('y', len(y)),
+        ))
+        x_label = context.x_label or 'first'
+        y_label = context.y_label or 'second'
+        for missing, present, absent in (
+            (x.difference(y, sort=False), x_label, y_label),
+            (y.difference(x, sort=False), y_label, x_label),
+        ):
+            if len(missing):
+                lines.extend(('', 'in %s but not %s%s:' % (
+                    present, absent,
+                    ' (first %i)' % limit if len(missing) > limit else ''
+                )))
+                lines.append(context.repr(
+                    [_scalar(label) for label in missing[:limit]]
+                ))
+
+    return '%s not as expected:\n\n%s' % (
+        type(x).__name__, '\n'.join(lines)
+    )
+
+
+def _series_message(x, lines):
+    message = '%s not as expected:' % type(x).__name__
+    if lines:
+        message += '\n\n' + '\n'.join(lines)
+    return message
+
+
+def compare_series(x, y, context):
+    """
+    Returns a textual description of the differences between the two
+    supplied :class:`pandas.Series` instances. The values are compared
+    using vectorised operations and the description gives the number of
+    rows that differ, the largest differences between them and the first
+    few of those rows.
+
+    :param rtol: The relative tolerance to use when comparing numeric values,
+                 as described for :func:`numpy.isclose`. By default, values
+                 must be exactly equal.
+
+    :param atol: The absolute tolerance to use when comparing numeric values,
+                 as described for :func:`numpy.isclose`. By default, values
+                 must be exactly equal.
+
+    :param equal_nan: If ``True``, the default, missing values will be
+                      treated as equal to missing values in the same row.
+
+    If neither ``rtol`` nor ``atol`` is supplied, the ``rel_tol`` and
+    ``abs_tol`` passed to :func:`compare` are used in their place.
+
+    :param check_like: If ``True``, the order of the rows will be ignored,
+                       provided both indexes have the same, unique, labels.
+
+    :param mismatch_limit: The maximum number of differing rows to show.
+                           Defaults to 10.
+
+    If ``strict`` is ``True``, the dtypes must also be the same.
+    """
+    lines = []
+    if x.name != y.name:
+        lines.append('name: %s != %s' % (
+            context.label('x', context.repr(x.name)),
+            context.label('y', context.repr(y.name)),
+        ))
+    if context.strict and x.dtype != y.dtype:
+        lines.append('dtype: %s != %s' % (
+            context.label('x', x.dtype),
+            context.label('y', y.dtype),
+        ))
+
+    aligned = _aligned(x, y, context)
+    if aligned is not None:
+        y = aligned
+    elif context.different(x.index, y.index, '.index'):
+        if not context.rendering:
+            return True
+        if len(x) != len(y):
+            return _series_message(x, lines)
+
+    mismatched = _mismatched(x, y, context)
+    if not (lines or mismatched.any()):
+        if context.message:
+            # only the index differs:
+            return '%s not as expected:' % type(x).__name__
+        return
+    if not context.rendering:
+        return True
+    if mismatched.any():
+        if lines:
+            lines.append('')
+        lines.extend(_describe_mismatches(
+            x.array, y.array, mismatched, x.index, context, 'rows'
+        ))
+    return _series_message(x, lines)
+
+
+def compare_dataframe(x, y, context):
+    """
+    Returns a textual description of the differences between the two
+    supplied :class:`pandas.DataFrame` instances.
+
+    The columns and index are compared first and then the values in each
+    column present in both are compared as described for
+    :func:`compare_series`, which also describes the parameters that can be
+    used. If ``check_like`` is ``True``, the order of both the columns and the
+    rows will be ignored.
+    """
+    unique = x.columns.is_unique and y.columns.is_unique
+    columns = x.columns
+    if not (context.get_option('check_like', False) and unique and
+            len(x.columns) == len(y.columns) and
+            not len(x.columns.difference(y.columns))):
+        if context.different(x.columns, y.columns, '.columns'):
+            if not context.rendering:
+                return True
+            columns = [c for c in x.columns if c in set(y.columns)]
+
+    if unique:
+        positions = [(column,
+                      x.columns.get_loc(column),
+                      y.columns.get_loc(column)) for column in columns]
+    elif x.columns.equals(y.columns):
+        # duplicated columns can't be found by label, so they are compared
+        # by position instead:
+        positions = [(column, i, i) for i, column in enumerate(x.columns)]
+    else:
+        # which columns to compare can't be told, but the differences in
+        # the columns have already been found:
+        positions = []
+
+    aligned = _aligned(x, y, context)
+    if aligned is not None:
+        y = aligned
+    elif context.different(x.index, y.index, '.index'):
+        if not context.rendering:
+            return True
+        if len(x) != len(y):
+            return '%s not as expected:' % type(x).__name__
+        # compare values by position:
+        y = y.set_axis(x.index)
+
+    differing = []
+    for column, x_position, y_position in positions:
+        if context.different(x.iloc[:, x_position], y.iloc[:, y_position],
+                             '[%r]', column):
+            if not context.rendering:
+                return True
+            differing.append(column)
+
+    if not (differing or context.message):
+        return
+    message = '%s not as expected:' % type(x).__name__
+    if differing:
+        message += '\n\nvalues differ in columns:\n' + context.repr(differing)
+    return message
+
+
+register(Index, compare_index, ignore_eq=True)
+register(Series, compare_series, ignore_eq=True)
+register(DataFrame, compare_dataframe, ignore_eq=True)
@@ -197,7 +197,8 @@ class TempDirectory:
                 actual=tuple(self.actual(
                     path, recursive, files_only, followlinks
                 )),
-                recursive=False)
+                recursive=False,
+                quick=True)
 
     def check(self, *expected):
         """
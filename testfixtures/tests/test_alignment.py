@@ -0,0 +1,166 @@
+from difflib import unified_diff as difflib_unified_diff
+from random import Random
+
+from testfixtures import compare
+from testfixtures.alignment import grouped_opcodes, opcodes, unified_diff
+
+
+def check(a, b, patience=False):
+    # the opcodes must turn a into b:
+    result = []
+    for tag, i1, i2, j1, j2 in opcodes(a, b, patience=patience):
+        if tag == 'equal':
+            compare(a[i1:i2], expected=b[j1:j2])
+        result.extend(b[j1:j2])
+    compare(result, expected=b)
+
+
+class TestOpcodes(object):
+
+    def test_equal(self):
+        compare(opcodes([1, 2, 3], [1, 2, 3]),
+                expected=[('equal', 0, 3, 0, 3)])
+
+    def test_both_empty(self):
+        compare(opcodes([], []), expected=[])
+
+    def test_insert_at_start(self):
+        compare(opcodes([1, 2, 3], [0, 1, 2, 3]),
+                expected=[('insert', 0, 0, 0, 1), ('equal', 0, 3, 1, 4)])
+
+    def test_delete_at_end(self):
+        compare(opcodes([1, 2, 3], [1, 2]),
+                expected=[('equal', 0, 2, 0, 2), ('delete', 2, 3, 2, 2)])
+
+    def test_replace(self):
+        compare(opcodes([1, 2, 3], [1, 4, 3]),
+                expected=[('equal', 0, 1, 0, 1),
+                          ('replace', 1, 2, 1, 2),
+                          ('equal', 2, 3, 2, 3)])
+
+    def test_nothing_in_common(self):
+        compare(opcodes([1, 2], [3, 4, 5]),
+                expected=[('replace', 0, 2, 0, 3)])
+
+    def test_minimal(self):
+        a = [1, 2, 3, 4, 1, 2, 3, 4, 5]
+        b = [2, 3, 1, 4, 2, 5, 3, 4, 1]
+        codes = opcodes(a, b)
+        same = sum(i2-i1 for tag, i1, i2, j1, j2 in codes if tag == 'equal')
+        compare(same, expected=6)
+        check(a, b)
+
+    def test_interleaved(self):
+        check(list(range(100)), list(range(0, 200, 2)))
+
+    def test_max_d(self):
+        compare(opcodes([1, 2, 3, 4], [5, 1, 6, 2, 7, 3, 8], max_d=1),
+                expected=[('replace', 0, 4, 0, 7)])
+
+    def test_long(self):
+        a = list(range(100000))
+        compare(opcodes(a, [-1]+a),
+                expected=[('insert', 0, 0, 0, 1), ('equal', 0, 100000, 1, 100001)])
+
+
+class TestPatienceOpcodes(object):
+
+    def test_equal(self):
+        compare(opcodes([1, 2, 3], [1, 2, 3], patience=True),
+                expected=[('equal', 0, 3, 0, 3)])
+
+    def test_unique_aligned_first(self):
+        # 1 is the longest common subsequence, but 0 occurs once in each:
+        compare(opcodes([1, 0], [0, 1, 1], patience=True),
+                expected=[('delete', 0, 1, 0, 0),
+                          ('equal', 1, 2, 0, 1),
+                          ('insert', 2, 2, 1, 3)])
+        compare(opcodes([1, 0], [0, 1, 1]),
+                expected=[('insert', 0, 0, 0, 2),
+                          ('equal', 0, 1, 2, 3),
+                          ('delete', 1, 2, 3, 3)])
+
+    def test_nothing_unique(self):
+        a = [1, 1, 2, 2, 3, 3]
+        b = [2, 2, 1, 1, 3, 3]
+        compare(opcodes(a, b, patience=True), expected=opcodes(a, b))
+
+    def test_minimal(self):
+        check([1, 2, 3, 4, 1, 2, 3, 4, 5], [2, 3, 1, 4, 2, 5, 3, 4, 1],
+              patience=True)
+
+    def test_random(self):
+        random = Random(0)
+        for _ in range(500):
+            a = [random.randint(0, 5) for _ in range(random.randint(0, 20))]
+            b = [random.randint(0, 5) for _ in range(random.randint(0, 20))]
+            check(a, b, patience=True)
+
+    def test_long(self):
+        a = list(range(100000))
+        b = a[:]
+        b[50000] = -1
+        compare(opcodes(a, b, patience=True),
+                expected=[('equal', 0, 50000, 0, 50000),
+                          ('replace', 50000, 50001, 50000, 50001),
+                          ('equal', 50001, 100000, 50001, 100000)])
+
+
+class TestGroupedOpcodes(object):
+
+    def test_context(self):
+        codes = opcodes(list(range(20)), [0]+list(range(2, 18))+[99, 19])
+        compare(list(grouped_opcodes(codes, context=2)), expected=[
+            [('equal', 0, 1, 0, 1),
+             ('delete', 1, 2, 1, 1),
+             ('equal', 2, 4, 1, 3)],
+            [('equal', 16, 18, 15, 17),
+             ('replace', 18, 19, 17, 18),
+             ('equal', 19, 20, 18, 19)],
+        ])
+
+    def test_no_changes(self):
+        compare(list(grouped_opcodes(opcodes([1], [1]))), expected=[])
+
+
+class TestUnifiedDiff(object):
+
+    def test_same_as_difflib(self):
+        a = ['line %i' % i for i in range(100)]
+        b = a[:]
+        b.insert(10, 'new')
+        b[50] = 'changed'
+        del b[90:95]
+        compare(list(unified_diff(a, b, 'first', 'second')),
+                expected=list(difflib_unified_diff(a, b, 'first', 'second',
+                                                   lineterm='')))
+
+    def test_single_lines(self):
+        compare(list(unified_diff(['x'], ['y'], 'first', 'second')),
+                expected=['--- first', '+++ second', '@@ -1 +1 @@',
+                          '-x', '+y'])
+
+    def test_empty(self):
+        compare(list(unified_diff([], ['y'], 'first', 'second')),
+                expected=['--- first', '+++ second', '@@ -0,0 +1 @@', '+y'])
+
+    def test_no_differences(self):
+        compare(list(unified_diff(['x'], ['x'])), expected=[])
+
+    def test_context(self):
+        a = ['line %i' % i for i in range(10)]
+        b = a[:]
+        b[5] = 'changed'
+        compare(list(unified_diff(a, b, 'first', 'second', n=1)), expected=[
+            '--- first',
+            '+++ second',
+            '@@ -5,3 +5,3 @@',
+            ' line 4',
+            '-line 5',
+            '+changed',
+            ' line 6',
+        ])
+
+    def test_generator(self):
+        lines = unified_diff(['x'], ['y'], 'first', 'second')
+        compare(next(lines), expected='--- first')
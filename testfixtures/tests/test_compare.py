@@ -1,9 +1,14 @@
+from array import array
 from datetime import date, datetime
 from decimal import Decimal
+import json
 
 from functools import partial
 
 from collections import namedtuple
+from itertools import count
+from mmap import mmap
+from tempfile import TemporaryFile
 
 from testfixtures.shouldraise import ShouldAssert
 from testfixtures.tests.sample1 import SampleClassA, SampleClassB, Slotted
@@ -11,9 +16,11 @@ from testfixtures.mock import Mock, call
 from re import compile
 from testfixtures import (
     Comparison as C,
+    CompareStats,
     Replacer,
     ShouldRaise,
     compare,
+    differences,
     generator,
     singleton,
     )
@@ -22,7 +29,11 @@ from testfixtures.compat import (
     BytesLiteral, UnicodeLiteral,
     PY2, PY_37_PLUS, ABC
 )
-from testfixtures.comparison import compare_sequence, compare_object
+from testfixtures.comparison import (
+    CompareContext, compare_dict, compare_object, compare_sequence,
+    compare_simple, register, set_message_budget, set_slow_compare_hook,
+    sorted_by_repr, _attr_layouts, _registry
+)
 from unittest import TestCase
 
 hexaddr = compile('0x[0-9A-Fa-f]+')
@@ -653,6 +664,103 @@ class TestCompare(CompareHelper, TestCase):
             "second:\n()"
             )
 
+    def test_generator_infinite(self):
+        self.check_raises(
+            count(), (i if i != 20 else -1 for i in count()),
+            "sequence not as expected:\n\n"
+            "same (last 3 of 20):\n(17, 18, 19)\n\n"
+            "first (first 3):\n(20, 21, 22)\n\n"
+            "second (first 3):\n(-1, 21, 22)",
+            stream_window=3
+            )
+
+    def test_generator_stops_at_first_difference(self):
+        x = generator(1, 2, 3, 4, 5, 6)
+        y = generator(1, 0, 3, 4, 5, 6)
+        self.check_raises(
+            x, y,
+            "sequence not as expected:\n\n"
+            "same:\n(1,)\n\n"
+            "first (first 2):\n(2, 3)\n\n"
+            "second (first 2):\n(0, 3)",
+            stream_window=2
+            )
+        compare(tuple(x), expected=(5, 6))
+        compare(tuple(y), expected=(5, 6))
+
+    def test_generator_multiple_differences(self):
+        self.check_raises(
+            generator(1, 2, 3, 4, 5), generator(0, 2, 0, 4, 0, 6),
+            "sequence not as expected:\n\n"
+            "same:\n()\n\n"
+            "first:\n(1, 2, 3, 4, 5)\n\n"
+            "second:\n(0, 2, 0, 4, 0, 6)\n\n"
+            "differences at:\n[0, 2, 4]",
+            stream_differences=5
+            )
+
+    def test_generator_longer_than_window(self):
+        self.check_raises(
+            generator(1, 2), generator(1, 2, 3, 4, 5),
+            "sequence not as expected:\n\n"
+            "same:\n(1, 2)\n\n"
+            "first:\n()\n\n"
+            "second (first 2):\n(3, 4)",
+            stream_window=2
+            )
+
+    def test_generator_long_equal(self):
+        compare(iter(range(10000)), iter(range(10000)))
+
+    def test_generator_long_different(self):
+        x = iter(range(10000))
+        y = iter([i if i != 5000 else -1 for i in range(10000)])
+        self.check_raises(
+            x, y,
+            "sequence not as expected:\n\n"
+            "same (last 2 of 5000):\n(4998, 4999)\n\n"
+            "first (first 2):\n(5000, 5001)\n\n"
+            "second (first 2):\n(-1, 5001)",
+            stream_window=2
+            )
+        # elements after those needed for the message aren't all read:
+        self.assertTrue(len(tuple(x)) > 0)
+
+    def test_generator_long_strict(self):
+        self.check_raises(
+            iter([1] * 3000), iter([1] * 2999 + [1.0]),
+            "sequence not as expected:\n\n"
+            "same (last 1 of 2999):\n(1,)\n\n"
+            "first:\n(1,)\n\n"
+            "second:\n(1.0,)\n\n"
+            "While comparing [2999]: 1 (%r) != 1.0 (%r)" % (int, float),
+            stream_window=1, strict=True
+            )
+
+    def test_generator_long_ignore_eq(self):
+        class AlwaysEqual(object):
+            def __init__(self, a):
+                self.a = a
+
+            def __eq__(self, other):
+                return True
+
+            def __repr__(self):
+                return '<AlwaysEqual %r>' % self.a
+
+        self.check_raises(
+            iter([1] * 3000 + [AlwaysEqual(1)]),
+            iter([1] * 3000 + [AlwaysEqual(2)]),
+            "sequence not as expected:\n\n"
+            "same (last 1 of 3000):\n(1,)\n\n"
+            "first:\n(<AlwaysEqual 1>,)\n\n"
+            "second:\n(<AlwaysEqual 2>,)\n\n"
+            "While comparing [3000]: AlwaysEqual not as expected:\n\n"
+            "attributes differ:\n"
+            "'a': 1 != 2",
+            stream_window=1, ignore_eq=True
+            )
+
     def test_nested_generator_different(self):
         self.check_raises(
             generator(1, 2, generator(3), 4),
@@ -839,6 +947,18 @@ class TestCompare(CompareHelper, TestCase):
     def test_show_whitespace_equal(self):
         compare('x', 'x', show_whitespace=True)
 
+    def test_text_use_difflib(self):
+        self.check_raises(
+            'line 1\nline 1', 'line 2\nline 1',
+            '\n--- first\n'
+            '+++ second\n'
+            '@@ -1,2 +1,2 @@\n'
+            '+line 2\n'
+            ' line 1\n'
+            '-line 1',
+            use_difflib=True
+            )
+
     def test_show_whitespace_not_used_because_of_other_difference(self):
         self.check_raises(
             (1, 'a'),
@@ -955,6 +1075,83 @@ b
                 comparers={MyObject: compare_my_object}
                 )
 
+    def test_register_after_lookup(self):
+        class MyObject(object):
+            def __init__(self, name):
+                self.name = name
+
+        def compare_my_object(x, y, context):
+            return '%s != %s' % (x.name, y.name)
+
+        compare(MyObject('foo'), MyObject('foo'), ignore_eq=True)
+        with Replacer() as r:
+            r.replace('testfixtures.comparison._registry', dict(_registry))
+            register(MyObject, compare_my_object)
+            self.check_raises(
+                MyObject('foo'), MyObject('bar'), 'foo != bar'
+            )
+        self.check_raises(
+            MyObject('foo'), MyObject('bar'),
+            "MyObject not as expected:\n\n"
+            "attributes differ:\n"
+            "'name': 'foo' != 'bar'\n\n"
+            "While comparing .name: 'foo' != 'bar'"
+        )
+
+    def test_register_ignore_eq(self):
+        class Elementwise(object):
+            def __init__(self, *values):
+                self.values = values
+            def __eq__(self, other):
+                raise ValueError('ambiguous')
+
+        def compare_elementwise(x, y, context):
+            if x.values != y.values:
+                return '%r != %r' % (x.values, y.values)
+
+        with Replacer() as r:
+            r.replace('testfixtures.comparison._registry', dict(_registry))
+            r.replace('testfixtures.comparison._ignore_eq_types', ())
+            register(Elementwise, compare_elementwise, ignore_eq=True)
+            compare(Elementwise(1, 2), Elementwise(1, 2))
+            compare([Elementwise(1, 2)], [Elementwise(1, 2)])
+            self.check_raises(
+                Elementwise(1, 2), Elementwise(1, 3), '(1, 2) != (1, 3)'
+            )
+
+    def test_supplied_comparers_not_cached(self):
+        class MyObject(object):
+            def __init__(self, name):
+                self.name = name
+
+        def compare_my_object(x, y, context):
+            return '%s != %s' % (x.name, y.name)
+
+        self.check_raises(
+            MyObject('foo'), MyObject('bar'), 'foo != bar',
+            comparers={MyObject: compare_my_object}
+        )
+        self.check_raises(
+            MyObject('foo'), MyObject('bar'),
+            "MyObject not as expected:\n\n"
+            "attributes differ:\n"
+            "'name': 'foo' != 'bar'\n\n"
+            "While comparing .name: 'foo' != 'bar'"
+        )
+
+    def test_class_differs_from_type_not_cached(self):
+        class Proxy(object):
+            def __init__(self, wrapped):
+                self.wrapped = wrapped
+
+            @property
+            def __class__(self):
+                return type(self.wrapped)
+
+        context = CompareContext({})
+        assert context._lookup(Proxy({}), Proxy({})) is compare_dict
+        assert context._lookup(Proxy([]), Proxy([])) is compare_sequence
+
     def test_list_subclass(self):
         class  MyList(list): pass
         a_list = MyList([1])
@@ -1758,6 +1955,78 @@ b
             "'b': 2 != 3"
         ))
 
+    def test_unset_slots(self):
+
+        class Slotted(object):
+            __slots__ = ('a', 'b', 'c')
+
+        x = Slotted()
+        x.a = 1
+        y = Slotted()
+        y.a = 2
+        y.b = 3
+        self.check_raises(x, y, message=(
+            'Slotted not as expected:\n'
+            '\n'
+            'attributes in second but not first:\n'
+            "'b': 3\n"
+            '\n'
+            'attributes differ:\n'
+            "'a': 1 != 2"
+        ))
+
+    def test_single_slot_as_string(self):
+
+        class Slotted(object):
+            __slots__ = 'name'
+
+            def __init__(self, name):
+                self.name = name
+
+        compare(Slotted('x'), Slotted('x'))
+        self.check_raises(Slotted('x'), Slotted('y'), message=(
+            'Slotted not as expected:\n'
+            '\n'
+            'attributes differ:\n'
+            "'name': 'x' != 'y'\n"
+            '\n'
+            "While comparing .name: 'x' != 'y'"
+        ))
+
+    def test_slots_ignored(self):
+
+        class Slotted(object):
+            __slots__ = ('a', 'b')
+
+            def __init__(self, a, b):
+                self.a, self.b = a, b
+
+        compare(Slotted(1, 2), Slotted(1, 3), ignore_attributes=['b'])
+        self.check_raises(Slotted(1, 2), Slotted(1, 3), message=(
+            'Slotted not as expected:\n'
+            '\n'
+            'attributes same:\n'
+            "['a']\n"
+            '\n'
+            'attributes differ:\n'
+            "'b': 2 != 3"
+        ))
+
+    def test_slots_layout_shared(self):
+
+        class Slotted(object):
+            __slots__ = ('a', 'b')
+
+            def __init__(self, a, b):
+                self.a, self.b = a, b
+
+        compare([Slotted(1, 2), Slotted(3, 4)],
+                [Slotted(1, 2), Slotted(3, 4)])
+        compare(Slotted(1, 2), Slotted(1, 3), ignore_attributes=['b'])
+        layouts = [key for key in _attr_layouts if key[0] is Slotted]
+        compare(sorted(layouts, key=lambda key: key[1] is not None),
+                expected=[(Slotted, None), (Slotted, frozenset(['b']))])
+
     def test_partial_callable_different(self):
 
         def foo(x): pass
@@ -2008,3 +2277,2692 @@ class TestBaseClasses(CompareHelper):
             "attributes differ:\n"
             "'thing': 1 != 2"
         ))
+
+
+class TestQuick(CompareHelper):
+
+    class NoRepr(object):
+        def __init__(self, value):
+            self.value = value
+
+        def __eq__(self, other):
+            return self.value == other.value
+
+        def __ne__(self, other):
+            return not self == other
+
+        def __repr__(self):
+            raise AssertionError('repr called')
+
+    def test_same_no_rendering(self):
+        x = [{'a': self.NoRepr(1)}, (self.NoRepr(2), {self.NoRepr})]
+        y = [{'a': self.NoRepr(1)}, (self.NoRepr(2), {self.NoRepr})]
+        compare(x, y, strict=True, quick=True)
+
+    def test_same_objects_ignore_eq(self):
+        compare(SampleClassA([1, 2]), SampleClassA([1, 2]),
+                ignore_eq=True, quick=True)
+
+    def test_different(self):
+        self.check_raises(
+            {'a': [1, 2]}, {'a': [1, 3]},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'a': [1, 2] != [1, 3]\n"
+            "\n"
+            "While comparing ['a']: sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[1]\n"
+            "\n"
+            "first:\n"
+            "[2]\n"
+            "\n"
+            "second:\n"
+            "[3]",
+            quick=True
+        )
+
+    def test_different_strict(self):
+        self.check_raises(
+            [1, (2, 3)], [1, [2, 3]],
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[1]\n"
+            "\n"
+            "first:\n"
+            "[(2, 3)]\n"
+            "\n"
+            "second:\n"
+            "[[2, 3]]\n"
+            "\n"
+            "While comparing [1]: (2, 3) (<{0} 'tuple'>) != "
+            "[2, 3] (<{0} 'list'>)".format(class_type_name),
+            strict=True, quick=True
+        )
+
+    def test_generators(self):
+        self.check_raises(
+            generator(1, 2), generator(1, 3),
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "(1,)\n"
+            "\n"
+            "first:\n"
+            "(2,)\n"
+            "\n"
+            "second:\n"
+            "(3,)",
+            quick=True
+        )
+
+    def test_comparer_not_rendering(self):
+        renderings = []
+
+        def compare_sample(x, y, context):
+            renderings.append(context.rendering)
+            if x.args != y.args:
+                if not context.rendering:
+                    return True
+                return '%r != %r' % (x.args, y.args)
+
+        comparers = {SampleClassA: compare_sample}
+        compare(SampleClassA(1), SampleClassA(1), ignore_eq=True,
+                comparers=comparers, quick=True)
+        compare(renderings, expected=[False])
+
+        self.check_raises(
+            SampleClassA(1), SampleClassA(2), '(1,) != (2,)',
+            ignore_eq=True, comparers=comparers, quick=True
+        )
+        compare(renderings, expected=[False, False, True])
+
+
+class TestSequenceDiff(CompareHelper):
+
+    def test_same(self):
+        compare([1, 2, 3], [1, 2, 3], sequence_diff=True)
+
+    def test_inserted_at_start(self):
+        self.check_raises(
+            [1, 2, 3, 4, 5, 6], [0, 1, 2, 3, 4, 5, 6],
+            "sequence not as expected:\n"
+            "\n"
+            "@@ first[0:3] != second[0:4] @@\n"
+            "+ [0] 0\n"
+            "  [0] 1\n"
+            "  [1] 2\n"
+            "  [2] 3",
+            sequence_diff=True
+        )
+
+    def test_hunks(self):
+        self.check_raises(
+            list(range(10)), [0, 1, 2, 3, 4, 6, 7, 8, 9, 10],
+            "sequence not as expected:\n"
+            "\n"
+            "@@ expected[4:7] != actual[4:6] @@\n"
+            "  [4] 4\n"
+            "- [5] 5\n"
+            "  [6] 6\n"
+            "\n"
+            "@@ expected[9:10] != actual[8:10] @@\n"
+            "  [9] 9\n"
+            "+ [9] 10",
+            sequence_diff=True, sequence_context=1,
+            x_label='expected', y_label='actual'
+        )
+
+    def test_changed(self):
+        self.check_raises(
+            [{'a': 1}, {'b': 2}, {'c': 3}], [{'a': 1}, {'b': 3}, {'c': 3}],
+            "sequence not as expected:\n"
+            "\n"
+            "@@ first[0:3] != second[0:3] @@\n"
+            "  [0] {'a': 1}\n"
+            "- [1] {'b': 2}\n"
+            "+ [1] {'b': 3}\n"
+            "  [2] {'c': 3}\n"
+            "\n"
+            "While comparing [1]: dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'b': 2 != 3",
+            sequence_diff=True
+        )
+
+    def test_changed_after_insert(self):
+        self.check_raises(
+            [[1], [2]], [[0], [1], [3]],
+            "sequence not as expected:\n"
+            "\n"
+            "@@ first[0:2] != second[0:3] @@\n"
+            "+ [0] [0]\n"
+            "  [0] [1]\n"
+            "- [1] [2]\n"
+            "+ [2] [3]\n"
+            "\n"
+            "While comparing [1]->[2]: sequence not as expected:\n"
+            "\n"
+            "@@ first[0:1] != second[0:1] @@\n"
+            "- [0] 2\n"
+            "+ [0] 3",
+            sequence_diff=True
+        )
+
+    def test_unhashable(self):
+        self.check_raises(
+            [[1], [2], {3: [4]}, 5], [[2], {3: [4]}, Slotted(5, 6)],
+            "sequence not as expected:\n"
+            "\n"
+            "@@ first[0:4] != second[0:3] @@\n"
+            "- [0] [1]\n"
+            "  [1] [2]\n"
+            "  [2] {3: [4]}\n"
+            "- [3] 5\n"
+            "+ [2] <testfixtures.tests.sample1.Slotted object at ...>\n"
+            "\n"
+            "While comparing [3]->[2]: "
+            "5 != <testfixtures.tests.sample1.Slotted object at ...>",
+            sequence_diff=True
+        )
+
+    def test_limit(self):
+        self.check_raises(
+            list(range(10)), [i*2 for i in range(10)],
+            "sequence not as expected:\n"
+            "\n"
+            "@@ first[0:10] != second[0:10] @@\n"
+            "  [0] 0\n"
+            "- [1] 1\n"
+            "  [2] 2\n"
+            "- [3] 3\n"
+            "\n"
+            "8 more differing elements not shown",
+            sequence_diff=True, sequence_diff_limit=2
+        )
+
+    def test_strict(self):
+        self.check_raises(
+            [1, 2, 3], [1, 2.0, 3],
+            "sequence not as expected:\n"
+            "\n"
+            "@@ first[0:3] != second[0:3] @@\n"
+            "  [0] 1\n"
+            "- [1] 2\n"
+            "+ [1] 2.0\n"
+            "  [2] 3\n"
+            "\n"
+            "While comparing [1]: 2 (<{0} 'int'>) != 2.0 (<{0} 'float'>)".format(
+                class_type_name
+            ),
+            sequence_diff=True, strict=True
+        )
+
+    def test_equal_apart_from_comparers(self):
+        # elements that are equal but still considered different by a
+        # comparer fall back to the normal description:
+        def compare_sample(x, y, context):
+            return 'different'
+        self.check_raises(
+            [1, Slotted(1, 2)], [1, Slotted(1, 2)],
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[1]\n"
+            "\n"
+            "first:\n"
+            "[<testfixtures.tests.sample1.Slotted object at ...>]\n"
+            "\n"
+            "second:\n"
+            "[<testfixtures.tests.sample1.Slotted object at ...>]\n"
+            "\n"
+            "While comparing [1]: different",
+            sequence_diff=True, ignore_eq=True,
+            comparers={Slotted: compare_sample}
+        )
+
+    def test_replaced_but_equal_comparison(self):
+        expected = C(Slotted, x=1, y=2)
+        self.check_raises(
+            [expected, 1, 2], [Slotted(1, 2), 1, 3],
+            "sequence not as expected:\n"
+            "\n"
+            "@@ first[0:3] != second[0:3] @@\n"
+            "  [0] \n"
+            "<C:testfixtures.tests.sample1.Slotted>\n"
+            "x: 1\n"
+            "y: 2\n"
+            "</C>\n"
+            "  [1] 1\n"
+            "- [2] 2\n"
+            "+ [2] 3",
+            sequence_diff=True
+        )
+
+    def test_replaced_but_all_equal(self):
+        compare([C(Slotted, x=1, y=2), 1], [Slotted(1, 2), 1],
+                sequence_diff=True)
+
+    def test_replaced_some_equal(self):
+        self.check_raises(
+            [C(Slotted, x=1, y=2), C(Slotted, x=3, y=4), 9],
+            [Slotted(1, 2), Slotted(3, 5), 9],
+            "sequence not as expected:\n"
+            "\n"
+            "@@ first[0:3] != second[0:3] @@\n"
+            "  [0] \n"
+            "<C:testfixtures.tests.sample1.Slotted>\n"
+            "x: 1\n"
+            "y: 2\n"
+            "</C>\n"
+            "- [1] \n"
+            "<C(failed):testfixtures.tests.sample1.Slotted>\n"
+            "attributes same:\n"
+            "['x']\n"
+            "\n"
+            "attributes differ:\n"
+            "'y': 4 (Comparison) != 5 (actual)\n"
+            "</C>\n"
+            "+ [1] <testfixtures.tests.sample1.Slotted object at ...>\n"
+            "  [2] 9",
+            sequence_diff=True
+        )
+
+    def test_replaced_but_within_tolerance(self):
+        self.check_raises(
+            [1.0, 2, 3, 4, 5], [1.0000001, 2, 3, 4, 6],
+            "sequence not as expected:\n"
+            "\n"
+            "@@ first[1:5] != second[1:5] @@\n"
+            "  [1] 2\n"
+            "  [2] 3\n"
+            "  [3] 4\n"
+            "- [4] 5\n"
+            "+ [4] 6",
+            sequence_diff=True, rel_tol=1e-6
+        )
+
+    def test_replaced_within_tolerance_with_insert(self):
+        self.check_raises(
+            [1.0, 2.0], [1.0000001, 2.0000001, 3.0],
+            "sequence not as expected:\n"
+            "\n"
+            "@@ first[0:2] != second[0:3] @@\n"
+            "  [0] 1.0\n"
+            "  [1] 2.0\n"
+            "+ [2] 3.0",
+            sequence_diff=True, rel_tol=1e-6
+        )
+
+
+class TestMessageBudget(CompareHelper, TestCase):
+
+    def test_within_budget(self):
+        self.check_raises(
+            [1, 2], [1, 3],
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[1]\n"
+            "\n"
+            "first:\n"
+            "[2]\n"
+            "\n"
+            "second:\n"
+            "[3]",
+            max_chars=1000, max_lines=100, max_differences=10
+        )
+
+    def test_max_differences(self):
+        self.check_raises(
+            {'a': [1], 'b': [2], 'c': [3]},
+            {'a': [1, 0], 'b': [2, 0], 'c': [3, 0]},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'a': [1] != [1, 0]\n"
+            "\n"
+            "While comparing ['a']: sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[1]\n"
+            "\n"
+            "first:\n"
+            "[]\n"
+            "\n"
+            "second:\n"
+            "[0]\n"
+            "\n"
+            "Comparison stopped after finding 1 difference, "
+            "the limit set by max_differences",
+            max_differences=1
+        )
+
+    def test_max_differences_keys(self):
+        self.check_raises(
+            {'a': 1, 'b': 2, 'c': 3}, {'a': 4},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'a': 1 != 4\n"
+            "\n"
+            "Message truncated, not shown: 2 differences",
+            max_differences=1
+        )
+
+    def test_max_differences_missing_keys(self):
+        self.check_raises(
+            {'a': 1, 'b': 2, 'c': 3}, {},
+            "dict not as expected:\n"
+            "\n"
+            "in first but not second:\n"
+            "'a': 1\n"
+            "'b': 2\n"
+            "\n"
+            "Message truncated, not shown: 1 difference",
+            max_differences=2
+        )
+
+    def test_max_differences_some_missing_keys(self):
+        self.check_raises(
+            {'a': 1, 'b': 2, 'c': 3}, {'a': 1},
+            "dict not as expected:\n"
+            "\n"
+            "same:\n"
+            "['a']\n"
+            "\n"
+            "in first but not second:\n"
+            "'b': 2\n"
+            "'c': 3",
+            max_differences=2
+        )
+
+    def test_max_differences_stops_comparing(self):
+        compared = []
+
+        def compare_sample(x, y, context):
+            compared.append(x.args)
+            if x.args != y.args:
+                return '%r != %r' % (x.args, y.args)
+
+        x = dict((i, SampleClassA(i)) for i in range(1000))
+        y = dict((i, SampleClassA(-i)) for i in range(1000))
+        message = compare(x, y, raises=False, max_differences=2,
+                          comparers={SampleClassA: compare_sample})
+        compare(compared, expected=[(0, ), (1, ), (10, )])
+        self.assertTrue(message.endswith(
+            "\n\nComparison stopped after finding 2 differences, "
+            "the limit set by max_differences"
+        ))
+
+    def test_max_differences_not_stopped(self):
+        # nothing was left to compare when the limit was reached:
+        self.check_raises(
+            {'a': 1, 'b': 2}, {'a': 1, 'b': 3},
+            "dict not as expected:\n"
+            "\n"
+            "same:\n"
+            "['a']\n"
+            "\n"
+            "values differ:\n"
+            "'b': 2 != 3",
+            max_differences=1
+        )
+
+    def test_max_differences_set(self):
+        self.check_raises(
+            set(range(10)), set(range(5, 20)),
+            "set not as expected:\n"
+            "\n"
+            "in first but not second:\n"
+            "[0, 1, 2, 3]\n"
+            "\n"
+            "\n"
+            "\n"
+            "Message truncated, not shown: 11 differences",
+            max_differences=4
+        )
+
+    def test_max_differences_set_both(self):
+        self.check_raises(
+            set(range(4)), set(range(2, 6)),
+            "set not as expected:\n"
+            "\n"
+            "in first but not second:\n"
+            "[0, 1]\n"
+            "\n"
+            "in second but not first:\n"
+            "[4]\n"
+            "\n"
+            "\n"
+            "\n"
+            "Message truncated, not shown: 1 difference",
+            max_differences=3
+        )
+
+    def test_max_differences_unordered(self):
+        self.check_raises(
+            [1, 2, 3, 4], [5, 6, 7, 8],
+            "sequence not as expected, ignoring order:\n"
+            "\n"
+            "in first but not second:\n"
+            "[1, 2, 3]\n"
+            "\n"
+            "Message truncated, not shown: 5 differences",
+            max_differences=3, ordered=False
+        )
+
+    def test_max_differences_generator(self):
+        self.check_raises(
+            generator(1, 2, 3, 4), generator(1, 0, 0, 0),
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "(1,)\n"
+            "\n"
+            "first:\n"
+            "(2, 3, 4)\n"
+            "\n"
+            "second:\n"
+            "(0, 0, 0)\n"
+            "\n"
+            "differences at:\n"
+            "[1, 2]\n"
+            "\n"
+            "Comparison stopped after finding 2 differences, "
+            "the limit set by max_differences",
+            max_differences=2, stream_differences=10
+        )
+
+    def test_max_differences_namedtuple(self):
+        Triple = namedtuple('Triple', 'a b c')
+        self.check_raises(
+            Triple(1, 2, 3), Triple(0, 0, 3),
+            "Triple not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'a': 1 != 0\n"
+            "\n"
+            "Comparison stopped after finding 1 difference, "
+            "the limit set by max_differences",
+            max_differences=1
+        )
+
+    def test_max_chars(self):
+        self.check_raises(
+            list(range(100)), list(range(1, 101)),
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[0, 1, 2, 3, 4, \n"
+            "\n"
+            "Message truncated to 60 characters",
+            max_chars=60
+        )
+
+    def test_max_chars_large_objects_not_rendered(self):
+        x = list(range(10**6))
+        y = [-1] + x[1:]
+        self.check_raises(
+            x, y,
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 1\n"
+            "\n"
+            "Message truncated to 100 characters",
+            max_chars=100
+        )
+
+    def test_max_chars_large_string(self):
+        x = 'x' * 10**6
+        message = compare(x, x+'y', raises=False, max_chars=10)
+        compare(message, expected=(
+            "\n'xxxxxxxx"
+            "\n"
+            "\n"
+            "Message truncated to 10 characters"
+        ))
+
+    def test_max_chars_recursive(self):
+        x = list(range(50))
+        x.append(x)
+        message = compare(x, [], raises=False, max_chars=150)
+        compare(message.endswith('Message truncated to 150 characters'), True)
+
+    def test_max_chars_spent_by_nested(self):
+        # the values that differ aren't shown once the messages for the
+        # differences nested in them have spent the budget:
+        self.check_raises(
+            {'a': {'b': {'c': 1}}}, {'a': {'b': {'c': 2}}},
+            "dict not as expected:\n"
+            "\n"
+            "While comparing [\n"
+            "\n"
+            "Message truncated to 40 characters",
+            max_chars=40
+        )
+
+    def test_max_chars_spent_by_nested_not_recursive(self):
+        # nested messages that aren't shown don't spend the budget:
+        self.check_raises(
+            {'a': {'b': {'c': 1}}}, {'a': {'b': {'c': 2}}},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'a': {'b': {'c': 1}} != {'b': {'\n"
+            "\n"
+            "Message truncated to 70 characters",
+            max_chars=70, recursive=False
+        )
+
+    def test_max_lines(self):
+        self.check_raises(
+            'a\nb\nc\nd\ne\nf\n', 'A\nB\nC\nD\nE\nF\n',
+            "\n"
+            "--- first\n"
+            "+++ second\n"
+            "@@ -1,7 +1,7 @@\n"
+            "-a\n"
+            "-b\n"
+            "\n"
+            "Message truncated to 6 lines",
+            max_lines=6
+        )
+
+    def test_max_lines_large_text(self):
+        x = '\n'.join('line %i' % i for i in range(50000))
+        y = x.replace('0\n', 'O\n')
+        self.check_raises(
+            x, y,
+            "\n"
+            "--- first\n"
+            "+++ second\n"
+            "@@ -1,4 +1,4 @@\n"
+            "-line 0\n"
+            "+line O\n"
+            "\n"
+            "Message truncated to 6 lines",
+            max_lines=6
+        )
+
+    def test_max_lines_stops_descending(self):
+        self.check_raises(
+            [[1, 2], [3]], [[1, 3], [4]],
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[[1, 2], [3]]\n"
+            "\n"
+            "second:\n"
+            "[[1, 3], [4]]\n"
+            "\n"
+            "While comparing [0]: sequence not as expected:\n"
+            "\n"
+            "Message truncated to 12 lines",
+            max_lines=12
+        )
+
+    def test_prefix_and_suffix_not_truncated(self):
+        self.check_raises(
+            1, 2,
+            "wrong: 1\n"
+            "\n"
+            "Message truncated to 1 character\n"
+            "whoops",
+            prefix='wrong', suffix='whoops', max_chars=1
+        )
+
+    def test_global(self):
+        with Replacer() as r:
+            r.replace('testfixtures.comparison._message_budget', {})
+            set_message_budget(max_chars=1)
+            self.check_raises(
+                1, 2,
+                "1\n"
+                "\n"
+                "Message truncated to 1 character",
+            )
+            # per-call parameters override the global defaults:
+            self.check_raises(1, 2, "1 != 2", max_chars=None)
+
+    def test_global_reset(self):
+        with Replacer() as r:
+            r.replace('testfixtures.comparison._message_budget', {})
+            set_message_budget(max_chars=1)
+            set_message_budget()
+            self.check_raises(1, 2, "1 != 2")
+
+    def test_quick(self):
+        self.check_raises(
+            {'a': [1], 'b': [2]}, {'a': [1, 0], 'b': [2, 0]},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'a': [1] != [1, 0]\n"
+            "\n"
+            "While comparing ['a']: sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[1]\n"
+            "\n"
+            "first:\n"
+            "[]\n"
+            "\n"
+            "second:\n"
+            "[0]\n"
+            "\n"
+            "Comparison stopped after finding 1 difference, "
+            "the limit set by max_differences",
+            max_differences=1, quick=True
+        )
+
+    def test_generator_after_budget_spent(self):
+        self.check_raises(
+            [[1], generator(1)], [[2], generator(2)],
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[[1], <generator object generator at ...>]\n"
+            "\n"
+            "second:\n"
+            "[[2], <generator object generator at ...>]\n"
+            "\n"
+            "While comparing [0]: sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[1]\n"
+            "\n"
+            "second:\n"
+            "[2]",
+            max_differences=1
+        )
+
+
+class CountingRepr(object):
+
+    def __init__(self, name, reprs):
+        self.name = name
+        self.reprs = reprs
+
+    def __eq__(self, other):
+        return self.name == other.name
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __repr__(self):
+        self.reprs.append(self.name)
+        return '<%s>' % self.name
+
+
+class TestMemoisedRepr(CompareHelper, TestCase):
+
+    def test_values_in_mapping(self):
+        reprs = []
+        self.check_raises(
+            {'a': CountingRepr('x', reprs)}, {'a': CountingRepr('y', reprs)},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'a': <x> != <y>",
+            comparers={CountingRepr: compare_simple}
+        )
+        compare(reprs, expected=['x', 'y'])
+
+    def test_keys_in_mapping(self):
+        reprs = []
+        self.check_raises(
+            {CountingRepr('a', reprs): 1, CountingRepr('b', reprs): 2},
+            {CountingRepr('a', reprs): 3, CountingRepr('b', reprs): 4},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "<a>: 1 != 3\n"
+            "<b>: 2 != 4"
+        )
+        # the repr used for sorting is re-used when describing the
+        # difference, leaving only the one used for the breadcrumb:
+        compare(sorted(reprs), expected=['a', 'a', 'b', 'b'])
+
+    def test_memo_not_shared_between_comparisons(self):
+        reprs = []
+        x = CountingRepr('x', reprs)
+        y = CountingRepr('y', reprs)
+        for _ in range(2):
+            with ShouldAssert("<x> != <y>"):
+                compare(x, y, comparers={CountingRepr: compare_simple})
+        compare(reprs, expected=['x', 'y', 'x', 'y'])
+
+    def test_repr_changed_by_comparison(self):
+        # the repr of a Comparison shows how it last failed to match:
+        c = C(Slotted, x=1, y=2)
+        self.check_raises(
+            {'a': c, 'b': c}, {'a': Slotted(3, 2), 'b': Slotted(4, 2)},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'a': \n"
+            "<C(failed):testfixtures.tests.sample1.Slotted>\n"
+            "attributes same:\n"
+            "['y']\n"
+            "\n"
+            "attributes differ:\n"
+            "'x': 1 (Comparison) != 3 (actual)\n"
+            "</C> != <testfixtures.tests.sample1.Slotted object at ...>\n"
+            "'b': \n"
+            "<C(failed):testfixtures.tests.sample1.Slotted>\n"
+            "attributes same:\n"
+            "['y']\n"
+            "\n"
+            "attributes differ:\n"
+            "'x': 1 (Comparison) != 4 (actual)\n"
+            "</C> != <testfixtures.tests.sample1.Slotted object at ...>"
+        )
+
+    def test_sorted_by_repr_with_context(self):
+        reprs = []
+        items = [CountingRepr('b', reprs), CountingRepr('a', reprs)]
+        context = CompareContext({})
+        compare(sorted_by_repr(items, context), expected=items[::-1])
+        compare(sorted_by_repr(items, context), expected=items[::-1])
+        compare(reprs, expected=['b', 'a'])
+
+    def test_sorted_by_repr_without_context(self):
+        compare(sorted_by_repr([2, 1, 3]), expected=[1, 2, 3])
+
+
+def nested(depth, leaf):
+    obj = leaf
+    for _ in range(depth):
+        obj = [obj]
+    return obj
+
+
+class Link(object):
+
+    def __init__(self, value, next=None):
+        self.value = value
+        self.next = next
+
+    def __repr__(self):
+        return '<Link %r>' % self.value
+
+
+def chain(length, last):
+    link = Link(last)
+    for value in range(length-1):
+        link = Link(value, link)
+    return link
+
+
+class TestDeeplyNested(CompareHelper, TestCase):
+
+    # much deeper than Python's default recursion limit:
+    depth = 10000
+    # messages for differences this deep repeat the path to each level,
+    # so are big enough without going as deep:
+    different_depth = 2000
+
+    def test_equal(self):
+        compare(nested(self.depth, 1), nested(self.depth, 1))
+
+    def test_equal_strict(self):
+        compare(nested(self.depth, 1), nested(self.depth, 1), strict=True)
+
+    def test_equal_quick(self):
+        compare(nested(self.depth, 1), nested(self.depth, 1), quick=True)
+
+    def test_equal_mappings(self):
+        x = y = 1
+        for _ in range(self.depth):
+            x = {'a': x}
+            y = {'a': y}
+        compare(x, y)
+
+    def test_equal_objects(self):
+        compare(chain(self.depth, 1), chain(self.depth, 1))
+
+    def test_different(self):
+        depth = self.different_depth
+        message = compare(nested(depth, 1), nested(depth, 2), raises=False)
+        compare(message.count('While comparing'), expected=depth-1)
+        assert message.endswith(
+            '\n\nWhile comparing %s: sequence not as expected:\n'
+            '\n'
+            'same:\n'
+            '[]\n'
+            '\n'
+            'first:\n'
+            '[1]\n'
+            '\n'
+            'second:\n'
+            '[2]' % ('[0]' * (depth-1))
+        ), message[-200:]
+
+    def test_different_objects(self):
+        depth = self.different_depth
+        message = compare(chain(depth, 1), chain(depth, 2), raises=False)
+        assert message.endswith(
+            '\n\nWhile comparing %s: Link not as expected:\n'
+            '\n'
+            'attributes same:\n'
+            "['next']\n"
+            '\n'
+            'attributes differ:\n'
+            "'value': 1 != 2" % ('.next' * (depth-1))
+        ), message[-200:]
+
+    def test_max_chars(self):
+        depth = self.depth
+        message = compare({'a': nested(depth, 1)}, {}, raises=False,
+                          max_chars=depth+100)
+        # the repr is rendered all the way down rather than stopping at the
+        # point where rendering in a nested way would have been abandoned:
+        assert message.startswith(
+            "dict not as expected:\n"
+            "\n"
+            "in first but not second:\n"
+            "'a': " + '[' * depth + '1]'
+        ), message[:200]
+
+    def test_different_mappings_max_chars(self):
+        x = y = None
+        for _ in range(self.different_depth):
+            x = {'a': x or 1}
+            y = {'a': y or 2}
+        message = compare(x, y, raises=False, max_chars=100)
+        # the values that differ at each level aren't rendered once the
+        # budget has been spent by the messages nested below them:
+        assert message.startswith(
+            "dict not as expected:\n"
+            "\n"
+            "While comparing ['a']: dict not as expected:\n"
+        ), message
+
+    def test_different_quick(self):
+        depth = self.different_depth
+        message = compare(nested(depth, 1), nested(depth, 2),
+                          raises=False, quick=True)
+        compare(message.count('While comparing'), expected=depth-1)
+
+    def test_nested_too_deeply_to_show(self):
+        self.check_raises(
+            nested(21, 1), nested(21, 2),
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[[[[[[[[[[[[[[[[[[[[[...]]]]]]]]]]]]]]]]]]]]]\n"
+            "\n"
+            "second:\n"
+            "[[[[[[[[[[[[[[[[[[[[[...]]]]]]]]]]]]]]]]]]]]]",
+            recursive=False
+        )
+
+    def test_nested_not_too_deeply_to_show(self):
+        self.check_raises(
+            nested(20, 1), nested(20, 2),
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[[[[[[[[[[[[[[[[[[[[1]]]]]]]]]]]]]]]]]]]]\n"
+            "\n"
+            "second:\n"
+            "[[[[[[[[[[[[[[[[[[[[2]]]]]]]]]]]]]]]]]]]]",
+            recursive=False
+        )
+
+    def test_exception_part_way_through(self):
+        class Boom(object):
+            pass
+
+        def explode(x, y, context):
+            raise ValueError('boom')
+
+        context = CompareContext({'comparers': {Boom: explode}})
+        with ShouldRaise(ValueError('boom')):
+            context.different([{'a': [Boom()]}], [{'a': [Boom()]}], '')
+        compare(context.breadcrumbs, expected=[])
+        compare(context.message, expected='')
+        # the context can still be used:
+        assert context.different([1], [2], '')
+
+    def test_equal_needs_no_state(self):
+        context = CompareContext({})
+        assert not context.different([{'a': 1}], [{'a': 1}], '')
+        compare(context._comparing, expected=None)
+        # but it is set up once a difference needs finding:
+        assert context.different([{'a': 1}], [{'a': 2}], '')
+        assert 'While comparing [0]' in context.message, context.message
+
+    def test_comparer_called_directly(self):
+        def compare_wrapped(x, y, context):
+            return compare_sequence(x.items, y.items, context)
+
+        class Wrapped(object):
+            def __init__(self, items):
+                self.items = items
+
+        self.check_raises(
+            Wrapped([1, [2]]), Wrapped([1, [3]]),
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[1]\n"
+            "\n"
+            "first:\n"
+            "[[2]]\n"
+            "\n"
+            "second:\n"
+            "[[3]]\n"
+            "\n"
+            "While comparing [1]: sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[2]\n"
+            "\n"
+            "second:\n"
+            "[3]",
+            comparers={Wrapped: compare_wrapped}
+        )
+
+
+class TestSharedAndSelfReferential(CompareHelper, TestCase):
+
+    def test_shared_compared_once(self):
+        class Fragment(object):
+            pass
+
+        calls = []
+
+        def compare_fragment(x, y, context):
+            calls.append((x, y))
+
+        x, y = Fragment(), Fragment()
+        compare([{'a': x}, {'b': x}] * 50, [{'a': y}, {'b': y}] * 50,
+                comparers={Fragment: compare_fragment}, strict=True)
+        compare(calls, expected=[(x, y)])
+
+    def test_shared_different_everywhere(self):
+        x = [1]
+        y = [2]
+        self.check_raises(
+            {'a': x, 'b': x}, {'a': y, 'b': y},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'a': [1] != [2]\n"
+            "'b': [1] != [2]\n"
+            "\n"
+            "While comparing ['a']: sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[1]\n"
+            "\n"
+            "second:\n"
+            "[2]\n"
+            "\n"
+            "While comparing ['b']: sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[1]\n"
+            "\n"
+            "second:\n"
+            "[2]"
+        )
+
+    def test_self_referential(self):
+        x = []
+        x.append(x)
+        y = []
+        y.append(y)
+        compare(x, y)
+        compare(x, y, strict=True)
+
+    def test_self_referential_different_shape(self):
+        x = []
+        x.append(x)
+        y = [[]]
+        y[0].append(y)
+        compare(x, y, strict=True)
+
+    def test_self_referential_objects(self):
+        x = Link(1)
+        x.next = x
+        y = Link(1)
+        y.next = y
+        compare(x, y)
+
+    def test_self_referential_different(self):
+        x = Link(1, Link(2))
+        x.next.next = x
+        y = Link(1, Link(3))
+        y.next.next = y
+        self.check_raises(
+            x, y,
+            "Link not as expected:\n"
+            "\n"
+            "attributes same:\n"
+            "['value']\n"
+            "\n"
+            "attributes differ:\n"
+            "'next': <Link 2> != <Link 3>\n"
+            "\n"
+            "While comparing .next: Link not as expected:\n"
+            "\n"
+            "attributes same:\n"
+            "['next']\n"
+            "\n"
+            "attributes differ:\n"
+            "'value': 2 != 3"
+        )
+
+    def test_self_referential_result_not_reused(self):
+        # x and y are only found equal when comparing the ['n'] entries by
+        # assuming their .next attributes are equal, which they aren't:
+        x = Link(1, Link(2))
+        x.next.next = x
+        y = Link(1, Link(3))
+        y.next.next = y
+        self.check_raises(
+            {'n': x.next, 'x': x}, {'n': y.next, 'x': y},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'n': <Link 2> != <Link 3>\n"
+            "'x': <Link 1> != <Link 1>\n"
+            "\n"
+            "While comparing ['n']: Link not as expected:\n"
+            "\n"
+            "attributes same:\n"
+            "['next']\n"
+            "\n"
+            "attributes differ:\n"
+            "'value': 2 != 3\n"
+            "\n"
+            "While comparing ['x']: Link not as expected:\n"
+            "\n"
+            "attributes same:\n"
+            "['value']\n"
+            "\n"
+            "attributes differ:\n"
+            "'next': <Link 2> != <Link 3>\n"
+            "\n"
+            "While comparing ['x'].next: Link not as expected:\n"
+            "\n"
+            "attributes same:\n"
+            "['next']\n"
+            "\n"
+            "attributes differ:\n"
+            "'value': 2 != 3"
+        )
+
+
+if PY3:
+
+    class TestCompareBytes(TestCase):
+
+        x = bytes(range(256))
+
+        def changed(self, *offsets):
+            y = bytearray(self.x)
+            for offset in offsets:
+                y[offset] = 0
+            return bytes(y)
+
+        def test_short(self):
+            compare(
+                compare(bytearray(b'abc'), bytearray(b'abd'), raises=False),
+                expected="\nbytearray(b'abc')\n!=\nbytearray(b'abd')"
+            )
+
+        def test_short_memoryview(self):
+            compare(
+                compare(memoryview(b'abc'), memoryview(b'abd'),
+                        raises=False),
+                expected="\nb'abc'\n!=\nb'abd'"
+            )
+
+        def test_short_mixed_types(self):
+            compare(
+                compare(b'abc', bytearray(b'abd'), raises=False),
+                expected="\nb'abc'\n!=\nbytearray(b'abd')"
+            )
+
+        def test_hexdump_mixed_types(self):
+            message = compare(self.x, memoryview(self.changed(0x21)),
+                              raises=False, bytes_context=0)
+            compare(message, expected=(
+                "bytes not as expected:\n"
+                "\n"
+                "first difference at offset 33 (0x21)\n"
+                "\n"
+                "@@ first[0x20:0x30] != second[0x20:0x30] @@\n"
+                "- 00000020  20 21 22 23 24 25 26 27  "
+                "28 29 2a 2b 2c 2d 2e 2f  | !\"#$%&'()*+,-./|\n"
+                "+ 00000020  20 00 22 23 24 25 26 27  "
+                "28 29 2a 2b 2c 2d 2e 2f  | .\"#$%&'()*+,-./|"
+            ))
+
+        def test_hexdump(self):
+            compare(compare(self.x, self.changed(0x21, 0x22), raises=False),
+                    expected=(
+                "bytes not as expected:\n"
+                "\n"
+                "first difference at offset 33 (0x21)\n"
+                "\n"
+                "@@ first[0x10:0x40] != second[0x10:0x40] @@\n"
+                "  00000010  10 11 12 13 14 15 16 17  "
+                "18 19 1a 1b 1c 1d 1e 1f  |................|\n"
+                "- 00000020  20 21 22 23 24 25 26 27  "
+                "28 29 2a 2b 2c 2d 2e 2f  | !\"#$%&'()*+,-./|\n"
+                "+ 00000020  20 00 00 23 24 25 26 27  "
+                "28 29 2a 2b 2c 2d 2e 2f  | ..#$%&'()*+,-./|\n"
+                "  00000030  30 31 32 33 34 35 36 37  "
+                "38 39 3a 3b 3c 3d 3e 3f  |0123456789:;<=>?|"
+            ))
+
+        def test_separate_hunks(self):
+            message = compare(self.x, self.changed(0x01, 0xf0),
+                              raises=False, bytes_context=0)
+            compare(message, expected=(
+                "bytes not as expected:\n"
+                "\n"
+                "first difference at offset 1 (0x1)\n"
+                "\n"
+                "@@ first[0x0:0x10] != second[0x0:0x10] @@\n"
+                "- 00000000  00 01 02 03 04 05 06 07  "
+                "08 09 0a 0b 0c 0d 0e 0f  |................|\n"
+                "+ 00000000  00 00 02 03 04 05 06 07  "
+                "08 09 0a 0b 0c 0d 0e 0f  |................|\n"
+                "\n"
+                "@@ first[0xf0:0x100] != second[0xf0:0x100] @@\n"
+                "- 000000f0  f0 f1 f2 f3 f4 f5 f6 f7  "
+                "f8 f9 fa fb fc fd fe ff  |................|\n"
+                "+ 000000f0  00 f1 f2 f3 f4 f5 f6 f7  "
+                "f8 f9 fa fb fc fd fe ff  |................|"
+            ))
+
+        def test_length_and_labels(self):
+            message = compare(self.x, self.x + b'extra', raises=False,
+                              x_label='expected', y_label='actual')
+            compare(message, expected=(
+                "bytes not as expected:\n"
+                "\n"
+                "length: 256 (expected) != 261 (actual)\n"
+                "first difference at offset 256 (0x100)\n"
+                "\n"
+                "@@ expected[0xf0:0x100] != actual[0xf0:0x105] @@\n"
+                "  000000f0  f0 f1 f2 f3 f4 f5 f6 f7  "
+                "f8 f9 fa fb fc fd fe ff  |................|\n"
+                "+ 00000100  65 78 74 72 61                 "
+                "                   |extra|"
+            ))
+
+        def test_mismatch_limit(self):
+            message = compare(self.x, bytes(256), raises=False,
+                              mismatch_limit=1, bytes_context=0)
+            compare(message, expected=(
+                "bytes not as expected:\n"
+                "\n"
+                "first difference at offset 1 (0x1)\n"
+                "\n"
+                "@@ first[0x0:0x10] != second[0x0:0x10] @@\n"
+                "- 00000000  00 01 02 03 04 05 06 07  "
+                "08 09 0a 0b 0c 0d 0e 0f  |................|\n"
+                "+ 00000000  00 00 00 00 00 00 00 00  "
+                "00 00 00 00 00 00 00 00  |................|\n"
+                "\n"
+                "differences after offset 0x10 not shown"
+            ))
+
+        def test_large(self):
+            x = bytes(range(256)) * 2**16
+            y = bytearray(x)
+            y[-1] = 0
+            message = compare(x, bytes(y), raises=False, bytes_context=0)
+            compare(message.split('\n')[2],
+                    expected='first difference at offset 16777215 '
+                             '(0xffffff)')
+
+        def test_bytearray(self):
+            compare(bytearray(self.x), bytearray(self.x))
+            message = compare(bytearray(self.x),
+                              bytearray(self.changed(0x21)),
+                              raises=False)
+            compare(message.split('\n')[0],
+                    expected='bytearray not as expected:')
+
+        def test_memoryview(self):
+            compare(memoryview(self.x), memoryview(self.x))
+            message = compare(memoryview(self.x),
+                              memoryview(self.changed(0x21)),
+                              raises=False)
+            compare(message.split('\n')[:3], expected=[
+                'memoryview not as expected:',
+                '',
+                'first difference at offset 33 (0x21)',
+            ])
+
+        def test_memoryview_not_contiguous(self):
+            message = compare(memoryview(self.x * 2)[::2],
+                              memoryview(self.changed(0x22) * 2)[::2],
+                              raises=False)
+            compare(message.split('\n')[2],
+                    expected='first difference at offset 17 (0x11)')
+
+        def test_memoryview_multi_dimensional(self):
+            message = compare(memoryview(self.x).cast('B', (16, 16)),
+                              memoryview(self.changed(0x21)).cast('B',
+                                                                  (16, 16)),
+                              raises=False)
+            compare(message.split('\n')[2],
+                    expected='first difference at offset 33 (0x21)')
+
+        def mapped(self, data):
+            with TemporaryFile() as source:
+                source.write(data)
+                source.flush()
+                mapped = mmap(source.fileno(), 0)
+            self.addCleanup(mapped.close)
+            return mapped
+
+        def test_mmap(self):
+            compare(self.mapped(self.x), self.mapped(self.x))
+            message = compare(self.mapped(self.x),
+                              self.mapped(self.changed(0x21)),
+                              raises=False)
+            compare(message.split('\n')[:3], expected=[
+                'mmap not as expected:',
+                '',
+                'first difference at offset 33 (0x21)',
+            ])
+
+        def test_nested(self):
+            message = compare({'a': self.x}, {'a': self.changed(0x21)},
+                              raises=False)
+            lines = message.split('\n')
+            start = lines.index(
+                "While comparing ['a']: bytes not as expected:"
+            )
+            compare(lines[start+2],
+                    expected='first difference at offset 33 (0x21)')
+
+
+def records(count, changed=()):
+    result = [{'id': i, 'values': [i, i / 3.0]} for i in range(count)]
+    for i in changed:
+        result[i]['values'][1] = 0
+    return result
+
+
+class Counted(object):
+
+    def __init__(self, value):
+        self.value = value
+
+
+def compare_counted(x, y, context):
+    x.value.append(y)
+    if x.value[0] != y.value[0]:
+        return '%r != %r' % (x.value[0], y.value[0])
+
+
+class TestParallel(CompareHelper, TestCase):
+
+    def setUp(self):
+        replacer = Replacer()
+        replacer.replace('testfixtures.comparison._parallel_threshold', 2)
+        self.addCleanup(replacer.restore)
+
+    def test_equal(self):
+        compare(records(100), records(100), strict=True, processes=2)
+
+    def test_equal_dict(self):
+        compare(dict(enumerate(records(100))), dict(enumerate(records(100))),
+                strict=True, processes=2)
+
+    def test_different(self):
+        x = records(100)
+        y = records(100, changed=[10, 90])
+        compare(compare(x, y, strict=True, processes=2, raises=False),
+                expected=compare(x, y, strict=True, raises=False))
+
+    def test_different_dict(self):
+        x = dict(enumerate(records(100)))
+        y = dict(enumerate(records(100, changed=[10, 90])))
+        del y[50]
+        compare(compare(x, y, processes=2, raises=False),
+                expected=compare(x, y, raises=False))
+
+    def test_different_quick(self):
+        x = records(100)
+        y = records(100, changed=[10])
+        compare(compare(x, y, quick=True, processes=2, raises=False),
+                expected=compare(x, y, raises=False))
+
+    def test_equal_not_compared_again(self):
+        # the comparer records the objects it's called with, but that
+        # only happens here if the worker processes didn't compare them:
+        x = [Counted([i]) for i in range(10)]
+        y = [Counted([i]) for i in range(10)]
+        y[3].value[0] = -1
+        compare(compare(x, y, processes=2, raises=False,
+                        comparers={Counted: compare_counted}).split('\n')[-1],
+                expected='While comparing [3]: 3 != -1')
+        compare([len(c.value) for c in x],
+                expected=[1, 1, 1, 2, 1, 1, 1, 1, 1, 1])
+
+    def test_below_threshold(self):
+        x = [Counted([i]) for i in range(10)]
+        y = [Counted([i]) for i in range(10)]
+        with Replacer() as r:
+            r.replace('testfixtures.comparison._parallel_threshold', 11)
+            compare(x, y, processes=2, comparers={Counted: compare_counted})
+        compare([len(c.value) for c in x], expected=[2] * 10)
+
+    def test_not_sequence_or_dict(self):
+        compare(set(range(100)), set(range(100)), strict=True, processes=2)
+
+    def test_exception(self):
+        def compare_boom(x, y, context):
+            if x.value[0] == 3:
+                raise ValueError('boom')
+
+        x = [Counted([i]) for i in range(10)]
+        y = [Counted([i]) for i in range(10)]
+        with ShouldRaise(ValueError('boom')):
+            compare(x, y, processes=2, comparers={Counted: compare_boom})
+
+    def test_pickled(self):
+        x = records(100)
+        y = records(100, changed=[10, 90])
+        with Replacer() as r:
+            r.replace('testfixtures.comparison._forking_context',
+                      lambda: None)
+            actual = compare(x, y, strict=True, processes=2, raises=False)
+        compare(actual, expected=compare(x, y, strict=True, raises=False))
+
+    def test_pickled_compared_by_workers(self):
+        # the workers compare copies of the objects, so only those found
+        # to differ are compared using the originals:
+        x = [Counted([i]) for i in range(10)]
+        y = [Counted([i]) for i in range(10)]
+        y[3].value[0] = -1
+        with Replacer() as r:
+            r.replace('testfixtures.comparison._forking_context',
+                      lambda: None)
+            actual = compare(x, y, processes=2, raises=False,
+                             comparers={Counted: compare_counted})
+        compare(actual.split('\n')[-1],
+                expected='While comparing [3]: 3 != -1')
+        compare([len(c.value) for c in x],
+                expected=[1, 1, 1, 2, 1, 1, 1, 1, 1, 1])
+
+    def test_not_picklable(self):
+        x = [Counted([i]) for i in range(10)]
+        y = [Counted([i]) for i in range(10)]
+        with Replacer() as r:
+            r.replace('testfixtures.comparison._forking_context',
+                      lambda: None)
+            compare(x, y, processes=2,
+                    comparers={Counted: lambda x, y, context:
+                               compare_counted(x, y, context)})
+        # all compared in this process:
+        compare([len(c.value) for c in x], expected=[2] * 10)
+
+
+class Record(object):
+
+    def __init__(self, id, tags=()):
+        self.id = id
+        self.tags = tags
+
+    def __repr__(self):
+        return '<Record %s>' % self.id
+
+
+class TestUnordered(CompareHelper, TestCase):
+
+    def test_equal(self):
+        compare([1, 2, 3, 4], [4, 2, 1, 3], ordered=False)
+
+    def test_equal_tuple(self):
+        compare((1, 2, 3), (3, 2, 1), ordered=False)
+
+    def test_equal_list_and_tuple(self):
+        compare([1, 2], (2, 1), ordered=False)
+
+    def test_ordered_by_default(self):
+        self.check_raises(
+            [1, 2], [2, 1],
+            "sequence not as expected:\n\n"
+            "same:\n[]\n\n"
+            "first:\n[1, 2]\n\n"
+            "second:\n[2, 1]"
+        )
+
+    def test_different(self):
+        self.check_raises(
+            [1, 2, 3], [3, 4, 1],
+            "sequence not as expected, ignoring order:\n\n"
+            "in first but not second:\n[2]\n\n"
+            "in second but not first:\n[4]",
+            ordered=False
+        )
+
+    def test_duplicates(self):
+        self.check_raises(
+            [1, 1, 2], [2, 1, 2],
+            "sequence not as expected, ignoring order:\n\n"
+            "in first but not second:\n[1]\n\n"
+            "in second but not first:\n[2]",
+            ordered=False
+        )
+
+    def test_only_in_second(self):
+        self.check_raises(
+            [1, 2], [2, 3, 1],
+            "sequence not as expected, ignoring order:\n\n"
+            "in second but not first:\n[3]",
+            ordered=False
+        )
+
+    def test_labels(self):
+        self.check_raises(
+            expected=[1, 2], actual=[3, 1],
+            message=(
+                "sequence not as expected, ignoring order:\n\n"
+                "in expected but not actual:\n[2]\n\n"
+                "in actual but not expected:\n[3]"
+            ),
+            ordered=False
+        )
+
+    def test_unorderable(self):
+        compare([1, 'a', None, 2.5], [None, 2.5, 'a', 1], ordered=False)
+
+    def test_unhashable(self):
+        compare([{'a': [1]}, {'b': 2}, [3]], [[3], {'b': 2}, {'a': [1]}],
+                ordered=False)
+
+    def test_unhashable_different(self):
+        self.check_raises(
+            [{'a': [1]}, {'b': 2}], [{'b': 2}, {'a': [2]}],
+            "sequence not as expected, ignoring order:\n\n"
+            "in first but not second:\n[{'a': [1]}]\n\n"
+            "in second but not first:\n[{'a': [2]}]",
+            ordered=False
+        )
+
+    def test_nested(self):
+        compare([[1, 2], [3, 4]], [[4, 3], [2, 1]], ordered=False)
+
+    def test_matched_using_comparers(self):
+        # Record doesn't define __eq__, so these can only be matched by
+        # comparing their attributes:
+        compare([Record(1), Record(2), Record(3)],
+                [Record(3), Record(1), Record(2)], ordered=False)
+
+    def test_trial_differences_not_described(self):
+        self.check_raises(
+            [Record(1, ['a']), Record(2, ['b'])],
+            [Record(2, ['b']), Record(3, ['a'])],
+            "sequence not as expected, ignoring order:\n\n"
+            "in first but not second:\n[<Record 1>]\n\n"
+            "in second but not first:\n[<Record 3>]",
+            ordered=False
+        )
+
+    def test_nested_within_dict(self):
+        self.check_raises(
+            {'rows': [1, 2]}, {'rows': [3, 1]},
+            "dict not as expected:\n\n"
+            "values differ:\n"
+            "'rows': [1, 2] != [3, 1]\n\n"
+            "While comparing ['rows']: "
+            "sequence not as expected, ignoring order:\n\n"
+            "in first but not second:\n[2]\n\n"
+            "in second but not first:\n[3]",
+            ordered=False
+        )
+
+    def test_strict_types(self):
+        self.check_raises(
+            [1, (1, 2)], [(1.0, 2), 1.0],
+            "sequence not as expected, ignoring order:\n\n"
+            "in first but not second:\n[1, (1, 2)]\n\n"
+            "in second but not first:\n[(1.0, 2), 1.0]",
+            ordered=False, strict=True
+        )
+
+    def test_strict_equal(self):
+        compare([(1, [2]), {'a': (3, )}, Record(4)],
+                [Record(4), {'a': (3, )}, (1, [2])],
+                ordered=False, strict=True)
+
+    def test_strict_same_object(self):
+        x = [[1], [2]]
+        compare(x, x, ordered=False, strict=True)
+
+    def test_strict_comparer_for_container(self):
+        # tuples that are == can't be matched by hash when strictly
+        # comparing them uses a comparer other than the built-in one:
+        def never_equal(x, y, context):
+            return 'never equal'
+        self.check_raises(
+            [(1, 2)], [(1, 2)],
+            "sequence not as expected, ignoring order:\n\n"
+            "in first but not second:\n[(1, 2)]\n\n"
+            "in second but not first:\n[(1, 2)]",
+            ordered=False, strict=True, comparers={tuple: never_equal}
+        )
+
+    def test_ignore_eq(self):
+        compare([Record(1), 2], [2, Record(1)], ordered=False, ignore_eq=True)
+
+    def test_quick(self):
+        compare([1, 2, 3], [3, 2, 1], ordered=False, quick=True)
+        self.check_raises(
+            [Record(1), 2], [2, Record(3)],
+            "sequence not as expected, ignoring order:\n\n"
+            "in first but not second:\n[<Record 1>]\n\n"
+            "in second but not first:\n[<Record 3>]",
+            ordered=False, quick=True
+        )
+
+    def test_quick_length_differs(self):
+        self.check_raises(
+            [1, 2], [2],
+            "sequence not as expected, ignoring order:\n\n"
+            "in first but not second:\n[1]",
+            ordered=False, quick=True
+        )
+
+    def test_parallel(self):
+        with Replacer() as r:
+            r.replace('testfixtures.comparison._parallel_threshold', 2)
+            compare(records(10), list(reversed(records(10))),
+                    ordered=False, processes=2)
+
+
+class TestTolerance(CompareHelper, TestCase):
+
+    def test_no_tolerance(self):
+        self.check_raises(1.0, 1.0 + 1e-12, '1.0 != 1.000000000001')
+
+    def test_rel_tol(self):
+        compare({'a': [1.0, (2.0, )]}, {'a': [1.0 + 1e-12, (2.0 - 1e-12, )]},
+                rel_tol=1e-9)
+
+    def test_rel_tol_exceeded(self):
+        self.check_raises(
+            {'a': 1.0, 'b': 100.0}, {'a': 1.1, 'b': 100.1},
+            "dict not as expected:\n\n"
+            "same:\n['b']\n\n"
+            "values differ:\n"
+            "'a': 1.0 != 1.1",
+            rel_tol=0.01
+        )
+
+    def test_abs_tol(self):
+        compare([0.0, 1.0], [1e-10, 1.0 - 1e-10], abs_tol=1e-9)
+        self.check_raises(0.0, 1e-8, '0.0 != 1e-08', abs_tol=1e-9)
+
+    def test_int_and_float(self):
+        compare([1, 2.0], [1.0 + 1e-12, 2], rel_tol=1e-9)
+
+    def test_int_and_int(self):
+        self.check_raises(100, 101, '100 != 101', rel_tol=0.1)
+
+    def test_int_and_float_strict(self):
+        self.check_raises(
+            1, 1.0 + 1e-12,
+            "1 (<class 'int'>) != 1.000000000001 (<class 'float'>)"
+            if PY3 else
+            "1 (<type 'int'>) != 1.000000000001 (<type 'float'>)",
+            rel_tol=1e-9, strict=True
+        )
+
+    def test_decimal(self):
+        compare(Decimal('1.0000000001'), Decimal('1'), rel_tol=1e-9)
+        compare(Decimal('1.1'), 1.1, rel_tol=1e-9)
+        self.check_raises(Decimal('1.1'), Decimal('1.2'),
+                          "Decimal('1.1') != Decimal('1.2')", abs_tol=0.05)
+
+    def test_complex(self):
+        compare(1 + 1j, 1 + (1 + 1e-12) * 1j, rel_tol=1e-9)
+        self.check_raises(1 + 1j, 1 + 2j, '(1+1j) != (1+2j)', rel_tol=0.1)
+
+    def test_nan(self):
+        self.check_raises(
+            float('nan'), float('nan'),
+            "Both x and y appear as 'nan', but are not equal!",
+            abs_tol=1
+        )
+
+    def test_infinity(self):
+        compare(float('inf'), float('inf'), rel_tol=0.1)
+        self.check_raises(float('inf'), 1e308, 'inf != 1e+308', rel_tol=0.1)
+
+    def test_negative(self):
+        with ShouldRaise(ValueError('rel_tol and abs_tol must not be '
+                                    'negative')):
+            compare(1.0, 1.0, rel_tol=-1)
+
+    def test_float_list(self):
+        x = [i / 3.0 for i in range(1000)]
+        compare(x, [v * (1 + 1e-12) for v in x], rel_tol=1e-9)
+
+    def test_float_list_different(self):
+        self.check_raises(
+            [1.0, 2.0, 3.0], [1.0, 2.5, 3.0],
+            "sequence not as expected:\n\n"
+            "same:\n[1.0]\n\n"
+            "first:\n[2.0, 3.0]\n\n"
+            "second:\n[2.5, 3.0]",
+            rel_tol=0.1
+        )
+
+    def test_float_tuple(self):
+        compare((1.0, 2.0), (1.0 + 1e-12, 2.0), rel_tol=1e-9)
+
+    def test_mixed_list(self):
+        compare([1.0, 2, None], [1.0 + 1e-12, 2, None], rel_tol=1e-9)
+
+    def test_float_list_different_lengths(self):
+        self.check_raises(
+            [1.0, 2.0], [1.0],
+            "sequence not as expected:\n\n"
+            "same:\n[1.0]\n\n"
+            "first:\n[2.0]\n\n"
+            "second:\n[]",
+            rel_tol=0.1
+        )
+
+    def test_float_list_unordered(self):
+        compare([1.0, 2.0], [2.0 + 1e-12, 1.0], rel_tol=1e-9, ordered=False)
+
+    def test_array(self):
+        compare(array('d', [1.0, 2.0]), array('d', [1.0, 2.0 + 1e-12]),
+                rel_tol=1e-9)
+
+    def test_array_different(self):
+        self.check_raises(
+            array('d', [1.0, 2.0]), array('d', [1.5, 2.0]),
+            "sequence not as expected:\n\n"
+            "same:\n()\n\n"
+            "first:\n(1.0, 2.0)\n\n"
+            "second:\n(1.5, 2.0)",
+            rel_tol=0.1
+        )
+
+    def test_array_of_ints(self):
+        compare(array('i', [1, 2]), array('i', [1, 2]), rel_tol=0.1)
+        self.check_raises(
+            array('i', [1, 2]), array('i', [1, 3]),
+            "sequence not as expected:\n\n"
+            "same:\n(1,)\n\n"
+            "first:\n(2,)\n\n"
+            "second:\n(3,)",
+            rel_tol=0.1
+        )
+
+
+class TestStats(CompareHelper, TestCase):
+
+    def setUp(self):
+        replacer = Replacer()
+        replacer.replace('testfixtures.comparison._slow_compare',
+                         dict(callback=None, seconds=1.0, stats=False))
+        self.addCleanup(replacer.restore)
+
+    def test_equal(self):
+        stats = CompareStats()
+        compare([1, 2, {'a': 3}], [1, 2, {'a': 3}], stats=stats)
+        compare(stats.calls, expected=1)
+        compare(stats.nodes, expected=1)
+        compare(stats.max_depth, expected=1)
+        compare(stats.comparers, expected={})
+        self.assertTrue(stats.seconds >= 0)
+
+    def test_nested(self):
+        stats = CompareStats()
+        compare([1, 2, {'a': [3]}], [1, 2, {'a': [3]}], stats=stats,
+                ignore_eq=True)
+        compare(stats.nodes, expected=6)
+        compare(stats.max_depth, expected=4)
+        compare(sorted(stats.comparers), expected=[
+            'compare_dict', 'compare_sequence'
+        ])
+        compare(stats.comparers['compare_sequence'][0], expected=2)
+        compare([(s.path, s.nodes, s.comparer) for s in stats.largest],
+                expected=[
+                    ('', 6, 'compare_sequence'),
+                    ('[2]', 3, 'compare_dict'),
+                    ("[2]['a']", 2, 'compare_sequence'),
+                ])
+
+    def test_different(self):
+        x = [1, 2, {'a': [3, 4]}]
+        y = [1, 2, {'a': [3, 5]}]
+        stats = CompareStats()
+        compare(compare(x, y, raises=False, stats=stats),
+                expected=compare(x, y, raises=False))
+        compare(stats.nodes, expected=7)
+        compare(stats.max_depth, expected=4)
+        compare(stats.comparers['compare_simple'][0], expected=1)
+        compare(stats.largest[-1].path, expected="[2]['a'][1]")
+        self.assertTrue(stats.rendering > 0)
+
+    def test_accumulates(self):
+        stats = CompareStats()
+        compare([1, 2], [1, 2], stats=stats, ignore_eq=True)
+        compare([1, 2], [1, 2], stats=stats, ignore_eq=True)
+        compare(stats.calls, expected=2)
+        compare(stats.nodes, expected=6)
+        compare(stats.comparers['compare_sequence'][0], expected=2)
+
+    def test_largest_limited(self):
+        stats = CompareStats(largest=2)
+        compare([[1], [2, 3], [4, 5, 6]], [[1], [2, 3], [4, 5, 6]],
+                stats=stats, ignore_eq=True)
+        compare([(s.path, s.nodes) for s in stats.largest],
+                expected=[('', 10), ('[2]', 4)])
+
+    def test_quick(self):
+        stats = CompareStats()
+        with ShouldAssert('1 != 2'):
+            compare(1, 2, quick=True, stats=stats)
+        # both the quick pass and the one rendering the message are counted:
+        compare(stats.nodes, expected=2)
+        compare(stats.comparers['compare_simple'][0], expected=2)
+
+    def test_deep(self):
+        x = y = 1
+        for _ in range(2000):
+            x, y = [x], [y]
+        stats = CompareStats()
+        compare(x, y, stats=stats, ignore_eq=True)
+        compare(stats.max_depth, expected=2001)
+
+    def test_per_call_comparer(self):
+        stats = CompareStats()
+        compare(1, 2, stats=stats, comparers={int: lambda x, y, context: ''})
+        compare(list(stats.comparers), expected=['<lambda>'])
+
+    def test_exception(self):
+        def boom(x, y, context):
+            raise ValueError('boom')
+        stats = CompareStats()
+        with ShouldRaise(ValueError('boom')):
+            compare([[1]], [[2]], stats=stats, comparers={int: boom})
+        compare(stats.calls, expected=1)
+        compare(stats.nodes, expected=3)
+
+    def test_parallel(self):
+        with Replacer() as r:
+            r.replace('testfixtures.comparison._parallel_threshold', 2)
+            stats = CompareStats()
+            compare(records(10), records(10), strict=True, processes=2,
+                    stats=stats)
+        compare(stats.calls, expected=1)
+
+    def test_str(self):
+        stats = CompareStats()
+        compare([1, [2]], [1, [2]], stats=stats, ignore_eq=True)
+        compare(compile(r'\d+\.\d{3}s').sub('Xs', str(stats)), expected=(
+            '1 call, Xs, 4 nodes, max depth 3, Xs rendering\n'
+            'comparers:\n'
+            '  compare_sequence: 2 calls, Xs\n'
+            'largest:\n'
+            '  top level: 4 nodes, Xs, compare_sequence\n'
+            '  [1]: 2 nodes, Xs, compare_sequence'
+        ))
+
+    def test_str_empty(self):
+        compare(str(CompareStats()),
+                expected='0 calls, 0.000s, 0 nodes, max depth 0, '
+                         '0.000s rendering')
+
+    def test_slow_hook(self):
+        calls = []
+        set_slow_compare_hook(lambda *args: calls.append(args), seconds=0)
+        compare(1, 1)
+        with ShouldAssert('1 != 2'):
+            compare(1, 2)
+        compare(len(calls), expected=2)
+        seconds, stats = calls[0]
+        self.assertTrue(seconds >= 0)
+        self.assertTrue(stats is None)
+
+    def test_slow_hook_fast_call(self):
+        calls = []
+        set_slow_compare_hook(calls.append, seconds=1000)
+        compare([1, 2], [1, 2])
+        compare(calls, expected=[])
+
+    def test_slow_hook_with_stats(self):
+        calls = []
+        set_slow_compare_hook(lambda *args: calls.append(args), seconds=0,
+                              stats=True)
+        compare([1, 2], [1, 2], ignore_eq=True)
+        compare([1, 2], [1, 2], ignore_eq=True)
+        compare(len(calls), expected=2)
+        first, second = calls[0][1], calls[1][1]
+        self.assertFalse(first is second)
+        compare(first.calls, expected=1)
+        compare(first.nodes, expected=3)
+
+    def test_slow_hook_explicit_stats(self):
+        calls = []
+        set_slow_compare_hook(lambda *args: calls.append(args), seconds=0,
+                              stats=True)
+        stats = CompareStats()
+        compare(1, 1, stats=stats)
+        self.assertTrue(calls[0][1] is stats)
+
+    def test_slow_hook_removed(self):
+        calls = []
+        set_slow_compare_hook(calls.append, seconds=0)
+        set_slow_compare_hook()
+        compare(1, 1)
+        compare(calls, expected=[])
+
+
+class TestDifferences(TestCase):
+
+    def check(self, difference, expected):
+        compare([(d.path, d.kind) for d in difference.walk()],
+                expected=expected)
+
+    def test_equal(self):
+        compare(differences([1, {'a': 2}], [1, {'a': 2}]), expected=None)
+        compare(differences([1, {'a': 2}], [1, {'a': 2}], ignore_eq=True),
+                expected=None)
+
+    def test_nested(self):
+        difference = differences(
+            {'a': [1, 2, 3], 'b': 'x', 'c': {'d': 1}},
+            {'a': [1, 5, 6], 'b': 'y', 'c': {'d': 1}, 'e': 1},
+        )
+        self.check(difference, [
+            ('', 'dict'),
+            ("['a']", 'sequence'),
+            ("['a'][1]", 'simple'),
+            ("['a'][2]", 'simple'),
+            ("['b']", 'text'),
+        ])
+        compare(difference.children[0].children[0].x, expected=2)
+        compare(difference.children[0].children[0].y, expected=5)
+
+    def test_objects(self):
+        difference = differences(SampleClassA([1, 2]), SampleClassA([1, 3]))
+        self.check(difference, [
+            ('', 'object'),
+            ('.args', 'tuple'),
+            ('.args[0]', 'sequence'),
+            ('.args[0][1]', 'simple'),
+        ])
+
+    def test_message(self):
+        x = {'a': [1, 2], 'b': 3}
+        y = {'a': [1, 3], 'b': 3}
+        difference = differences(x, y)
+        compare(difference.message, expected=compare(x, y, raises=False))
+        compare(str(difference.children[0]),
+                expected=compare(x['a'], y['a'], raises=False))
+
+    def test_message_lazy(self):
+        reprs = []
+        x = [CountingRepr('a', reprs), CountingRepr('b', reprs)]
+        y = [CountingRepr('a', reprs), CountingRepr('c', reprs)]
+        difference = differences(x, y)
+        compare(reprs, expected=[])
+        message = difference.children[0].message
+        self.assertTrue(message.startswith('CountingRepr not as expected:'))
+        rendered = len(reprs)
+        # only rendered once:
+        compare(difference.children[0].message, expected=message)
+        compare(len(reprs), expected=rendered)
+
+    def test_options_used_for_message(self):
+        difference = differences(expected=[1], actual=[1.0], strict=True)
+        self.check(difference, [
+            ('', 'sequence'),
+            ('[0]', 'with_type'),
+        ])
+        compare(difference.children[0].message,
+                expected="1 (<class 'int'>) (expected) != "
+                         "1.0 (<class 'float'>) (actual)"
+                if PY3 else
+                "1 (<type 'int'>) (expected) != "
+                "1.0 (<type 'float'>) (actual)")
+
+    def test_unordered(self):
+        difference = differences([1, [2], 3], [3, [2], 4], ordered=False)
+        # the elements tried while matching aren't differences:
+        self.check(difference, [('', 'sequence')])
+        compare(difference.message, expected=(
+            "sequence not as expected, ignoring order:\n"
+            "\n"
+            "in first but not second:\n"
+            "[1]\n"
+            "\n"
+            "in second but not first:\n"
+            "[4]"
+        ))
+
+    def test_generator(self):
+        difference = differences((i for i in (1, 2, 3)),
+                                 (i for i in (1, 4, 5)),
+                                 stream_differences=2)
+        self.check(difference, [
+            ('', 'generator'),
+            ('[1]', 'simple'),
+            ('[2]', 'simple'),
+        ])
+        compare(difference.message, expected=(
+            'generator not as expected, but can only be iterated over once'
+        ))
+        compare(difference.children[1].message, expected='3 != 5')
+
+    def test_shared(self):
+        x_shared = {'a': 1}
+        y_shared = {'a': 2}
+        difference = differences([x_shared, x_shared], [y_shared, y_shared])
+        self.check(difference, [
+            ('', 'sequence'),
+            ('[0]', 'dict'),
+            ("[0]['a']", 'simple'),
+            ('[1]', 'dict'),
+            ("[1]['a']", 'simple'),
+        ])
+
+    def test_deep(self):
+        x = y = None
+        for i in range(2000):
+            x, y = [x], [y]
+        x[0] = 1
+        difference = differences(x, y)
+        compare(len(list(difference.walk())), expected=2)
+        as_dict = difference.as_dict()
+        compare(as_dict['children'][0]['path'], expected='[0]')
+
+    def test_as_dict(self):
+        difference = differences({'a': [1]}, {'a': [2]})
+        compare(json.loads(json.dumps(difference.as_dict(reprs=True))),
+                expected={
+                    'path': '', 'kind': 'dict',
+                    'x': "{'a': [1]}", 'y': "{'a': [2]}",
+                    'children': [{
+                        'path': "['a']", 'kind': 'sequence',
+                        'x': '[1]', 'y': '[2]',
+                        'children': [{
+                            'path': "['a'][0]", 'kind': 'simple',
+                            'x': '1', 'y': '2', 'children': [],
+                        }],
+                    }],
+                })
+        compare(difference.as_dict()['children'][0],
+                expected={'path': "['a']", 'kind': 'sequence', 'children': [
+                    {'path': "['a'][0]", 'kind': 'simple', 'children': []},
+                ]})
+
+    def test_repr(self):
+        difference = differences({'a': 1}, {'a': 2})
+        compare(repr(difference), expected='<Difference: dict at top level>')
+        compare(repr(difference.children[0]),
+                expected="<Difference: simple at ['a']>")
+
+    def test_stats(self):
+        stats = CompareStats()
+        difference = differences([1, 2], [1, 3], stats=stats)
+        compare(stats.nodes, expected=3)
+        compare(difference.message, expected=compare([1, 2], [1, 3],
+                                                     raises=False))
+        # rendering messages isn't counted:
+        compare(stats.nodes, expected=3)
+
+    def test_parallel(self):
+        with Replacer() as r:
+            r.replace('testfixtures.comparison._parallel_threshold', 2)
+            difference = differences(records(10), records(10, changed=[3]),
+                                     processes=2)
+        self.check(difference, [
+            ('', 'sequence'),
+            ('[3]', 'dict'),
+            ("[3]['values']", 'sequence'),
+            ("[3]['values'][1]", 'object'),
+        ])
+
+
+class Cached(object):
+
+    def __init__(self, value, cache):
+        self.value = value
+        self.cache = cache
+
+
+class TestPaths(CompareHelper, TestCase):
+
+    def test_ignore(self):
+        compare({'meta': {'a': {'ts': 1, 'v': 2}, 'b': {'ts': 3}}},
+                {'meta': {'a': {'ts': 4, 'v': 2}, 'b': {'ts': 5}}},
+                ignore_paths=["['meta']['*']['ts']"])
+
+    def test_ignore_still_different(self):
+        self.check_raises(
+            {'meta': {'a': {'ts': 1, 'v': 2}}},
+            {'meta': {'a': {'ts': 4, 'v': 3}}},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'meta': {'a': {'ts': 1, 'v': 2}} != {'a': {'ts': 4, 'v': 3}}\n"
+            "\n"
+            "While comparing ['meta']: dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'a': {'ts': 1, 'v': 2} != {'ts': 4, 'v': 3}\n"
+            "\n"
+            "While comparing ['meta']['a']: dict not as expected:\n"
+            "\n"
+            "same:\n"
+            "['ts']\n"
+            "\n"
+            "values differ:\n"
+            "'v': 2 != 3",
+            ignore_paths=["['meta'][*]['ts']"]
+        )
+
+    def test_ignore_attribute(self):
+        compare(Cached(1, {'x': 1}), Cached(1, {'x': 2}),
+                ignore_paths='.cache')
+        self.check_raises(
+            Cached(1, {'x': 1}), Cached(2, {'x': 2}),
+            "Cached not as expected:\n"
+            "\n"
+            "attributes same:\n"
+            "['cache']\n"
+            "\n"
+            "attributes differ:\n"
+            "'value': 1 != 2",
+            ignore_paths=['.cache']
+        )
+
+    def test_ignore_sequence_element(self):
+        compare([1, [2, 3]], [1, [4, 3]], ignore_paths=['[1][0]'])
+        compare([1, [2, 3]], [1, [4, 5]], ignore_paths=['[1][*]'])
+
+    def test_ignore_missing_key(self):
+        compare({'a': 1, 'ts': 2}, {'a': 1}, ignore_paths=["['ts']"])
+        compare({'a': 1}, {'a': 1, 'ts': 2}, ignore_paths=["['ts']"])
+
+    def test_ignore_top_level(self):
+        compare(1, 2, ignore_paths=[''])
+
+    def test_ignore_shared(self):
+        # the same objects at another path must still be compared:
+        x = {'ts': 1}
+        y = {'ts': 2}
+        self.check_raises(
+            {'a': x, 'b': x}, {'a': y, 'b': y},
+            "dict not as expected:\n"
+            "\n"
+            "same:\n"
+            "['a']\n"
+            "\n"
+            "values differ:\n"
+            "'b': {'ts': 1} != {'ts': 2}\n"
+            "\n"
+            "While comparing ['b']: dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'ts': 1 != 2",
+            ignore_paths=["['a']['ts']"]
+        )
+
+    def test_ignore_quick(self):
+        compare({'a': [1, 2]}, {'a': [1, 3]}, ignore_paths=["['a'][1]"],
+                quick=True)
+
+    def test_only(self):
+        x = {'id': 1, 'body': {'title': 'a', 'items': [1, 2]}, 'ts': 2}
+        y = {'id': 1, 'body': {'title': 'a', 'items': [3]}, 'extra': 1}
+        compare(x, y, only_paths=["['id']", "['body']['title']"])
+        self.check_raises(
+            x, y,
+            "dict not as expected:\n"
+            "\n"
+            "same:\n"
+            "['id']\n"
+            "\n"
+            "values differ:\n"
+            "'body': {'items': [1, 2], 'title': 'a'} != "
+            "{'items': [3], 'title': 'a'}\n"
+            "\n"
+            "While comparing ['body']: dict not as expected:\n"
+            "\n"
+            "same:\n"
+            "['title']\n"
+            "\n"
+            "values differ:\n"
+            "'items': [1, 2] != [3]\n"
+            "\n"
+            "While comparing ['body']['items']: sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[1, 2]\n"
+            "\n"
+            "second:\n"
+            "[3]",
+            only_paths=["['body']"]
+        )
+
+    def test_only_wildcard(self):
+        x = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+        y = [{'id': 1, 'name': 'c'}, {'id': 2, 'name': 'd'}]
+        compare(x, y, only_paths=["[*]['id']"])
+        self.check_raises(
+            x, y,
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]\n"
+            "\n"
+            "second:\n"
+            "[{'id': 1, 'name': 'c'}, {'id': 2, 'name': 'd'}]\n"
+            "\n"
+            "While comparing [0]: dict not as expected:\n"
+            "\n"
+            "same:\n"
+            "['id']\n"
+            "\n"
+            "values differ:\n"
+            "'name': 'a' != 'c'\n"
+            "\n"
+            "While comparing [0]['name']: 'a' != 'c'",
+            only_paths=["[*]['name']"]
+        )
+
+    def test_ignore_within_only(self):
+        compare({'a': {'b': 1, 'c': 2}, 'd': 3},
+                {'a': {'b': 1, 'c': 4}, 'd': 5},
+                only_paths=["['a']"], ignore_paths=["['a']['c']"])
+
+    def test_key_containing_separators(self):
+        compare({'a.b]': 1, 'c': 2}, {'a.b]': 3, 'c': 2},
+                ignore_paths=["['a.b]']"])
+
+    def test_invalid_path(self):
+        with ShouldRaise(ValueError("invalid path: \"['a'\"")):
+            compare(1, 1, ignore_paths=["['a'"])
+
+    def test_differences(self):
+        difference = differences(
+            {'a': {'ts': 1, 'v': 2}, 'b': 3},
+            {'a': {'ts': 4, 'v': 5}, 'b': 3},
+            ignore_paths=["['a']['ts']"]
+        )
+        compare([d.path for d in difference.walk()],
+                expected=['', "['a']", "['a']['v']"])
+        # the message for a nested difference still ignores the paths:
+        compare(difference.children[0].message, expected=(
+            "dict not as expected:\n"
+            "\n"
+            "same:\n"
+            "['ts']\n"
+            "\n"
+            "values differ:\n"
+            "'v': 2 != 5"
+        ))
+
+    def test_parallel_not_used(self):
+        with Replacer() as r:
+            r.replace('testfixtures.comparison._parallel_threshold', 2)
+            compare([{'ts': 1}] * 3, [{'ts': 2}] * 3,
+                    ignore_paths=["[*]['ts']"], processes=2)
+
+    def test_stats(self):
+        stats = CompareStats()
+        compare({'a': [1, 2], 'b': [3]}, {'a': [1, 2], 'b': [4]},
+                stats=stats, ignore_eq=True, ignore_paths=["['b']"])
+        compare(stats.nodes, expected=4)
+
+
+class Row(object):
+
+    def __init__(self, id, value):
+        self.id = id
+        self.value = value
+
+    def __repr__(self):
+        return '<Row %i: %r>' % (self.id, self.value)
+
+
+class TestKeyed(CompareHelper, TestCase):
+
+    def test_same_order_ignored(self):
+        x = [{'id': 1, 'v': 'a'}, {'id': 2, 'v': 'b'}]
+        compare(x, list(reversed(x)), key='id')
+
+    def test_added_removed_changed(self):
+        self.check_raises(
+            [{'id': i, 'v': 'a'} for i in range(100)],
+            [{'id': i, 'v': 'b' if i == 50 else 'a'} for i in range(1, 101)],
+            "sequence not as expected, matching by key:\n"
+            "\n"
+            "in first but not second:\n"
+            "0: {'id': 0, 'v': 'a'}\n"
+            "\n"
+            "in second but not first:\n"
+            "100: {'id': 100, 'v': 'a'}\n"
+            "\n"
+            "values differ:\n"
+            "50: {'id': 50, 'v': 'a'} != {'id': 50, 'v': 'b'}\n"
+            "\n"
+            "While comparing [key=50]: dict not as expected:\n"
+            "\n"
+            "same:\n"
+            "['id']\n"
+            "\n"
+            "values differ:\n"
+            "'v': 'a' != 'b'\n"
+            "\n"
+            "While comparing [key=50]['v']: 'a' != 'b'",
+            key='id'
+        )
+
+    def test_attribute(self):
+        compare([Row(1, 'a'), Row(2, 'b')], [Row(2, 'b'), Row(1, 'a')],
+                key='id')
+        self.check_raises(
+            [Row(1, 'a'), Row(2, 'b')], [Row(2, 'c'), Row(1, 'a')],
+            "sequence not as expected, matching by key:\n"
+            "\n"
+            "values differ:\n"
+            "2: <Row 2: 'b'> != <Row 2: 'c'>\n"
+            "\n"
+            "While comparing [key=2]: Row not as expected:\n"
+            "\n"
+            "attributes same:\n"
+            "['id']\n"
+            "\n"
+            "attributes differ:\n"
+            "'value': 'b' != 'c'\n"
+            "\n"
+            "While comparing [key=2].value: 'b' != 'c'",
+            key='id'
+        )
+
+    def test_callable(self):
+        self.check_raises(
+            [('a', 1), ('b', 2)], [('b', 2), ('c', 3)],
+            "sequence not as expected, matching by key:\n"
+            "\n"
+            "in first but not second:\n"
+            "'a': ('a', 1)\n"
+            "\n"
+            "in second but not first:\n"
+            "'c': ('c', 3)",
+            key=lambda row: row[0]
+        )
+
+    def test_labels(self):
+        self.check_raises(
+            expected=[{'id': 1}], actual=[{'id': 2}],
+            message=(
+                "sequence not as expected, matching by key:\n"
+                "\n"
+                "in expected but not actual:\n"
+                "1: {'id': 1}\n"
+                "\n"
+                "in actual but not expected:\n"
+                "2: {'id': 2}"
+            ),
+            key='id'
+        )
+
+    def test_no_key_falls_back(self):
+        self.check_raises(
+            [1, 2], [1, 3],
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[1]\n"
+            "\n"
+            "first:\n"
+            "[2]\n"
+            "\n"
+            "second:\n"
+            "[3]",
+            key='id'
+        )
+
+    def test_duplicate_key_falls_back(self):
+        self.check_raises(
+            [{'id': 1, 'v': 1}, {'id': 1, 'v': 2}],
+            [{'id': 1, 'v': 2}, {'id': 1, 'v': 1}],
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[{'id': 1, 'v': 1}, {'id': 1, 'v': 2}]\n"
+            "\n"
+            "second:\n"
+            "[{'id': 1, 'v': 2}, {'id': 1, 'v': 1}]\n"
+            "\n"
+            "While comparing [0]: dict not as expected:\n"
+            "\n"
+            "same:\n"
+            "['id']\n"
+            "\n"
+            "values differ:\n"
+            "'v': 1 != 2",
+            key='id'
+        )
+
+    def test_unhashable_key_falls_back(self):
+        compare([{'id': [1]}], [{'id': [1]}], key='id', ignore_eq=True)
+
+    def test_nested(self):
+        compare({'rows': [{'id': 1, 'tags': ['a']}, {'id': 2, 'tags': []}]},
+                {'rows': [{'id': 2, 'tags': []}, {'id': 1, 'tags': ['a']}]},
+                key='id')
+
+    def test_list_and_tuple(self):
+        compare([{'id': 1}, {'id': 2}], ({'id': 2}, {'id': 1}), key='id')
+
+    def test_quick(self):
+        compare([{'id': 1}, {'id': 2}], [{'id': 2}, {'id': 1}],
+                key='id', quick=True)
+        self.check_raises(
+            [{'id': 1}], [{'id': 2}],
+            "sequence not as expected, matching by key:\n"
+            "\n"
+            "in first but not second:\n"
+            "1: {'id': 1}\n"
+            "\n"
+            "in second but not first:\n"
+            "2: {'id': 2}",
+            key='id', quick=True
+        )
+
+    def test_max_differences(self):
+        self.check_raises(
+            [{'id': i} for i in range(5)], [{'id': i} for i in range(5, 10)],
+            "sequence not as expected, matching by key:\n"
+            "\n"
+            "in first but not second:\n"
+            "0: {'id': 0}\n"
+            "1: {'id': 1}\n"
+            "\n"
+            "Message truncated, not shown: 8 differences",
+            key='id', max_differences=2
+        )
+
+    def test_differences(self):
+        difference = differences(
+            [{'id': 1, 'v': 1}, {'id': 2, 'v': 2}, {'id': 3, 'v': 3}],
+            [{'id': 3, 'v': 4}, {'id': 2, 'v': 2}, {'id': 1, 'v': 5}],
+            key='id'
+        )
+        compare([d.path for d in difference.walk()], expected=[
+            '', '[key=1]', "[key=1]['v']", '[key=3]', "[key=3]['v']",
+        ])
+
+    def test_ignore_paths(self):
+        compare([{'id': 1, 'ts': 1}], [{'id': 1, 'ts': 2}],
+                key='id', ignore_paths=["[key=*]['ts']"])
+        compare([{'id': 1}, {'id': 2}], [{'id': 1}],
+                key='id', ignore_paths=['[key=2]'])
+
+
+class TestSorted(CompareHelper, TestCase):
+
+    def test_same(self):
+        compare([1, 2, 3], [1, 2, 3], sorted=True, strict=True)
+
+    def test_only_in_one(self):
+        self.check_raises(
+            [1, 2, 4, 6], [1, 3, 4, 6, 7],
+            "sequence not as expected, merging sorted elements:\n"
+            "\n"
+            "in first but not second:\n"
+            "[1]: 2\n"
+            "\n"
+            "in second but not first:\n"
+            "[1]: 3\n"
+            "[4]: 7",
+            sorted=True
+        )
+
+    def test_labels(self):
+        self.check_raises(
+            expected=['a'], actual=['b'],
+            message=(
+                "sequence not as expected, merging sorted elements:\n"
+                "\n"
+                "in expected but not actual:\n"
+                "[0]: 'a'\n"
+                "\n"
+                "in actual but not expected:\n"
+                "[0]: 'b'"
+            ),
+            sorted=True
+        )
+
+    def test_changed(self):
+        # equal in the sort order but different when compared strictly:
+        self.check_raises(
+            [1, 2, 3], [1, 2.0, 3],
+            "sequence not as expected, merging sorted elements:\n"
+            "\n"
+            "values differ:\n"
+            "[1]: 2 != 2.0\n"
+            "\n"
+            "While comparing [1]: 2 (%r) != 2.0 (%r)" % (int, float),
+            sorted=True, strict=True
+        )
+
+    def test_key(self):
+        self.check_raises(
+            [{'id': 1, 'v': 1}, {'id': 2, 'v': 2}, {'id': 3, 'v': 3}],
+            [{'id': 2, 'v': 4}, {'id': 3, 'v': 3}],
+            "sequence not as expected, merging sorted elements:\n"
+            "\n"
+            "in first but not second:\n"
+            "[0]: {'id': 1, 'v': 1}\n"
+            "\n"
+            "values differ:\n"
+            "[1]->[0]: {'id': 2, 'v': 2} != {'id': 2, 'v': 4}\n"
+            "\n"
+            "While comparing [1]->[0]: dict not as expected:\n"
+            "\n"
+            "same:\n"
+            "['id']\n"
+            "\n"
+            "values differ:\n"
+            "'v': 2 != 4",
+            sorted=True, key='id'
+        )
+
+    def test_not_sorted_falls_back(self):
+        self.check_raises(
+            [2, 1], [1, 3],
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[2, 1]\n"
+            "\n"
+            "second:\n"
+            "[1, 3]",
+            sorted=True
+        )
+
+    def test_not_sorted_falls_back_to_key(self):
+        compare([{'id': 2}, {'id': 1}], [{'id': 1}, {'id': 2}],
+                sorted=True, key='id')
+
+    def test_not_orderable_falls_back(self):
+        self.check_raises(
+            [1j, 2j], [1j, 3j],
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[1j]\n"
+            "\n"
+            "first:\n"
+            "[2j]\n"
+            "\n"
+            "second:\n"
+            "[3j]\n"
+            "\n"
+            "While comparing [1]: 2j != 3j",
+            sorted=True
+        )
+
+    def test_ordering_raises_falls_back(self):
+        # such as numpy arrays, where the truth of the result is ambiguous:
+        class Ambiguous(object):
+            def __init__(self, value):
+                self.value = value
+
+            def __lt__(self, other):
+                raise ValueError('ambiguous')
+
+            def __repr__(self):
+                return '<Ambiguous %s>' % self.value
+        compare([Ambiguous(1), Ambiguous(2)], [Ambiguous(1), Ambiguous(2)],
+                sorted=True,
+                comparers={Ambiguous: lambda x, y, context:
+                           x.value != y.value})
+
+    def test_not_orderable_with_each_other(self):
+        # elements that can't be ordered with those in the other sequence
+        # are treated as being at the same place:
+        self.check_raises(
+            [1, 2], [1j],
+            "sequence not as expected, merging sorted elements:\n"
+            "\n"
+            "in first but not second:\n"
+            "[1]: 2\n"
+            "\n"
+            "values differ:\n"
+            "[0]: 1 != 1j\n"
+            "\n"
+            "While comparing [0]: 1 != 1j",
+            sorted=True
+        )
+
+    def test_list_and_tuple(self):
+        self.check_raises(
+            [1, 2], (1, 3),
+            "sequence not as expected, merging sorted elements:\n"
+            "\n"
+            "in first but not second:\n"
+            "[1]: 2\n"
+            "\n"
+            "in second but not first:\n"
+            "[1]: 3",
+            sorted=True
+        )
+
+    def test_quick(self):
+        self.check_raises(
+            [1, 2], [2, 3],
+            "sequence not as expected, merging sorted elements:\n"
+            "\n"
+            "in first but not second:\n"
+            "[0]: 1\n"
+            "\n"
+            "in second but not first:\n"
+            "[1]: 3",
+            sorted=True, quick=True
+        )
+
+    def test_max_differences(self):
+        self.check_raises(
+            list(range(0, 100, 2)), list(range(1, 100, 2)),
+            "sequence not as expected, merging sorted elements:\n"
+            "\n"
+            "in first but not second:\n"
+            "[0]: 0\n"
+            "[1]: 2\n"
+            "\n"
+            "in second but not first:\n"
+            "[0]: 1\n"
+            "\n"
+            "Comparison stopped after finding 3 differences, "
+            "the limit set by max_differences",
+            sorted=True, max_differences=3
+        )
+
+    def test_max_chars(self):
+        self.check_raises(
+            list(range(0, 100, 2)), list(range(1, 100, 2)),
+            "sequence not as expected, merging sorted elements:\n"
+            "\n"
+            "in first but not second:\n"
+            "[0]: 0\n"
+            "[1]: 2\n"
+            "\n"
+            "Message truncated to 5 lines, at least 95 differences not shown",
+            sorted=True, max_lines=5
+        )
+
+    def test_differences(self):
+        difference = differences([1, 2, 3, 5], [1, 2.5, 3, 4],
+                                 sorted=True)
+        compare(difference.path, expected='')
+        compare(difference.children, expected=[])
+        compare(differences([1, 2], [1, 2.0], sorted=True, strict=True)
+                .children[0].path, expected='[1]')
@@ -1,7 +1,11 @@
 from unittest import TestCase
 import sys
 
-from testfixtures import Comparison as C, TempDirectory, compare, diff
+from testfixtures import (
+    Comparison as C, Replacer, TempDirectory, compare, diff
+)
+from testfixtures import comparison
+from testfixtures.comparison import Comparison
 from testfixtures.compat import PY2, PY3, exception_module
 from testfixtures.shouldraise import ShouldAssert
 from testfixtures.tests.sample1 import SampleClassA, a_function
@@ -706,3 +710,79 @@ class TestC(TestCase):
         else:
             expected = "<C:<class '.'>>"
         self.assertEqual(repr(c), expected)
+
+
+def compiled(*args, **kw):
+    return Comparison(*args, **kw).compile()
+
+
+class TestCompiled(TestC):
+    # every test of Comparison should also pass for compiled comparisons
+
+    def setUp(self):
+        replace = Replacer()
+        replace('testfixtures.tests.test_comparison.C', compiled)
+        self.addCleanup(replace.restore)
+
+    def test_failure_only_described_when_needed(self):
+        calls = []
+
+        def compare_mapping(*args, **kw):
+            calls.append(args[:2])
+            return original(*args, **kw)
+
+        original = comparison._compare_mapping
+        with Replacer() as replace:
+            replace('testfixtures.comparison._compare_mapping',
+                    compare_mapping)
+            c = C(AClass, x=1, y=2)
+            candidates = [AClass(i, 2) for i in range(100)]
+            assert c in candidates
+            assert c != AClass(3, 2)
+            compare(calls, expected=[])
+            compare_repr(c,
+                         "\n"
+                         "<C(failed):"
+                         "testfixtures.tests.test_comparison.AClass>\n"
+                         "attributes same:\n"
+                         "['y']\n\n"
+                         "attributes differ:\n"
+                         "'x': 1 (Comparison) != 3 (actual)\n"
+                         "</C>")
+            repr(c)
+        compare(calls, expected=[({'x': 1, 'y': 2}, {'x': 3, 'y': 2})])
+
+    def test_failure_forgotten_when_equal(self):
+        c = C(AClass, x=1, y=2)
+        assert c != AClass(3, 2)
+        assert c == AClass(1, 2)
+        compare(c.failed, expected=None)
+        compare_repr(c, '\n'
+                        '<C:testfixtures.tests.test_comparison.AClass>\n'
+                        'x: 1\n'
+                        'y: 2\n'
+                        '</C>')
+
+    def test_nested_same_comparison(self):
+        inner = C(AClass, x=1)
+        outer = C(AClass, x=inner, y=inner)
+        assert outer == AClass(AClass(1), AClass(1))
+        assert outer != AClass(AClass(1), AClass(2))
+
+    def test_changes_after_compiling_ignored(self):
+        uncompiled = Comparison(AClass, x=1)
+        c = uncompiled.compile()
+        uncompiled.v['x'] = 2
+        assert c == AClass(1)
+
+    def test_many_attributes_missing_not_strict(self):
+        c = C(AClass, x=1, y=2, z=3, strict=False)
+        assert c != AClass(1, 2)
+        compare_repr(c,
+                     "\n"
+                     "<C(failed):testfixtures.tests.test_comparison.AClass>\n"
+                     "attributes same:\n"
+                     "['x', 'y']\n\n"
+                     "attributes in Comparison but not actual:\n"
+                     "'z': 3\n"
+                     "</C>")
@@ -0,0 +1,249 @@
+from collections import namedtuple
+from unittest import TestCase, skipUnless
+
+import attr
+
+from testfixtures import compare
+from testfixtures.comparison import (
+    CompareContext, compare_attrs, compare_dataclass, _field_layouts
+)
+from testfixtures.compat import PY_37_PLUS
+from testfixtures.tests.test_compare import CompareHelper
+
+if PY_37_PLUS:
+    from dataclasses import field, make_dataclass
+
+    Point = make_dataclass('Point', [
+        'x', 'y', ('label', str, field(default='', compare=False))
+    ])
+    Unequal = make_dataclass('Unequal', ['x'], eq=False)
+    Empty = make_dataclass('Empty', [], eq=False)
+
+
+@skipUnless(PY_37_PLUS, 'dataclasses are only available in Python 3.7+')
+class TestDataclass(CompareHelper, TestCase):
+
+    def test_same(self):
+        compare(Point(1, 2), Point(1, 2))
+
+    def test_same_ignore_eq(self):
+        compare(Point(1, [2]), Point(1, [2]), ignore_eq=True)
+
+    def test_different(self):
+        self.check_raises(
+            Point(1, [2]), Point(1, [3]),
+            "Point not as expected:\n"
+            "\n"
+            "attributes same:\n"
+            "['x']\n"
+            "\n"
+            "attributes differ:\n"
+            "'y': [2] != [3]\n"
+            "\n"
+            "While comparing .y: sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[2]\n"
+            "\n"
+            "second:\n"
+            "[3]"
+        )
+
+    def test_not_compared_field_ignored(self):
+        compare(Point(1, 2, 'a'), Point(1, 2, 'b'), ignore_eq=True)
+
+    def test_no_eq(self):
+        compare(Unequal([1]), Unequal([1]))
+        self.check_raises(
+            Unequal(1), Unequal(2),
+            "Unequal not as expected:\n"
+            "\n"
+            "attributes differ:\n"
+            "'x': 1 != 2"
+        )
+
+    def test_no_eq_quick(self):
+        compare(Unequal([1]), Unequal([1]), quick=True)
+        self.check_raises(Unequal(1), Unequal(2),
+                          "Unequal not as expected:\n"
+                          "\n"
+                          "attributes differ:\n"
+                          "'x': 1 != 2",
+                          quick=True)
+
+    def test_no_fields(self):
+        x = Empty()
+        compare(x, x)
+        self.check_raises(
+            x, Empty(), "Both x and y appear as 'Empty()', but are not equal!"
+        )
+
+    def test_ignore_attributes(self):
+        compare(Point(1, 2), Point(1, 3), ignore_attributes=['y'])
+        self.check_raises(
+            Point(1, 2), Point(2, 3),
+            "Point not as expected:\n"
+            "\n"
+            "attributes differ:\n"
+            "'x': 1 != 2",
+            ignore_attributes={Point: ['y']}
+        )
+
+    def test_different_types(self):
+        self.check_raises(
+            Point(1, 2), Unequal(1),
+            "Point(x=1, y=2, label='') != %r" % Unequal(1)
+        )
+
+    def test_nested(self):
+        self.check_raises(
+            [Unequal(Point(1, 2))], [Unequal(Point(1, 3))],
+            "sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[%r]\n"
+            "\n"
+            "second:\n"
+            "[%r]\n"
+            "\n"
+            "While comparing [0]: Unequal not as expected:\n"
+            "\n"
+            "attributes differ:\n"
+            "'x': Point(x=1, y=2, label='') != Point(x=1, y=3, label='')\n"
+            "\n"
+            "While comparing [0].x: Point not as expected:\n"
+            "\n"
+            "attributes same:\n"
+            "['x']\n"
+            "\n"
+            "attributes differ:\n"
+            "'y': 2 != 3" % (Unequal(Point(1, 2)), Unequal(Point(1, 3)))
+        )
+
+    def test_layout_reused(self):
+        _field_layouts.clear()
+        compare(Unequal(1), Unequal(1))
+        compare(Unequal(2), Unequal(2))
+        compare(list(_field_layouts), expected=[(Unequal, None)])
+
+    def test_comparer_called_directly(self):
+        context = CompareContext({})
+        compare(compare_dataclass(Unequal(1), Unequal(2), context),
+                expected=(
+                    "Unequal not as expected:\n"
+                    "\n"
+                    "attributes differ:\n"
+                    "'x': 1 != 2"
+                ))
+
+
+@attr.s(eq=False)
+class Record(object):
+    id = attr.ib()
+    name = attr.ib()
+    cache = attr.ib(default=None, eq=False)
+
+
+@attr.s(slots=True, eq=False)
+class SlottedRecord(object):
+    id = attr.ib()
+
+
+class TestAttrs(CompareHelper, TestCase):
+
+    def test_same(self):
+        compare(Record(1, 'a'), Record(1, 'a'))
+
+    def test_different(self):
+        self.check_raises(
+            Record(1, 'a'), Record(1, 'b'),
+            "Record not as expected:\n"
+            "\n"
+            "attributes same:\n"
+            "['id']\n"
+            "\n"
+            "attributes differ:\n"
+            "'name': 'a' != 'b'\n"
+            "\n"
+            "While comparing .name: 'a' != 'b'"
+        )
+
+    def test_not_compared_attribute_ignored(self):
+        compare(Record(1, 'a', cache=1), Record(1, 'a', cache=2))
+
+    def test_slots(self):
+        compare(SlottedRecord(1), SlottedRecord(1))
+        self.check_raises(
+            SlottedRecord(1), SlottedRecord(2),
+            "SlottedRecord not as expected:\n"
+            "\n"
+            "attributes differ:\n"
+            "'id': 1 != 2"
+        )
+
+    def test_many(self):
+        compare([Record(i, str(i)) for i in range(100)],
+                [Record(i, str(i)) for i in range(100)])
+
+    def test_comparer_called_directly(self):
+        context = CompareContext({})
+        compare(compare_attrs(Record(1, 'a'), Record(1, 'a'), context),
+                expected=None)
+        compare(compare_attrs(Record(1, 'a'), Record(2, 'a'), context),
+                expected=(
+                    "Record not as expected:\n"
+                    "\n"
+                    "attributes same:\n"
+                    "['name']\n"
+                    "\n"
+                    "attributes differ:\n"
+                    "'id': 1 != 2"
+                ))
+
+
+Pair = namedtuple('Pair', 'b a')
+
+
+class TestNamedTuple(CompareHelper, TestCase):
+
+    def test_different(self):
+        self.check_raises(
+            Pair(1, [2]), Pair(2, [2]),
+            "Pair not as expected:\n"
+            "\n"
+            "same:\n"
+            "['a']\n"
+            "\n"
+            "values differ:\n"
+            "'b': 1 != 2"
+        )
+
+    def test_different_quick(self):
+        self.check_raises(
+            Pair(1, [2]), Pair(1, [3]),
+            "Pair not as expected:\n"
+            "\n"
+            "same:\n"
+            "['b']\n"
+            "\n"
+            "values differ:\n"
+            "'a': [2] != [3]\n"
+            "\n"
+            "While comparing ['a']: sequence not as expected:\n"
+            "\n"
+            "same:\n"
+            "[]\n"
+            "\n"
+            "first:\n"
+            "[2]\n"
+            "\n"
+            "second:\n"
+            "[3]",
+            quick=True
+        )
@@ -1,6 +1,6 @@
 from unittest import TestCase
 
-from testfixtures import diff
+from testfixtures import compare, diff
 
 
 class TestDiff(TestCase):
@@ -49,3 +49,22 @@ class TestDiff(TestCase):
                 actual,
                 '\n%r\n!=\n%r' % (expected, actual)
                 )
+
+    def test_common_suffix(self):
+        compare(diff('x\nz', 'y\nz'),
+                expected='--- first\n+++ second\n@@ -1,2 +1,2 @@\n-x\n+y\n z')
+
+    def test_use_difflib(self):
+        compare(diff('x\nx', 'y\nx', use_difflib=True),
+                expected='--- first\n+++ second\n@@ -1,2 +1,2 @@\n+y\n x\n-x')
+
+    def test_labels(self):
+        compare(diff('x', 'y', 'expected', 'actual'),
+                expected='--- expected\n+++ actual\n@@ -1 +1 @@\n-x\n+y')
+
+    def test_large(self):
+        x = '\n'.join('line %i' % (i % 1000) for i in range(50000))
+        y = x.replace('line 500\n', 'line 501\n')
+        actual = diff(x, y)
+        compare(actual.count('\n-line 500'), expected=50)
+        compare(actual.count('\n+line 501'), expected=50)
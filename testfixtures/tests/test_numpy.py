@@ -0,0 +1,257 @@
+from unittest import TestCase
+
+import numpy as np
+
+from testfixtures import compare
+from testfixtures.tests.test_compare import CompareHelper
+
+
+class TestCompareNdarray(CompareHelper, TestCase):
+
+    def test_same(self):
+        compare(np.array([1, 2, 3]), np.array([1, 2, 3]))
+
+    def test_same_strict(self):
+        compare(np.array([1, 2, 3]), np.array([1, 2, 3]), strict=True)
+
+    def test_same_quick(self):
+        compare(np.array([1, 2, 3]), np.array([1, 2, 3]), quick=True)
+
+    def test_different(self):
+        self.check_raises(
+            np.array([1, 2, 3]), np.array([1, 2, 4]),
+            "ndarray not as expected:\n"
+            "\n"
+            "1 of 3 elements differ\n"
+            "max absolute difference: 1.0\n"
+            "max relative difference: 0.25\n"
+            "\n"
+            "differences:\n"
+            "[2]: 3 != 4"
+        )
+
+    def test_different_quick(self):
+        self.check_raises(
+            np.array([1, 2]), np.array([1, 3]),
+            "ndarray not as expected:\n"
+            "\n"
+            "1 of 2 elements differ\n"
+            "max absolute difference: 1.0\n"
+            "max relative difference: 0.3333333333333333\n"
+            "\n"
+            "differences:\n"
+            "[1]: 2 != 3",
+            quick=True
+        )
+
+    def test_labels(self):
+        self.check_raises(
+            np.array([1]), np.array([2]),
+            "ndarray not as expected:\n"
+            "\n"
+            "1 of 1 elements differ\n"
+            "max absolute difference: 1.0\n"
+            "max relative difference: 0.5\n"
+            "\n"
+            "differences:\n"
+            "[0]: 1 (expected) != 2 (actual)",
+            x_label='expected', y_label='actual'
+        )
+
+    def test_shape(self):
+        self.check_raises(
+            np.array([1, 2, 3]), np.array([[1, 2, 3]]),
+            "ndarray not as expected:\n"
+            "\n"
+            "shape: (3,) != (1, 3)"
+        )
+
+    def test_shape_not_broadcastable(self):
+        self.check_raises(
+            np.array([1, 2, 3]), np.array([1, 2]),
+            "ndarray not as expected:\n"
+            "\n"
+            "shape: (3,) != (2,)"
+        )
+
+    def test_dtype_not_strict(self):
+        compare(np.array([1, 2]), np.array([1.0, 2.0]))
+
+    def test_dtype_strict(self):
+        self.check_raises(
+            np.array([1, 2]), np.array([1.0, 2.0]),
+            "ndarray not as expected:\n"
+            "\n"
+            "dtype: int64 != float64",
+            strict=True
+        )
+
+    def test_dtype_and_values(self):
+        self.check_raises(
+            np.array([1, 2]), np.array([1.0, 2.5]),
+            "ndarray not as expected:\n"
+            "\n"
+            "dtype: int64 != float64\n"
+            "1 of 2 elements differ\n"
+            "max absolute difference: 0.5\n"
+            "max relative difference: 0.2\n"
+            "\n"
+            "differences:\n"
+            "[1]: 2 != 2.5"
+        )
+
+    def test_multi_dimensional(self):
+        self.check_raises(
+            np.arange(100).reshape(10, 10), np.zeros((10, 10), dtype=int),
+            "ndarray not as expected:\n"
+            "\n"
+            "99 of 100 elements differ\n"
+            "max absolute difference: 99.0\n"
+            "max relative difference: inf\n"
+            "\n"
+            "differences (first 3):\n"
+            "[0, 1]: 1 != 0\n"
+            "[0, 2]: 2 != 0\n"
+            "[0, 3]: 3 != 0",
+            mismatch_limit=3
+        )
+
+    def test_zero_dimensional(self):
+        self.check_raises(
+            np.array(1), np.array(2),
+            "ndarray not as expected:\n"
+            "\n"
+            "1 of 1 elements differ\n"
+            "max absolute difference: 1.0\n"
+            "max relative difference: 0.5\n"
+            "\n"
+            "differences:\n"
+            "[]: 1 != 2"
+        )
+
+    def test_nan(self):
+        compare(np.array([1, np.nan]), np.array([1, np.nan]))
+
+    def test_nan_not_equal(self):
+        self.check_raises(
+            np.array([1, np.nan]), np.array([1, np.nan]),
+            "ndarray not as expected:\n"
+            "\n"
+            "1 of 2 elements differ\n"
+            "\n"
+            "differences:\n"
+            "[1]: nan != nan",
+            equal_nan=False
+        )
+
+    def test_tolerance(self):
+        compare(np.array([1.0, 2.0]), np.array([1.0001, 2.0]), rtol=1e-3)
+        compare(np.array([1.0, 2.0]), np.array([1.0001, 2.0]), atol=1e-3)
+
+    def test_tolerance_from_rel_tol_and_abs_tol(self):
+        compare({'a': np.array([1.0, 2.0])}, {'a': np.array([1.0001, 2.0])},
+                rel_tol=1e-3)
+        compare({'a': np.array([1.0, 2.0])}, {'a': np.array([1.0001, 2.0])},
+                abs_tol=1e-3)
+
+    def test_rtol_and_atol_override_rel_tol_and_abs_tol(self):
+        self.check_raises(
+            np.array([1.0, 2.0]), np.array([1.5, 2.0]),
+            "ndarray not as expected:\n"
+            "\n"
+            "1 of 2 elements differ using rtol=0.001, atol=0\n"
+            "max absolute difference: 0.5\n"
+            "max relative difference: 0.3333333333333333\n"
+            "\n"
+            "differences:\n"
+            "[0]: 1.0 != 1.5",
+            rtol=1e-3, rel_tol=0.5
+        )
+
+    def test_tolerance_exceeded(self):
+        self.check_raises(
+            np.array([1.0, 2.0]), np.array([1.5, 2.0]),
+            "ndarray not as expected:\n"
+            "\n"
+            "1 of 2 elements differ using rtol=0.001, atol=0.01\n"
+            "max absolute difference: 0.5\n"
+            "max relative difference: 0.3333333333333333\n"
+            "\n"
+            "differences:\n"
+            "[0]: 1.0 != 1.5",
+            rtol=1e-3, atol=0.01
+        )
+
+    def test_unsigned(self):
+        self.check_raises(
+            np.array([1, 2], dtype=np.uint8), np.array([2, 1], dtype=np.uint8),
+            "ndarray not as expected:\n"
+            "\n"
+            "2 of 2 elements differ\n"
+            "max absolute difference: 1.0\n"
+            "max relative difference: 1.0\n"
+            "\n"
+            "differences:\n"
+            "[0]: 1 != 2\n"
+            "[1]: 2 != 1"
+        )
+
+    def test_strings(self):
+        self.check_raises(
+            np.array(['a', 'b']), np.array(['a', 'c']),
+            "ndarray not as expected:\n"
+            "\n"
+            "1 of 2 elements differ\n"
+            "\n"
+            "differences:\n"
+            "[1]: 'b' != 'c'"
+        )
+
+    def test_objects(self):
+        self.check_raises(
+            np.array([{'a': 1}, None]), np.array([{'a': 2}, None]),
+            "ndarray not as expected:\n"
+            "\n"
+            "1 of 2 elements differ\n"
+            "\n"
+            "differences:\n"
+            "[0]: {'a': 1} != {'a': 2}"
+        )
+
+    def test_nested_in_dict(self):
+        self.check_raises(
+            {'a': np.array([1, 2])}, {'a': np.array([1, 3])},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'a': array([1, 2]) != array([1, 3])\n"
+            "\n"
+            "While comparing ['a']: ndarray not as expected:\n"
+            "\n"
+            "1 of 2 elements differ\n"
+            "max absolute difference: 1.0\n"
+            "max relative difference: 0.3333333333333333\n"
+            "\n"
+            "differences:\n"
+            "[1]: 2 != 3"
+        )
+
+    def test_nested_in_list_same(self):
+        compare([np.array([1, 2])], [np.array([1, 2])])
+
+    def test_subclass(self):
+        class MyArray(np.ndarray):
+            pass
+        x = np.array([1, 2]).view(MyArray)
+        y = np.array([1, 3]).view(MyArray)
+        self.check_raises(
+            x, y,
+            "MyArray not as expected:\n"
+            "\n"
+            "1 of 2 elements differ\n"
+            "max absolute difference: 1.0\n"
+            "max relative difference: 0.3333333333333333\n"
+            "\n"
+            "differences:\n"
+            "[1]: 2 != 3"
+        )
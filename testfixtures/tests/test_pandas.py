@@ -0,0 +1,434 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+import testfixtures.pandas
+from testfixtures import compare
+from testfixtures.tests.test_compare import CompareHelper
+
+
+def sample():
+    return pd.DataFrame({
+        'a': [1, 2, 3],
+        'b': [1.0, 2.0, np.nan],
+        'c': ['x', 'y', 'z'],
+    })
+
+
+class TestCompareDataFrame(CompareHelper, TestCase):
+
+    def test_same(self):
+        compare(sample(), sample())
+
+    def test_same_strict(self):
+        compare(sample(), sample(), strict=True)
+
+    def test_same_quick(self):
+        compare(sample(), sample(), quick=True)
+
+    def test_values_differ(self):
+        self.check_raises(
+            sample(), sample().assign(a=[1, 5, 3]),
+            "DataFrame not as expected:\n"
+            "\n"
+            "values differ in columns:\n"
+            "['a']\n"
+            "\n"
+            "While comparing ['a']: Series not as expected:\n"
+            "\n"
+            "1 of 3 rows differ\n"
+            "max absolute difference: 3.0\n"
+            "max relative difference: 0.6\n"
+            "\n"
+            "differences:\n"
+            "1: 2 != 5"
+        )
+
+    def test_values_differ_quick(self):
+        self.check_raises(
+            sample(), sample().assign(c=['x', 'y', 'q']),
+            "DataFrame not as expected:\n"
+            "\n"
+            "values differ in columns:\n"
+            "['c']\n"
+            "\n"
+            "While comparing ['c']: Series not as expected:\n"
+            "\n"
+            "1 of 3 rows differ\n"
+            "\n"
+            "differences:\n"
+            "2: 'z' != 'q'",
+            quick=True
+        )
+
+    def test_many_rows(self):
+        x = pd.DataFrame({'a': np.arange(10**6)})
+        y = pd.DataFrame({'a': np.arange(10**6)})
+        y.loc[[10, 500000], 'a'] = -1
+        self.check_raises(
+            x, y,
+            "DataFrame not as expected:\n"
+            "\n"
+            "values differ in columns:\n"
+            "['a']\n"
+            "\n"
+            "While comparing ['a']: Series not as expected:\n"
+            "\n"
+            "2 of 1000000 rows differ\n"
+            "max absolute difference: 500001.0\n"
+            "max relative difference: 500001.0\n"
+            "\n"
+            "differences:\n"
+            "10: 10 != -1\n"
+            "500000: 500000 != -1"
+        )
+
+    def test_columns_differ(self):
+        self.check_raises(
+            sample(), sample().rename(columns={'c': 'd'}),
+            "DataFrame not as expected:\n"
+            "\n"
+            "While comparing .columns: Index not as expected:\n"
+            "\n"
+            "1 of 3 labels differ\n"
+            "\n"
+            "differences:\n"
+            "[2]: 'c' != 'd'"
+        )
+
+    def test_columns_differ_and_values(self):
+        self.check_raises(
+            sample(), sample().drop(columns='c').assign(a=[1, 2, 4]),
+            "DataFrame not as expected:\n"
+            "\n"
+            "values differ in columns:\n"
+            "['a']\n"
+            "\n"
+            "While comparing .columns: Index not as expected:\n"
+            "\n"
+            "length: 3 != 2\n"
+            "\n"
+            "in first but not second:\n"
+            "['c']\n"
+            "\n"
+            "While comparing ['a']: Series not as expected:\n"
+            "\n"
+            "1 of 3 rows differ\n"
+            "max absolute difference: 1.0\n"
+            "max relative difference: 0.25\n"
+            "\n"
+            "differences:\n"
+            "2: 3 != 4"
+        )
+
+    def test_column_order(self):
+        self.check_raises(
+            sample(), sample()[['b', 'a', 'c']],
+            "DataFrame not as expected:\n"
+            "\n"
+            "While comparing .columns: Index not as expected:\n"
+            "\n"
+            "2 of 3 labels differ\n"
+            "\n"
+            "differences:\n"
+            "[0]: 'a' != 'b'\n"
+            "[1]: 'b' != 'a'"
+        )
+
+    def test_check_like(self):
+        compare(sample(), sample()[['b', 'a', 'c']].iloc[::-1],
+                check_like=True)
+
+    def test_check_like_values_differ(self):
+        self.check_raises(
+            sample(), sample().assign(a=[1, 5, 3]).iloc[::-1],
+            "DataFrame not as expected:\n"
+            "\n"
+            "values differ in columns:\n"
+            "['a']\n"
+            "\n"
+            "While comparing ['a']: Series not as expected:\n"
+            "\n"
+            "1 of 3 rows differ\n"
+            "max absolute difference: 3.0\n"
+            "max relative difference: 0.6\n"
+            "\n"
+            "differences:\n"
+            "1: 2 != 5",
+            check_like=True
+        )
+
+    def test_duplicate_columns(self):
+        x = pd.DataFrame([[1, 2, 3]], columns=['a', 'a', 'b'])
+        compare(x, x.copy())
+
+    def test_duplicate_columns_values_differ(self):
+        self.check_raises(
+            pd.DataFrame([[1, 2, 3]], columns=['a', 'a', 'b']),
+            pd.DataFrame([[1, 5, 3]], columns=['a', 'a', 'b']),
+            "DataFrame not as expected:\n"
+            "\n"
+            "values differ in columns:\n"
+            "['a']\n"
+            "\n"
+            "While comparing ['a']: Series not as expected:\n"
+            "\n"
+            "1 of 1 rows differ\n"
+            "max absolute difference: 3.0\n"
+            "max relative difference: 0.6\n"
+            "\n"
+            "differences:\n"
+            "0: 2 != 5"
+        )
+
+    def test_duplicate_columns_differ(self):
+        self.check_raises(
+            pd.DataFrame([[1, 2, 3]], columns=['a', 'a', 'b']),
+            pd.DataFrame([[1, 2, 3]], columns=['b', 'a', 'a']),
+            "DataFrame not as expected:\n"
+            "\n"
+            "While comparing .columns: Index not as expected:\n"
+            "\n"
+            "2 of 3 labels differ\n"
+            "\n"
+            "differences:\n"
+            "[0]: 'a' != 'b'\n"
+            "[2]: 'b' != 'a'",
+            check_like=True
+        )
+
+    def test_index_labels_differ(self):
+        x = sample().set_index('c')
+        self.check_raises(
+            x, x.rename(index={'y': 'Y'}),
+            "DataFrame not as expected:\n"
+            "\n"
+            "While comparing .index: Index not as expected:\n"
+            "\n"
+            "1 of 3 labels differ\n"
+            "\n"
+            "differences:\n"
+            "[1]: 'y' != 'Y'"
+        )
+
+    def test_index_length_differs(self):
+        self.check_raises(
+            sample(), sample().iloc[:2],
+            "DataFrame not as expected:\n"
+            "\n"
+            "While comparing .index: RangeIndex not as expected:\n"
+            "\n"
+            "length: 3 != 2\n"
+            "\n"
+            "in first but not second:\n"
+            "[2]"
+        )
+
+    def test_tolerance(self):
+        compare(sample(), sample().assign(b=[1.0001, 2.0, np.nan]), rtol=1e-3)
+
+    def test_tolerance_from_rel_tol(self):
+        compare([sample()], [sample().assign(b=[1.0001, 2.0, np.nan])],
+                rel_tol=1e-3)
+
+    def test_tolerance_exceeded(self):
+        self.check_raises(
+            sample(), sample().assign(b=[1.1, 2.0, np.nan]),
+            "DataFrame not as expected:\n"
+            "\n"
+            "values differ in columns:\n"
+            "['b']\n"
+            "\n"
+            "While comparing ['b']: Series not as expected:\n"
+            "\n"
+            "1 of 3 rows differ using rtol=0.001, atol=0\n"
+            "max absolute difference: 0.10000000000000009\n"
+            "max relative difference: 0.09090909090909098\n"
+            "\n"
+            "differences:\n"
+            "0: 1.0 != 1.1",
+            rtol=1e-3
+        )
+
+    def test_nan_not_equal(self):
+        self.check_raises(
+            sample()[['b']], sample()[['b']],
+            "DataFrame not as expected:\n"
+            "\n"
+            "values differ in columns:\n"
+            "['b']\n"
+            "\n"
+            "While comparing ['b']: Series not as expected:\n"
+            "\n"
+            "1 of 3 rows differ\n"
+            "\n"
+            "differences:\n"
+            "2: nan != nan",
+            equal_nan=False
+        )
+
+    def test_nested(self):
+        self.check_raises(
+            {'df': sample()[['a']]}, {'df': sample()[['a']].assign(a=0)},
+            "dict not as expected:\n"
+            "\n"
+            "values differ:\n"
+            "'df':    a\n"
+            "0  1\n"
+            "1  2\n"
+            "2  3 !=    a\n"
+            "0  0\n"
+            "1  0\n"
+            "2  0\n"
+            "\n"
+            "While comparing ['df']: DataFrame not as expected:\n"
+            "\n"
+            "values differ in columns:\n"
+            "['a']\n"
+            "\n"
+            "While comparing ['df']['a']: Series not as expected:\n"
+            "\n"
+            "3 of 3 rows differ\n"
+            "max absolute difference: 3.0\n"
+            "max relative difference: inf\n"
+            "\n"
+            "differences:\n"
+            "0: 1 != 0\n"
+            "1: 2 != 0\n"
+            "2: 3 != 0"
+        )
+
+
+class TestCompareSeries(CompareHelper, TestCase):
+
+    def test_same(self):
+        compare(pd.Series([1, 2]), pd.Series([1, 2]))
+
+    def test_name(self):
+        self.check_raises(
+            pd.Series([1, 2], name='a'), pd.Series([1, 2], name='b'),
+            "Series not as expected:\n"
+            "\n"
+            "name: 'a' != 'b'"
+        )
+
+    def test_dtype_not_strict(self):
+        compare(pd.Series([1, 2]), pd.Series([1.0, 2.0]))
+
+    def test_dtype_strict(self):
+        self.check_raises(
+            pd.Series([1, 2]), pd.Series([1.0, 2.0]),
+            "Series not as expected:\n"
+            "\n"
+            "dtype: int64 != float64",
+            strict=True
+        )
+
+    def test_length(self):
+        self.check_raises(
+            pd.Series([1, 2]), pd.Series([1]),
+            "Series not as expected:\n"
+            "\n"
+            "While comparing .index: RangeIndex not as expected:\n"
+            "\n"
+            "length: 2 != 1\n"
+            "\n"
+            "in first but not second:\n"
+            "[1]"
+        )
+
+    def test_labels(self):
+        self.check_raises(
+            pd.Series([1]), pd.Series([2]),
+            "Series not as expected:\n"
+            "\n"
+            "1 of 1 rows differ\n"
+            "max absolute difference: 1.0\n"
+            "max relative difference: 0.5\n"
+            "\n"
+            "differences:\n"
+            "0: 1 (expected) != 2 (actual)",
+            x_label='expected', y_label='actual'
+        )
+
+    def test_nullable(self):
+        compare(pd.Series([1, None], dtype='Int64'),
+                pd.Series([1, None], dtype='Int64'))
+
+    def test_nullable_different(self):
+        self.check_raises(
+            pd.Series([1, None], dtype='Int64'),
+            pd.Series([None, 1], dtype='Int64'),
+            "Series not as expected:\n"
+            "\n"
+            "2 of 2 rows differ\n"
+            "\n"
+            "differences:\n"
+            "0: 1 != <NA>\n"
+            "1: <NA> != 1"
+        )
+
+    def test_mismatch_limit(self):
+        self.check_raises(
+            pd.Series(['a', 'b', 'c']), pd.Series(['x', 'y', 'z']),
+            "Series not as expected:\n"
+            "\n"
+            "3 of 3 rows differ\n"
+            "\n"
+            "differences (first 1):\n"
+            "0: 'a' != 'x'",
+            mismatch_limit=1
+        )
+
+
+class TestCompareIndex(CompareHelper, TestCase):
+
+    def test_same(self):
+        compare(pd.Index([1, 2, 3]), pd.Index([1, 2, 3]))
+
+    def test_names(self):
+        self.check_raises(
+            pd.Index([1, 2], name='x'), pd.Index([1, 2]),
+            "Index not as expected:\n"
+            "\n"
+            "names: ['x'] != [None]"
+        )
+
+    def test_length(self):
+        self.check_raises(
+            pd.Index([1, 2, 3]), pd.Index([1, 2, 3, 4, 5]),
+            "Index not as expected:\n"
+            "\n"
+            "length: 3 != 5\n"
+            "\n"
+            "in second but not first:\n"
+            "[4, 5]"
+        )
+
+    def test_length_limit(self):
+        self.check_raises(
+            pd.Index([1]), pd.Index([2, 3, 4]),
+            "Index not as expected:\n"
+            "\n"
+            "length: 1 != 3\n"
+            "\n"
+            "in first but not second:\n"
+            "[1]\n"
+            "\n"
+            "in second but not first (first 2):\n"
+            "[2, 3]",
+            mismatch_limit=2
+        )
+
+    def test_multi_index(self):
+        self.check_raises(
+            pd.MultiIndex.from_tuples([(1, 2), (3, 4)]),
+            pd.MultiIndex.from_tuples([(1, 2), (3, 5)]),
+            "MultiIndex not as expected:\n"
+            "\n"
+            "1 of 2 labels differ\n"
+            "\n"
+            "differences:\n"
+            "[1]: (3, 4) != (3, 5)"
+        )